@@ -3,32 +3,111 @@ Serveur Flask pour la génération de cartes SquadField avec IA.
 """
 
 import os
-import json
-import tempfile
+import uuid
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import openai
 
 # Import des modules locaux
-from rules import apply_squadfield_rules, validate_player_data
-from prompt_builder import build_dalle_prompt, validate_prompt_data
-from firebase_uploader import upload_image_from_url, check_firebase_config
+from player_schema import validate_player, format_errors
+from firebase_uploader import check_firebase_config, get_uploader, delete_images
+from card_pipeline import run_card_generation, cleanup_files, prepare_roster, openai_breaker
+from job_queue import JobQueue, QueueFullError
+from openai_scheduler import get_image_scheduler
+from circuit_breaker import breaker_states, OPEN
+from background_atlas import get_background_atlas
+from roster_store import get_roster_store
+from card_manifest import get_card_manifest
+from card_derivatives import get_derivative_store
+from scratch_space import ScratchRequest, ScratchQuotaError, get_scratch_space
+from job_events import stream_job_events
+from metrics import REGISTRY, CONTENT_TYPE, IN_FLIGHT, time_stage, render_metrics
 
 # Chargement des variables d'environnement
 load_dotenv()
 
 app = Flask(__name__)
+app.request_class = ScratchRequest  # Uploads écrits directement dans l'espace de travail
 CORS(app)  # Permet les requêtes depuis Next.js
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max
-UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov'}
 
+# Stats par défaut des cartes générées depuis le formulaire (les six stats canoniques),
+# remplacées par celles analysées sur la vidéo quand l'analyse réussit
+DEFAULT_STATS = {
+    'technique': 85,
+    'vitesse': 88,
+    'physique': 80,
+    'tirs': 82,
+    'defense': 74,
+    'passe': 86
+}
+
+# File de jobs: la génération (DALL·E + Firebase) tourne hors des workers HTTP
+job_queue = JobQueue(run_card_generation)
+
+# Initialisation du processus serveur (une seule fois par processus)
+_startup_done = False
+_startup_lock = threading.Lock()
+
+
+def startup():
+    """
+    Initialise le processus serveur, une seule fois : chargement de l'atlas et
+    de l'effectif, synchronisation du manifeste, nettoyage des uploads laissés
+    par un arrêt brutal et reprise des générations interrompues.
+
+    Appelée par le serveur de développement au démarrage, et en arrière-plan
+    dès la première requête sous n'importe quel serveur WSGI (gunicorn, debug
+    désactivé, ...). Chaque worker ne reprend que les jobs qu'il a pu réserver
+    (voir JobQueue.recover).
+
+    Returns:
+        bool: True si l'initialisation a été faite par cet appel
+    """
+    global _startup_done
+    with _startup_lock:
+        if _startup_done:
+            return False
+        _startup_done = True
+
+    # Chargement de l'atlas de fonds pré-générés et de l'effectif indexé en mémoire,
+    # synchronisation du manifeste des cartes en arrière-plan
+    get_background_atlas().preload()
+    get_roster_store().load()
+    get_card_manifest().refresh_async(get_uploader().get_bucket)
+
+    # Nettoyage des uploads laissés par un arrêt brutal (sauf ceux des jobs à reprendre)
+    unfinished = job_queue.store.list_unfinished()
+    get_scratch_space().cleanup_stale(keep=[
+        job['payload'].get(field) for job in unfinished for field in ('photo_path', 'video_path')
+    ] + [
+        frame['path'] for job in unfinished for frame in job['checkpoint'].get('frames') or []
+    ])
+
+    # Reprise des générations interrompues
+    recovered = job_queue.recover()
+    if recovered:
+        print(f"♻️ {recovered} génération(s) interrompue(s) reprise(s)")
+    return True
+
+
+@app.before_request
+def ensure_startup():
+    """
+    Lance l'initialisation du processus à la première requête (sauf en mode
+    test), dans un thread : la requête n'attend ni les chargements ni la reprise.
+    """
+    if not _startup_done and not app.config.get('TESTING'):
+        threading.Thread(target=startup, name='startup', daemon=True).start()
+
+
 def allowed_file(filename, allowed_extensions):
     """Vérifie si l'extension du fichier est autorisée."""
     return '.' in filename and \
@@ -45,116 +124,134 @@ def setup_openai():
     print("✅ OpenAI configuré avec succès")
     return True
 
-def generate_dalle_image(prompt, photo_path=None):
+def openai_unavailable_response():
     """
-    Génère une image avec DALL·E 3.
-    
-    Args:
-        prompt (str): Prompt pour DALL·E
-        photo_path (str, optional): Chemin vers la photo du joueur
-        
+    Réponse 503 immédiate quand le disjoncteur OpenAI est ouvert.
+
     Returns:
-        str: URL de l'image générée, None si erreur
+        tuple: Réponse Flask, None si OpenAI est disponible
     """
-    try:
-        print("🎨 Génération de l'image avec DALL·E 3...")
-        print(f"📝 Prompt: {prompt[:100]}...")
-        
-        # Configuration DALL·E
-        model = os.getenv('DALLE_MODEL', 'dall-e-3')
-        size = os.getenv('DALLE_SIZE', '1024x1024')
-        quality = os.getenv('DALLE_QUALITY', 'standard')
-        
-        # Appel à l'API OpenAI
-        response = openai.Image.create(
-            model=model,
-            prompt=prompt,
-            size=size,
-            quality=quality,
-            n=1
-        )
-        
-        if response.data and len(response.data) > 0:
-            image_url = response.data[0].url
-            print(f"✅ Image générée avec succès: {image_url}")
-            return image_url
-        else:
-            print("❌ Aucune image générée par DALL·E")
-            return None
-            
-    except openai.OpenAIError as e:
-        print(f"❌ Erreur OpenAI: {e}")
-        return None
-    except Exception as e:
-        print(f"❌ Erreur inattendue: {e}")
+    if openai_breaker.state != OPEN:
         return None
-
-def save_generation_log(player_data, prompt, image_url, firebase_url, success=True):
-    """Sauvegarde un log de la génération."""
-    try:
-        log_data = {
-            "timestamp": datetime.now().isoformat(),
-            "player": player_data['prenom'],
-            "age_category": player_data.get('age_category'),
-            "overall_score": player_data.get('overall_score'),
-            "card_color": player_data.get('card_color'),
-            "prompt": prompt,
-            "dalle_url": image_url,
-            "firebase_url": firebase_url,
-            "success": success
-        }
-        
-        # Créer le dossier logs s'il n'existe pas
-        os.makedirs('logs', exist_ok=True)
-        
-        # Nom du fichier log
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"logs/generation_{timestamp}.json"
-        
-        with open(log_filename, 'w', encoding='utf-8') as f:
-            json.dump(log_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"📄 Log sauvegardé: {log_filename}")
-        
-    except Exception as e:
-        print(f"⚠️ Erreur de sauvegarde du log: {e}")
+    
+    retry_after = max(1, int(openai_breaker.retry_after()))
+    response = jsonify({
+        "error": "Service de génération temporairement indisponible, réessayer plus tard",
+        "retry_after": retry_after
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de vérification de santé."""
+    breakers = breaker_states()
+    degraded = any(breaker['state'] == OPEN for breaker in breakers.values())
     return jsonify({
-        "status": "healthy",
+        "status": "degraded" if degraded else "healthy",
+        "breakers": breakers,
         "service": "squadfield-card-generator",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "jobs": job_queue.stats(),
+        "openai_scheduler": get_image_scheduler().metrics(),
+        "background_atlas": get_background_atlas().stats(),
+        "scratch": get_scratch_space().stats(),
+        "card_manifest": get_card_manifest().stats()
     })
 
+@app.teardown_request
+def discard_scratch_files(exc):
+    """Supprime les uploads de la requête qui n'ont pas été transmis à un job."""
+    request.discard_scratch_files()
+
+def collect_service_metrics():
+    """Métriques calculées à la lecture de /metrics: file de jobs, ordonnanceur OpenAI, disjoncteurs."""
+    jobs = job_queue.stats()
+    scheduler = get_image_scheduler().metrics()
+    breakers = breaker_states()
+    return [
+        ('squadfield_jobs', 'gauge', "Jobs de génération par statut",
+         [({"status": status}, jobs[status]) for status in ('queued', 'running', 'completed', 'failed')]),
+        ('squadfield_openai_concurrency_limit', 'gauge', "Limite de concurrence adaptative OpenAI",
+         [({}, scheduler['concurrency_limit'])]),
+        ('squadfield_openai_calls_total', 'counter', "Appels OpenAI par résultat",
+         [({"result": name}, scheduler[name])
+          for name in ('successes', 'throttled', 'retries', 'failures')]),
+        ('squadfield_breaker_open', 'gauge', "Disjoncteur ouvert (1) ou non (0)",
+         [({"dependency": name}, int(state['state'] == OPEN)) for name, state in breakers.items()])
+    ]
+
+REGISTRY.register_collector(collect_service_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métriques au format texte Prometheus."""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
 @app.route('/generate', methods=['POST'])
 def generate_card():
     """
     Endpoint principal pour générer une carte SquadField.
-    Accepte les form-data avec photo, vidéo, prénom, âge et sport.
+    Accepte les form-data avec photo, vidéo, prénom, âge et sport,
+    met la génération en file et retourne immédiatement l'identifiant du job.
     """
+    IN_FLIGHT.inc(kind='http_generate')
     try:
         print("\n🚀 === NOUVELLE DEMANDE DE GÉNÉRATION ===")
         
-        # Validation des champs requis
-        prenom = request.form.get('prenom')
-        age = request.form.get('age')
-        sport = request.form.get('sport')
+        # Parse du multipart: les fichiers sont écrits directement dans l'espace de travail
+        try:
+            with time_stage('multipart_parse'):
+                form = request.form
+                files = request.files
+        except ScratchQuotaError as e:
+            return jsonify({"error": str(e)}), e.status
+        
+        # renderer=local compose la carte avec Pillow, sans appel DALL·E
+        renderer = form.get('renderer')
+        
+        # Rejet immédiat si OpenAI est court-circuité
+        unavailable = None if renderer == 'local' else openai_unavailable_response()
+        if unavailable:
+            return unavailable
+        
+        # Construction des données joueur (l'âge arrive en texte dans le formulaire)
+        age = form.get('age')
+        if age is not None and age.strip().isdigit():
+            age = int(age)
+        player_data = {
+            field: value for field, value in (
+                ('prenom', form.get('prenom')), ('age', age), ('sport', form.get('sport'))
+            ) if value not in (None, '')
+        }
+        player_data.update({
+            # no_cache=true force une nouvelle génération DALL·E
+            'bypass_cache': form.get('no_cache', '').lower() in ('1', 'true', 'yes'),
+            'renderer': renderer,
+            # Données par défaut pour les tests
+            'position': 'Attaquant',
+            'club': 'SquadField Academy',
+            'stats': dict(DEFAULT_STATS)
+        })
         
-        if not all([prenom, age, sport]):
+        # Validation des données (toutes les erreurs en une réponse)
+        with time_stage('validate'):
+            errors = validate_player(player_data)
+        if errors:
             return jsonify({
-                "error": "Champs requis manquants: prénom, âge et sport sont obligatoires"
+                "error": f"Données invalides: {format_errors(errors)}",
+                "errors": errors
             }), 400
+        prenom = player_data['prenom']
         
         # Validation des fichiers
-        if 'photo' not in request.files or 'video' not in request.files:
+        if 'photo' not in files or 'video' not in files:
             return jsonify({
                 "error": "Fichiers requis manquants: photo et vidéo sont obligatoires"
             }), 400
         
-        photo_file = request.files['photo']
-        video_file = request.files['video']
+        photo_file = files['photo']
+        video_file = files['video']
         
         if photo_file.filename == '' or video_file.filename == '':
             return jsonify({
@@ -172,134 +269,265 @@ def generate_card():
                 "error": "Format de vidéo invalide. Formats acceptés: MP4, MOV"
             }), 400
         
-        print(f"📝 Données reçues: {prenom}, {age} ans, sport: {sport}")
+        print(f"📝 Données reçues: {prenom}, {player_data['age']} ans, sport: {player_data['sport']}")
         print(f"📸 Photo: {photo_file.filename}")
         print(f"🎥 Vidéo: {video_file.filename}")
         
-        # Sauvegarde temporaire des fichiers
-        photo_filename = secure_filename(photo_file.filename)
-        video_filename = secure_filename(video_file.filename)
-        
-        photo_path = os.path.join(UPLOAD_FOLDER, f"{prenom}_{photo_filename}")
-        video_path = os.path.join(UPLOAD_FOLDER, f"{prenom}_{video_filename}")
-        
-        photo_file.save(photo_path)
-        video_file.save(video_path)
+        # Les fichiers sont déjà sur disque (écrits et hachés pendant le parse):
+        # ils sont transmis au job au lieu d'être supprimés en fin de requête
+        with time_stage('file_save'):
+            photo_path, photo_sha256 = photo_file.stream.keep()
+            video_path, video_sha256 = video_file.stream.keep()
         
-        # Construction des données joueur
-        player_data = {
-            'prenom': prenom,
-            'age': int(age),
-            'sport': sport,
+        player_data.update({
             'photo_path': photo_path,
             'video_path': video_path,
-            # Données par défaut pour les tests
-            'position': 'Attaquant',
-            'club': 'SquadField Academy',
-            'stats': {
-                'technique': 85,
-                'physique': 80,
-                'mental': 90,
-                'vitesse': 88,
-                'tir': 82
-            }
-        }
-        
-        print("⚽ Application des règles SquadField...")
-        
-        # Validation des données
-        is_valid, error_msg = validate_player_data(player_data)
-        if not is_valid:
-            return jsonify({"error": f"Données invalides: {error_msg}"}), 400
-        
-        # Application des règles SquadField
-        enriched_data = apply_squadfield_rules(player_data)
-        
-        print(f"📊 Score global: {enriched_data['overall_score']}")
-        print(f"👥 Catégorie: {enriched_data['age_category']}")
-        print(f"🎨 Couleur de carte: {enriched_data['card_color']}")
-        
-        # Validation des données pour le prompt
-        is_valid, error_msg = validate_prompt_data(enriched_data)
-        if not is_valid:
-            return jsonify({"error": f"Données prompt invalides: {error_msg}"}), 400
-        
-        # Construction du prompt DALL·E
-        print("🤖 Construction du prompt DALL·E...")
-        prompt = build_dalle_prompt(enriched_data)
+            'photo_sha256': photo_sha256,
+            'video_sha256': video_sha256
+        })
         
-        print("\n" + "="*80)
-        print("📝 PROMPT GÉNÉRÉ:")
-        print("="*80)
-        print(prompt)
-        print("="*80 + "\n")
-        
-        # Génération de l'image avec DALL·E
-        image_url = generate_dalle_image(prompt, photo_path)
-        if not image_url:
-            return jsonify({"error": "Erreur de génération DALL·E"}), 500
-        
-        # Upload sur Firebase Storage
-        print("☁️ Upload sur Firebase Storage...")
-        firebase_url = upload_image_from_url(
-            image_url,
-            enriched_data['prenom'],
-            enriched_data['card_color']
-        )
-        
-        if not firebase_url:
-            print("⚠️ Erreur d'upload Firebase, mais image DALL·E disponible")
-            firebase_url = None
-        
-        # Sauvegarde du log
-        save_generation_log(enriched_data, prompt, image_url, firebase_url)
-        
-        # Nettoyage des fichiers temporaires
+        # Mise en file de la génération (DALL·E + Firebase en arrière-plan)
         try:
-            os.unlink(photo_path)
-            os.unlink(video_path)
-        except Exception as e:
-            print(f"⚠️ Erreur de nettoyage: {e}")
-        
-        # Résultat final
-        result = {
-            "success": True,
-            "player": enriched_data['prenom'],
-            "age_category": enriched_data['age_category'],
-            "overall_score": enriched_data['overall_score'],
-            "card_color": enriched_data['card_color'],
-            "dalle_url": image_url,
-            "firebase_url": firebase_url,
-            "prompt": prompt,
-            "message": "Carte générée avec succès"
-        }
+            job_id = job_queue.submit(player_data)
+        except QueueFullError as e:
+            cleanup_files(photo_path, video_path)
+            return jsonify({"error": str(e)}), 503
         
-        print("\n🎉 === GÉNÉRATION TERMINÉE AVEC SUCCÈS ===")
-        print(f"🏃‍♂️ Joueur: {result['player']}")
-        print(f"📊 Score: {result['overall_score']} ({result['card_color']})")
-        print(f"👥 Catégorie: {result['age_category']}")
-        print(f"🔗 URL DALL·E: {result['dalle_url']}")
-        if result['firebase_url']:
-            print(f"☁️ URL Firebase: {result['firebase_url']}")
-        print("="*50 + "\n")
+        print(f"📬 Job {job_id} mis en file pour {prenom}")
         
-        return jsonify(result)
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/generate/{job_id}/events",
+            "message": "Génération de carte en cours"
+        }), 202
         
     except Exception as e:
         print(f"💥 Erreur serveur: {e}")
         
         # Nettoyage en cas d'erreur
-        try:
-            if 'photo_path' in locals() and os.path.exists(photo_path):
-                os.unlink(photo_path)
-            if 'video_path' in locals() and os.path.exists(video_path):
-                os.unlink(video_path)
-        except Exception:
-            pass
+        if 'photo_path' in locals():
+            cleanup_files(photo_path)
+        if 'video_path' in locals():
+            cleanup_files(video_path)
         
         return jsonify({
             "error": f"Erreur interne du serveur: {str(e)}"
         }), 500
+    
+    finally:
+        IN_FLIGHT.dec(kind='http_generate')
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Génère les cartes de tout un effectif.
+    Accepte un JSON {"players": [...], "no_cache": false, "renderer": "dalle"} au format
+    test_players.json, ou {"names": [...]} résolus dans l'effectif indexé, valide et
+    enrichit le roster en une passe puis dépose un job par joueur.
+    """
+    data = request.get_json(silent=True) or {}
+    renderer = data.get('renderer')
+    
+    unavailable = None if renderer == 'local' else openai_unavailable_response()
+    if unavailable:
+        return unavailable
+    
+    players = data.get('players')
+    names = data.get('names')
+    unknown = []
+    
+    if players is None and isinstance(names, list) and names:
+        store = get_roster_store()
+        players = []
+        for name in names:
+            player = store.get(name) if isinstance(name, str) else None
+            if player is None:
+                unknown.append(name)
+            else:
+                players.append(player)
+        if unknown:
+            return jsonify({"error": "Joueurs introuvables dans l'effectif", "unknown": unknown}), 404
+    
+    if not isinstance(players, list) or not players:
+        return jsonify({
+            "error": "Champ 'players' (liste non vide de joueurs) ou 'names' requis"
+        }), 400
+    
+    print(f"\n👥 === DEMANDE DE GÉNÉRATION D'ÉQUIPE: {len(players)} joueurs ===")
+    
+    prepared, errors = prepare_roster(players)
+    if not prepared:
+        return jsonify({"error": "Aucun joueur valide", "errors": errors}), 400
+    
+    batch_id = uuid.uuid4().hex
+    bypass_cache = bool(data.get('no_cache'))
+    jobs = []
+    
+    for index, player, enriched_data in prepared:
+        try:
+            job_id = job_queue.submit(
+                dict(player, bypass_cache=bypass_cache, renderer=renderer),
+                checkpoint={'enriched_data': enriched_data},
+                batch_id=batch_id
+            )
+            jobs.append({"index": index, "player": player['prenom'], "job_id": job_id})
+        except QueueFullError as e:
+            errors.append({"index": index, "player": player['prenom'], "error": str(e)})
+    
+    print(f"📬 Lot {batch_id}: {len(jobs)} job(s) en file, {len(errors)} rejet(s)")
+    
+    return jsonify({
+        "success": bool(jobs),
+        "batch_id": batch_id,
+        "status_url": f"/generate/batch/{batch_id}",
+        "jobs": jobs,
+        "errors": sorted(errors, key=lambda error: error['index'])
+    }), 202 if jobs else 503
+
+@app.route('/players', methods=['GET'])
+def list_players():
+    """
+    Liste les joueurs de l'effectif indexé, filtrés par ?sport=, ?age_category=
+    et/ou ?card_color=.
+    """
+    store = get_roster_store()
+    if not store.load():
+        return jsonify({"error": "Effectif indisponible"}), 503
+    
+    players = store.query(
+        sport=request.args.get('sport'),
+        age_category=request.args.get('age_category'),
+        card_color=request.args.get('card_color')
+    )
+    return jsonify({"total": len(players), "players": players})
+
+@app.route('/players/<name>', methods=['GET'])
+def get_player(name):
+    """Retourne un joueur de l'effectif par prénom (insensible à la casse)."""
+    store = get_roster_store()
+    if not store.load():
+        return jsonify({"error": "Effectif indisponible"}), 503
+    
+    player = store.get(name)
+    if player is None:
+        return jsonify({"error": f"Joueur introuvable: {name}"}), 404
+    
+    return jsonify(player)
+
+@app.route('/cards', methods=['GET'])
+def list_cards():
+    """
+    Liste les cartes stockées sur Firebase depuis le manifeste local, des plus
+    récentes aux plus anciennes, filtrées par ?player=, ?card_color=, ?since=
+    et/ou ?until= (dates ISO), paginées par ?limit= et ?cursor=. La réponse porte
+    un ETag : un client à jour reçoit 304 sans corps.
+    """
+    manifest = get_card_manifest()
+    # Synchronisation avec le bucket en arrière-plan si le manifeste est périmé
+    manifest.refresh_async(get_uploader().get_bucket)
+    
+    try:
+        page = manifest.query(
+            player=request.args.get('player'),
+            card_color=request.args.get('card_color'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            limit=request.args.get('limit', 50, type=int),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Miniatures des cartes (srcset côté galerie)
+    derivatives = get_derivative_store().get_many(card['public_url'] for card in page['cards'])
+    for card in page['cards']:
+        record = derivatives.get(card['public_url'])
+        card['placeholder'] = record['placeholder'] if record else None
+        card['thumbnails'] = record['variants'] if record else []
+    
+    response = jsonify({
+        "count": len(page['cards']),
+        "cards": page['cards'],
+        "next_cursor": page['next_cursor']
+    })
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/cards', methods=['DELETE'])
+def delete_cards():
+    """
+    Supprime des cartes en masse (et leurs miniatures). Corps JSON: "urls"
+    (liste d'URLs) et/ou filtres du manifeste "player", "card_color",
+    "older_than_days". Retourne le résultat de chaque objet (207 si certains
+    ont échoué).
+    """
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls') or []
+    older_than_days = data.get('older_than_days')
+    
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({"error": "urls doit être une liste d'URLs"}), 400
+    if older_than_days is not None and (isinstance(older_than_days, bool) or
+                                        not isinstance(older_than_days, (int, float)) or older_than_days < 0):
+        return jsonify({"error": "older_than_days doit être un nombre positif"}), 400
+    if not (urls or data.get('player') or data.get('card_color') or older_than_days is not None):
+        return jsonify({"error": "Aucune carte désignée (urls, player, card_color ou older_than_days)"}), 400
+    
+    report = delete_images(
+        urls=urls,
+        player=data.get('player'),
+        card_color=data.get('card_color'),
+        older_than=older_than_days * 86400 if older_than_days is not None else None
+    )
+    return jsonify(report), 207 if report['failed'] else 200
+
+@app.route('/generate/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Flux Server-Sent Events des étapes d'un job (fichiers enregistrés, règles,
+    prompt, DALL·E, Firebase) avec leurs durées, jusqu'au résultat final.
+    """
+    if not job_queue.get(job_id):
+        return jsonify({"error": f"Job introuvable: {job_id}"}), 404
+    
+    return Response(
+        stream_with_context(stream_job_events(job_queue, job_id)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Pas de mise en tampon côté nginx
+        }
+    )
+
+@app.route('/generate/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Retourne le statut et le résultat de chaque carte d'un lot."""
+    jobs = job_queue.get_batch(batch_id)
+    if not jobs:
+        return jsonify({"error": f"Lot introuvable: {batch_id}"}), 404
+    
+    statuses = [job['status'] for job in jobs]
+    return jsonify({
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "completed": statuses.count('completed'),
+        "failed": statuses.count('failed'),
+        "pending": statuses.count('queued') + statuses.count('running'),
+        "jobs": jobs
+    })
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Retourne le statut et le résultat d'un job de génération."""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": f"Job introuvable: {job_id}"}), 404
+    
+    return jsonify(job)
 
 @app.errorhandler(413)
 def too_large(e):
@@ -324,10 +552,24 @@ if __name__ == '__main__':
         print("⚠️ Configuration Firebase incomplète")
         print("ℹ️ L'upload Firebase sera désactivé")
     
+    # Initialisation immédiate dans le processus qui sert les requêtes (le processus
+    # parent du reloader Flask ne sert rien) ; sinon à la première requête
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        startup()
+    
     print("\n🌐 Serveur démarré sur http://localhost:5000")
     print("📍 Endpoints disponibles:")
     print("  GET  /health  - Vérification de santé")
-    print("  POST /generate - Génération de carte")
+    print("  GET  /metrics - Métriques Prometheus")
+    print("  POST /generate - Génération de carte (asynchrone)")
+    print("  GET  /jobs/<id> - Statut d'un job de génération")
+    print("  GET  /generate/<id>/events - Étapes d'un job en direct (SSE)")
+    print("  POST /generate/batch - Génération d'un effectif complet")
+    print("  GET  /generate/batch/<id> - Statut d'un lot")
+    print("  GET  /players - Effectif indexé (filtres sport, age_category, card_color)")
+    print("  GET  /players/<prenom> - Données d'un joueur")
+    print("  GET  /cards - Cartes stockées (filtres player, card_color, since, until ; pagination)")
+    print("  DELETE /cards - Suppression en masse (urls ou filtres player, card_color, older_than_days)")
     print("="*50 + "\n")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,354 @@
+"""
+Atlas de fonds de cartes pré-générés, par couleur de carte et catégorie d'âge.
+
+Il n'existe que 8 couleurs et 9 catégories d'âge : les fonds sont générés une
+fois, hors ligne (DALL·E ou dessin local), stockés sur disque et sur Firebase.
+Au démarrage, un cache LRU en mémoire les charge ; chaque carte ne compose
+alors que la couche propre au joueur (portrait, prénom, note, stats).
+
+Usage hors ligne:
+    python background_atlas.py --variants 3 --source dalle
+    python background_atlas.py --colors doré star --categories U12 Elite --source local
+"""
+
+import os
+import sys
+import json
+import zlib
+import random
+import argparse
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+from PIL import Image, ImageDraw, ImageOps
+
+# Import des modules locaux
+from rules import AGE_CATEGORIES
+from prompt_builder import build_background_prompt
+from firebase_uploader import get_uploader, upload_image_from_bytes
+from card_renderer import CARD_COLORS, CARD_PALETTES, CARD_SIZE, build_background
+
+# Chargement des variables d'environnement
+load_dotenv()
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class BackgroundAtlas:
+    """
+    Bibliothèque de fonds sur disque ({atlas_dir}/{couleur}/{catégorie}_{n}.png)
+    avec un cache LRU en mémoire.
+    """
+
+    def __init__(self, atlas_dir=None, max_entries=None):
+        """
+        Args:
+            atlas_dir (str, optional): Dossier de l'atlas (défaut: BACKGROUND_ATLAS_DIR ou data/backgrounds)
+            max_entries (int, optional): Fonds gardés en mémoire (défaut: BACKGROUND_CACHE_SIZE ou 24)
+        """
+        self.atlas_dir = atlas_dir or os.getenv('BACKGROUND_ATLAS_DIR', 'data/backgrounds')
+        self.max_entries = max_entries or int(os.getenv('BACKGROUND_CACHE_SIZE', '24'))
+        self._variants = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def variant_path(self, card_color, age_category, variant):
+        """Chemin disque d'une variante de fond."""
+        return os.path.join(self.atlas_dir, card_color, f"{age_category}_{variant}.png")
+
+    def refresh(self):
+        """
+        Indexe les variantes présentes sur disque.
+
+        Returns:
+            int: Nombre de fonds disponibles
+        """
+        variants = {}
+        for card_color in CARD_COLORS:
+            color_dir = os.path.join(self.atlas_dir, card_color)
+            if not os.path.isdir(color_dir):
+                continue
+            for filename in sorted(os.listdir(color_dir)):
+                name, extension = os.path.splitext(filename)
+                category, _, variant = name.rpartition('_')
+                if extension == '.png' and category in AGE_CATEGORIES and variant.isdigit():
+                    variants.setdefault((card_color, category), []).append(int(variant))
+
+        with self._lock:
+            self._variants = variants
+        return sum(len(found) for found in variants.values())
+
+    def preload(self):
+        """
+        Charge les fonds de l'atlas en mémoire (dans la limite du cache LRU).
+
+        Returns:
+            int: Nombre de fonds chargés
+        """
+        with self._lock:
+            keys = [(card_color, category, variant)
+                    for (card_color, category), found in self._variants.items()
+                    for variant in found]
+
+        loaded = 0
+        for key in keys[:self.max_entries]:
+            if self._load(*key) is not None:
+                loaded += 1
+        print(f"🖼️ Atlas de fonds: {loaded}/{len(keys)} fond(s) chargé(s) en mémoire")
+        return loaded
+
+    def _load(self, card_color, age_category, variant):
+        """Retourne un fond depuis le cache LRU, ou le lit sur disque."""
+        key = (card_color, age_category, variant)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        try:
+            with Image.open(self.variant_path(*key)) as image:
+                background = image.convert('RGB')
+        except OSError as e:
+            print(f"⚠️ Fond illisible {key}: {e}")
+            return None
+
+        with self._lock:
+            self._cache[key] = background
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return background
+
+    def get(self, card_color, age_category, seed=None):
+        """
+        Retourne un fond pré-généré pour une couleur et une catégorie.
+
+        Args:
+            card_color (str): Couleur de carte
+            age_category (str): Catégorie d'âge
+            seed (str, optional): Choix stable de la variante (ex: prénom du joueur)
+
+        Returns:
+            Image.Image: Fond partagé (à copier avant de dessiner), None si absent de l'atlas
+        """
+        with self._lock:
+            found = self._variants.get((card_color, age_category))
+        if not found:
+            return None
+
+        variant = found[zlib.crc32((seed or '').encode('utf-8')) % len(found)]
+        return self._load(card_color, age_category, variant)
+
+    def add(self, card_color, age_category, variant, image):
+        """
+        Enregistre une variante de fond sur disque et dans l'index.
+
+        Returns:
+            tuple: (chemin du fichier, PNG encodé)
+        """
+        path = self.variant_path(card_color, age_category, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        with open(path, 'wb') as f:
+            f.write(buffer.getvalue())
+
+        with self._lock:
+            found = self._variants.setdefault((card_color, age_category), [])
+            if variant not in found:
+                found.append(variant)
+                found.sort()
+            self._cache.pop((card_color, age_category, variant), None)
+        return path, buffer.getvalue()
+
+    def stats(self):
+        """Retourne la taille de l'atlas et du cache mémoire."""
+        with self._lock:
+            return {
+                "backgrounds": sum(len(found) for found in self._variants.values()),
+                "pairs": len(self._variants),
+                "in_memory": len(self._cache),
+                "max_in_memory": self.max_entries
+            }
+
+
+_atlas = None
+_atlas_lock = threading.Lock()
+
+
+def get_background_atlas():
+    """
+    Retourne l'atlas de fonds partagé du processus.
+
+    Returns:
+        BackgroundAtlas: Instance unique, créée au premier appel
+    """
+    global _atlas
+    with _atlas_lock:
+        if _atlas is None:
+            _atlas = BackgroundAtlas()
+        return _atlas
+
+
+def draw_local_background(card_color, age_category, variant):
+    """
+    Dessine une variante de fond sans appel API (dégradé de la couleur et
+    lignes de vitesse propres à la catégorie).
+
+    Args:
+        card_color (str): Couleur de carte
+        age_category (str): Catégorie d'âge
+        variant (int): Numéro de variante (graine du motif)
+
+    Returns:
+        Image.Image: Fond RGB
+    """
+    background = build_background(card_color, CARD_SIZE)
+    accent = CARD_PALETTES[card_color][2]
+    width, height = CARD_SIZE
+    draw = ImageDraw.Draw(background, 'RGBA')
+
+    rng = random.Random(f"{card_color}/{age_category}/{variant}")
+    level = AGE_CATEGORIES.index(age_category) + 1
+    for _ in range(4 + 2 * level):
+        y = rng.randrange(height)
+        slope = rng.uniform(-0.4, -0.1) * width
+        draw.line([(0, y), (width, y + slope)], fill=accent + (rng.randrange(20, 60),),
+                  width=rng.randrange(2, 6 + level))
+    return background
+
+
+def generate_dalle_background(card_color, age_category):
+    """
+    Génère un fond avec DALL·E (via l'ordonnanceur et le disjoncteur partagés).
+
+    Returns:
+        Image.Image: Fond RGB redimensionné à la taille des cartes, None si erreur
+    """
+    # Import tardif: card_pipeline utilise lui-même l'atlas
+    from card_pipeline import generate_dalle_image
+
+    image_url = generate_dalle_image(build_background_prompt(card_color, age_category))
+    if not image_url:
+        return None
+
+    try:
+        with get_uploader().download(image_url) as response:
+            response.raise_for_status()
+            with Image.open(BytesIO(response.content)) as image:
+                return ImageOps.fit(image.convert('RGB'), CARD_SIZE)
+    except Exception as e:
+        print(f"❌ Erreur de téléchargement du fond: {e}")
+        return None
+
+
+def build_atlas(colors=None, categories=None, variants=1, source='local', upload=True, atlas=None):
+    """
+    Pré-génère les fonds de l'atlas pour chaque couple (couleur, catégorie).
+
+    Les variantes déjà présentes sur disque ne sont pas régénérées.
+
+    Args:
+        colors (list, optional): Couleurs à générer (défaut: les 8 couleurs)
+        categories (list, optional): Catégories à générer (défaut: toutes)
+        variants (int): Variantes par couple
+        source (str): 'local' (dessin Pillow) ou 'dalle'
+        upload (bool): Uploader chaque fond sur Firebase (dossier card_backgrounds)
+        atlas (BackgroundAtlas, optional): Atlas cible (défaut: atlas partagé)
+
+    Returns:
+        dict: generated, skipped, failed et le manifeste {couleur: {catégorie: [entrées]}}
+    """
+    atlas = atlas or get_background_atlas()
+    manifest_path = os.path.join(atlas.atlas_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    summary = {"generated": 0, "skipped": 0, "failed": 0}
+    for card_color in colors or CARD_COLORS:
+        for age_category in categories or AGE_CATEGORIES:
+            for variant in range(variants):
+                if os.path.exists(atlas.variant_path(card_color, age_category, variant)):
+                    summary['skipped'] += 1
+                    continue
+
+                print(f"🎨 Fond {card_color} / {age_category} (variante {variant})...")
+                if source == 'dalle':
+                    image = generate_dalle_background(card_color, age_category)
+                else:
+                    image = draw_local_background(card_color, age_category, variant)
+                if image is None:
+                    summary['failed'] += 1
+                    continue
+
+                path, png_bytes = atlas.add(card_color, age_category, variant, image)
+                firebase_url = None
+                if upload:
+                    firebase_url = upload_image_from_bytes(
+                        png_bytes, age_category, card_color, prefix='card_backgrounds'
+                    )
+
+                manifest.setdefault(card_color, {}).setdefault(age_category, []).append({
+                    "variant": variant,
+                    "path": path,
+                    "source": source,
+                    "firebase_url": firebase_url,
+                    "created_at": datetime.now().isoformat()
+                })
+                summary['generated'] += 1
+
+    os.makedirs(atlas.atlas_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    print(f"📊 Atlas: {summary['generated']} généré(s), {summary['skipped']} déjà présent(s), "
+          f"{summary['failed']} en échec")
+    summary['manifest'] = manifest
+    return summary
+
+
+def main():
+    """
+    Commande de pré-génération de l'atlas de fonds.
+    """
+    parser = argparse.ArgumentParser(
+        description="Pré-génération des fonds de cartes SquadField par couleur et catégorie"
+    )
+    parser.add_argument('--colors', nargs='+', choices=CARD_COLORS, help="Couleurs à générer (défaut: toutes)")
+    parser.add_argument('--categories', nargs='+', choices=AGE_CATEGORIES,
+                        help="Catégories d'âge à générer (défaut: toutes)")
+    parser.add_argument('--variants', type=int, default=1, help="Variantes par couple (défaut: 1)")
+    parser.add_argument('--source', choices=['local', 'dalle'], default='local',
+                        help="Dessin local (gratuit) ou génération DALL·E")
+    parser.add_argument('--no-upload', action='store_true', help="Ne pas uploader les fonds sur Firebase")
+
+    args = parser.parse_args()
+
+    print("🖼️ === PRÉ-GÉNÉRATION DE L'ATLAS DE FONDS ===\n")
+
+    if args.source == 'dalle':
+        import openai
+        if not os.getenv('OPENAI_API_KEY'):
+            print("❌ OPENAI_API_KEY manquante dans .env")
+            sys.exit(1)
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+
+    summary = build_atlas(
+        colors=args.colors,
+        categories=args.categories,
+        variants=args.variants,
+        source=args.source,
+        upload=not args.no_upload
+    )
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Déclinaisons légères des cartes générées pour les galeries (miniatures WebP/AVIF).
+
+Les galeries affichent des vignettes de quelques centaines de pixels : charger
+la carte PNG 1024px pour chacune multiplie le poids des pages. Après chaque
+carte, un pool de processus produit des miniatures à quelques largeurs fixes
+(WebP, et AVIF si Pillow le supporte) et un aperçu flou minuscule (data URL,
+affiché pendant le chargement). Les miniatures sont uploadées sur Firebase et
+l'ensemble est enregistré par URL de carte, pour que les clients choisissent
+la bonne taille (srcset).
+"""
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from PIL import Image, ImageFilter, features
+
+from firebase_uploader import get_uploader, upload_image_from_bytes
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS card_derivatives (
+    card_url TEXT PRIMARY KEY,
+    placeholder TEXT,
+    variants TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Formats de miniatures supportés, par ordre de préférence côté client
+THUMB_FORMATS = ('avif', 'webp')
+
+# Largeur de l'aperçu flou (agrandi et flouté par le navigateur)
+PLACEHOLDER_WIDTH = 16
+
+
+def is_derivatives_enabled():
+    """Les miniatures peuvent être désactivées globalement avec CARD_THUMBS_ENABLED=false."""
+    return os.getenv('CARD_THUMBS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+def available_formats(formats=None):
+    """
+    Formats de miniatures demandés et supportés par Pillow.
+
+    Args:
+        formats (list, optional): Formats demandés (défaut: CARD_THUMB_FORMATS ou webp,avif)
+
+    Returns:
+        list: Formats retenus, dans l'ordre de THUMB_FORMATS
+    """
+    requested = formats or os.getenv('CARD_THUMB_FORMATS', 'webp,avif').split(',')
+    requested = {name.strip().lower() for name in requested}
+    return [name for name in THUMB_FORMATS if name in requested and features.check(name)]
+
+
+def thumb_widths():
+    """Largeurs des miniatures (CARD_THUMB_WIDTHS, défaut 256,512)."""
+    return sorted(int(width) for width in os.getenv('CARD_THUMB_WIDTHS', '256,512').split(',') if width.strip())
+
+
+def build_derivatives(image_bytes, widths, formats, quality=None):
+    """
+    Produit les miniatures et l'aperçu flou d'une carte (exécuté dans un processus du pool).
+
+    Les largeurs supérieures ou égales à celle de la carte sont ignorées.
+
+    Args:
+        image_bytes (bytes): Carte d'origine (PNG)
+        widths (list): Largeurs des miniatures
+        formats (list): Formats des miniatures ('webp', 'avif')
+        quality (int, optional): Qualité d'encodage (défaut: CARD_THUMB_QUALITY ou 75)
+
+    Returns:
+        dict: placeholder (data URL) et variants [{width, height, format, data}]
+    """
+    quality = quality or int(os.getenv('CARD_THUMB_QUALITY', '75'))
+    with Image.open(BytesIO(image_bytes)) as source:
+        image = source.convert('RGBA') if source.mode in ('RGBA', 'LA', 'P') else source.convert('RGB')
+
+    variants = []
+    for width in sorted(set(widths)):
+        if width >= image.width:
+            continue
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for name in formats:
+            buffer = BytesIO()
+            resized.save(buffer, format=name.upper(), quality=quality)
+            variants.append({"width": width, "height": height, "format": name, "data": buffer.getvalue()})
+
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    tiny = image.convert('RGB').resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR)
+    buffer = BytesIO()
+    tiny.filter(ImageFilter.GaussianBlur(1)).save(buffer, format='WEBP', quality=30)
+    placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    return {"placeholder": placeholder, "variants": variants}
+
+
+class DerivativeStore:
+    """
+    Miniatures de chaque carte (URL de carte -> aperçu flou et variantes), persistées dans SQLite.
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str, optional): Base SQLite (défaut: CARD_DERIVATIVES_DB_PATH ou data/card_derivatives.db)
+        """
+        self.db_path = db_path or os.getenv('CARD_DERIVATIVES_DB_PATH', 'data/card_derivatives.db')
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    @staticmethod
+    def _record(row):
+        return {"card_url": row['card_url'], "placeholder": row['placeholder'],
+                "variants": json.loads(row['variants'])}
+
+    def get(self, card_url):
+        """
+        Retourne les miniatures d'une carte.
+
+        Returns:
+            dict: {card_url, placeholder, variants [{width, height, format, url}]}, None si absentes
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM card_derivatives WHERE card_url = ?", (card_url,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def get_many(self, card_urls):
+        """
+        Retourne les miniatures de plusieurs cartes en une requête.
+
+        Returns:
+            dict: {card_url: record} pour les cartes qui en ont
+        """
+        card_urls = list(card_urls)
+        if not card_urls:
+            return {}
+        placeholders = ','.join('?' * len(card_urls))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM card_derivatives WHERE card_url IN ({placeholders})", card_urls
+            ).fetchall()
+        return {row['card_url']: self._record(row) for row in rows}
+
+    def put(self, card_url, placeholder, variants):
+        """Enregistre les miniatures d'une carte."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO card_derivatives (card_url, placeholder, variants, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (card_url, placeholder, json.dumps(variants), time.time())
+            )
+            self._conn.commit()
+
+    def forget(self, card_url):
+        """Supprime les miniatures enregistrées d'une carte."""
+        with self._lock:
+            self._conn.execute("DELETE FROM card_derivatives WHERE card_url = ?", (card_url,))
+            self._conn.commit()
+
+
+_derivative_store = None
+_derivative_store_lock = threading.Lock()
+
+
+def get_derivative_store():
+    """
+    Retourne le registre des miniatures partagé du processus.
+
+    Returns:
+        DerivativeStore: Instance unique, créée au premier appel
+    """
+    global _derivative_store
+    with _derivative_store_lock:
+        if _derivative_store is None:
+            _derivative_store = DerivativeStore()
+        return _derivative_store
+
+
+_derivative_pool = None
+_derivative_pool_lock = threading.Lock()
+
+
+def get_derivative_pool():
+    """
+    Retourne le pool de processus des miniatures partagé.
+
+    Returns:
+        ProcessPoolExecutor: Pool de CARD_THUMB_WORKERS processus (défaut 2), démarrés
+            en 'spawn' pour ne pas hériter des threads du serveur
+    """
+    global _derivative_pool
+    with _derivative_pool_lock:
+        if _derivative_pool is None:
+            _derivative_pool = ProcessPoolExecutor(
+                max_workers=int(os.getenv('CARD_THUMB_WORKERS', '2')),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _derivative_pool
+
+
+def _download(url):
+    """Télécharge une carte sur la session HTTP poolée de l'uploader."""
+    with get_uploader().download(url) as response:
+        response.raise_for_status()
+        return response.content
+
+
+def create_card_derivatives(card_url, player_name, card_color, image_bytes=None):
+    """
+    Produit, uploade et enregistre les miniatures d'une carte stockée sur Firebase.
+
+    Args:
+        card_url (str): URL Firebase de la carte (clé du registre)
+        player_name (str): Nom du joueur pour le nommage
+        card_color (str): Couleur de la carte pour le nommage
+        image_bytes (bytes, optional): Carte d'origine (téléchargée depuis card_url sinon)
+
+    Returns:
+        dict: {card_url, placeholder, variants [{width, height, format, url}]}, None si
+              désactivé ou en échec (la carte reste utilisable en taille réelle)
+    """
+    if not card_url or not is_derivatives_enabled():
+        return None
+
+    store = get_derivative_store()
+    existing = store.get(card_url)
+    if existing:
+        print("⚡ Miniatures déjà produites pour cette carte")
+        return existing
+
+    formats = available_formats()
+    widths = thumb_widths()
+    if not formats or not widths:
+        return None
+
+    try:
+        if image_bytes is None:
+            image_bytes = _download(card_url)
+        future = get_derivative_pool().submit(build_derivatives, image_bytes, widths, formats)
+        built = future.result(timeout=float(os.getenv('CARD_THUMB_TIMEOUT', '30')))
+    except FutureTimeoutError:
+        print("⚠️ Miniatures non produites: délai dépassé")
+        return None
+    except Exception as e:
+        print(f"⚠️ Miniatures non produites: {e}")
+        return None
+
+    variants = []
+    for variant in built['variants']:
+        url = upload_image_from_bytes(
+            variant['data'], player_name, card_color,
+            file_extension=f".{variant['format']}", prefix=f"cards_thumbs/w{variant['width']}"
+        )
+        if not url:
+            print("⚠️ Upload des miniatures incomplet, carte servie en taille réelle")
+            return None
+        variants.append({"width": variant['width'], "height": variant['height'],
+                         "format": variant['format'], "url": url})
+
+    store.put(card_url, built['placeholder'], variants)
+    print(f"🖼️ {len(variants)} miniature(s) produite(s) ({', '.join(formats)})")
+    return {"card_url": card_url, "placeholder": built['placeholder'], "variants": variants}
@@ -0,0 +1,368 @@
+"""
+Manifeste local des cartes IA stockées sur Firebase (dossier cards_ai/).
+
+Lister le bucket à chaque appel coûte proportionnellement au nombre de cartes.
+Le manifeste garde une ligne par carte dans SQLite (joueur, couleur, date,
+taille, hash, URL publique), lues depuis le schéma de nommage
+{joueur}_{couleur}_{AAAAMMJJ}_{HHMMSS}_{suffixe}{extension}. Les uploads et
+suppressions le tiennent à jour directement ; une synchronisation incrémentale
+avec le listing du bucket (seuls les objets nouveaux ou modifiés sont écrits)
+rattrape les changements faits ailleurs. Les requêtes sont paginées par
+curseur et servies par les index, quelle que soit la taille du bucket.
+"""
+
+import os
+import re
+import time
+import base64
+import sqlite3
+import threading
+from datetime import datetime
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    name TEXT PRIMARY KEY,
+    player TEXT NOT NULL,
+    player_key TEXT NOT NULL,
+    card_color TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    size INTEGER,
+    content_hash TEXT,
+    md5 TEXT,
+    generation TEXT,
+    public_url TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cards_created ON cards(created_at, name);
+CREATE INDEX IF NOT EXISTS idx_cards_player ON cards(player_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_cards_color ON cards(card_color, created_at);
+CREATE TABLE IF NOT EXISTS manifest_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Dossier des cartes dans le bucket et extensions reconnues
+CARDS_PREFIX = 'cards_ai/'
+CARD_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+_CARD_NAME = re.compile(
+    r"^cards_ai/(?P<player>[^/]+)_(?P<color>[^_/]+)_(?P<date>\d{8})_(?P<time>\d{6})"
+    r"_(?P<suffix>[^_/.]+)(?P<extension>\.[A-Za-z0-9]+)$"
+)
+_SHA256_PREFIX = re.compile(r"^[0-9a-f]{16}$")
+
+# Champs demandés au listing du bucket (pas de métadonnées inutiles)
+LISTING_FIELDS = 'items(name,size,md5Hash,generation),nextPageToken'
+
+MAX_PAGE_SIZE = 200
+
+
+def parse_card_name(name):
+    """
+    Lit joueur, couleur, date et hash dans le nom d'un objet carte.
+
+    Args:
+        name (str): Nom de l'objet (cards_ai/{joueur}_{couleur}_{AAAAMMJJ}_{HHMMSS}_{suffixe}.png)
+
+    Returns:
+        dict: player, card_color, created_at (ISO), content_hash (début du SHA-256,
+              None pour les anciens noms à uuid), None si le nom ne suit pas le schéma
+    """
+    match = _CARD_NAME.match(name or '')
+    if not match or match.group('extension').lower() not in CARD_EXTENSIONS:
+        return None
+    try:
+        created_at = datetime.strptime(match.group('date') + match.group('time'), "%Y%m%d%H%M%S")
+    except ValueError:
+        return None
+    suffix = match.group('suffix')
+    return {
+        "player": match.group('player'),
+        "card_color": match.group('color'),
+        "created_at": created_at.isoformat(),
+        "content_hash": suffix if _SHA256_PREFIX.match(suffix) else None
+    }
+
+
+def encode_cursor(created_at, name):
+    """Curseur opaque de pagination (dernière carte de la page)."""
+    return base64.urlsafe_b64encode(f"{created_at}|{name}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Décode un curseur de pagination.
+
+    Raises:
+        ValueError: Si le curseur est invalide
+    """
+    try:
+        created_at, name = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+    except Exception:
+        raise ValueError("Curseur de pagination invalide")
+    return created_at, name
+
+
+class CardManifest:
+    """
+    Manifeste SQLite des cartes du bucket, synchronisé de façon incrémentale.
+    """
+
+    def __init__(self, db_path=None, sync_interval=None):
+        """
+        Args:
+            db_path (str, optional): Base SQLite (défaut: CARD_MANIFEST_DB_PATH ou data/card_manifest.db)
+            sync_interval (int, optional): Secondes entre deux synchronisations avec le
+                bucket (défaut: CARD_MANIFEST_SYNC_INTERVAL ou 300)
+        """
+        self.db_path = db_path or os.getenv('CARD_MANIFEST_DB_PATH', 'data/card_manifest.db')
+        self.sync_interval = sync_interval if sync_interval is not None else \
+            int(os.getenv('CARD_MANIFEST_SYNC_INTERVAL', '300'))
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM manifest_meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO manifest_meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _upsert(self, name, public_url, size, md5, generation):
+        """Écrit une carte (verrou tenu). Retourne False si le nom ne suit pas le schéma."""
+        parsed = parse_card_name(name)
+        if parsed is None:
+            return False
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cards (name, player, player_key, card_color, created_at, size, "
+            "content_hash, md5, generation, public_url, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, parsed['player'], parsed['player'].casefold(), parsed['card_color'], parsed['created_at'],
+             size, parsed['content_hash'], md5, None if generation is None else str(generation), public_url,
+             time.time())
+        )
+        return True
+
+    def record(self, name, public_url, size=None, md5=None, generation=None):
+        """
+        Ajoute une carte tout juste uploadée.
+
+        Returns:
+            bool: False si le nom ne suit pas le schéma des cartes
+        """
+        with self._lock:
+            recorded = self._upsert(name, public_url, size, md5, generation)
+            self._conn.commit()
+        return recorded
+
+    def forget(self, name):
+        """
+        Retire une carte supprimée du bucket.
+
+        Returns:
+            bool: True si la carte était dans le manifeste
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM cards WHERE name = ?", (name,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def sync(self, blobs):
+        """
+        Synchronise le manifeste avec un listing du bucket.
+
+        Seules les cartes nouvelles ou modifiées (génération différente) sont
+        écrites ; celles absentes du listing sont retirées (sauf les cartes
+        uploadées pendant le listing).
+
+        Args:
+            blobs (iterable): Objets du listing (name, size, md5_hash, generation, public_url)
+
+        Returns:
+            dict: added, updated, removed, total
+        """
+        started = time.time()
+        with self._lock:
+            known = {row['name']: row['generation'] for row in
+                     self._conn.execute("SELECT name, generation FROM cards")}
+        seen = set()
+        added = updated = 0
+        pending = []
+        for blob in blobs:
+            name = blob.name
+            if not name.startswith(CARDS_PREFIX) or parse_card_name(name) is None:
+                continue
+            seen.add(name)
+            generation = None if blob.generation is None else str(blob.generation)
+            if name in known and known[name] == generation:
+                continue
+            pending.append((name, blob.public_url, blob.size, blob.md5_hash, generation))
+            if name in known:
+                updated += 1
+            else:
+                added += 1
+
+        removed = [name for name in known if name not in seen]
+        with self._lock:
+            for entry in pending:
+                self._upsert(*entry)
+            removed = self._conn.executemany("DELETE FROM cards WHERE name = ? AND recorded_at < ?",
+                                             [(name, started) for name in removed]).rowcount
+            self._set_meta('last_sync', time.time())
+            self._conn.commit()
+            total = self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+        if pending or removed:
+            print(f"📋 Manifeste des cartes: {added} ajoutée(s), {updated} modifiée(s), "
+                  f"{removed} retirée(s)")
+        return {"added": added, "updated": updated, "removed": removed, "total": total}
+
+    def last_sync(self):
+        """Horodatage de la dernière synchronisation, None si jamais synchronisé."""
+        with self._lock:
+            value = self._get_meta('last_sync')
+        return float(value) if value is not None else None
+
+    def is_stale(self):
+        """True si la dernière synchronisation date de plus de sync_interval."""
+        last_sync = self.last_sync()
+        return last_sync is None or time.time() - last_sync > self.sync_interval
+
+    def sync_bucket(self, bucket, force=False):
+        """
+        Synchronise avec le bucket si le manifeste est périmé (une seule à la fois).
+
+        Args:
+            bucket (Bucket): Bucket Firebase Storage
+            force (bool): Synchroniser même si le manifeste est récent
+
+        Returns:
+            dict: Résultat de sync, None si rien n'a été fait
+        """
+        if bucket is None or not (force or self.is_stale()):
+            return None
+        if not self._sync_lock.acquire(blocking=False):
+            return None
+        try:
+            return self.sync(bucket.list_blobs(prefix=CARDS_PREFIX, fields=LISTING_FIELDS))
+        except Exception as e:
+            print(f"⚠️ Synchronisation du manifeste impossible: {e}")
+            return None
+        finally:
+            self._sync_lock.release()
+
+    def refresh_async(self, get_bucket):
+        """
+        Lance la synchronisation en arrière-plan si le manifeste est périmé ;
+        les requêtes sont servies en attendant par le manifeste courant.
+
+        Args:
+            get_bucket (callable): Retourne le bucket (appelé dans le thread)
+        """
+        if self.is_stale() and not self._sync_lock.locked():
+            threading.Thread(target=lambda: self.sync_bucket(get_bucket()), daemon=True).start()
+
+    def _where(self, player=None, card_color=None, since=None, until=None, older_than=None):
+        """Clause WHERE et paramètres des filtres."""
+        clauses, params = [], []
+        if player:
+            clauses.append("player_key = ?")
+            params.append(player.casefold())
+        if card_color:
+            clauses.append("card_color = ?")
+            params.append(card_color)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if older_than is not None:
+            clauses.append("created_at < ?")
+            params.append(datetime.fromtimestamp(time.time() - older_than).isoformat())
+        return clauses, params
+
+    def query(self, player=None, card_color=None, since=None, until=None, older_than=None,
+              limit=50, cursor=None):
+        """
+        Liste les cartes, des plus récentes aux plus anciennes, page par page.
+
+        Args:
+            player (str, optional): Prénom du joueur (insensible à la casse)
+            card_color (str, optional): Couleur de carte
+            since (str, optional): Date ISO minimale incluse
+            until (str, optional): Date ISO maximale exclue
+            older_than (float, optional): Âge minimal des cartes en secondes
+            limit (int): Cartes par page (max MAX_PAGE_SIZE)
+            cursor (str, optional): Curseur retourné par la page précédente
+
+        Returns:
+            dict: cards (name, player, card_color, created_at, size, content_hash, public_url)
+                  et next_cursor (None à la dernière page)
+
+        Raises:
+            ValueError: Si le curseur est invalide
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = self._where(player, card_color, since, until, older_than)
+        if cursor:
+            created_at, name = decode_cursor(cursor)
+            clauses.append("(created_at < ? OR (created_at = ? AND name < ?))")
+            params.extend([created_at, created_at, name])
+
+        sql = ("SELECT name, player, card_color, created_at, size, content_hash, public_url FROM cards"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + " ORDER BY created_at DESC, name DESC LIMIT ?")
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit + 1]).fetchall()
+
+        cards = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(cards[-1]['created_at'], cards[-1]['name']) if len(rows) > limit else None
+        return {"cards": cards, "next_cursor": next_cursor}
+
+    def iter_cards(self, batch_size=500, **filters):
+        """Parcourt toutes les cartes correspondant aux filtres de query, page par page."""
+        cursor = None
+        while True:
+            page = self.query(limit=batch_size, cursor=cursor, **filters)
+            yield from page['cards']
+            cursor = page['next_cursor']
+            if cursor is None:
+                return
+
+    def stats(self):
+        """Retourne le nombre de cartes, leur taille totale et la dernière synchronisation."""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cards").fetchone()
+            last_sync = self._get_meta('last_sync')
+        return {"cards": row[0], "bytes": row[1],
+                "last_sync": float(last_sync) if last_sync is not None else None}
+
+
+_card_manifest = None
+_card_manifest_lock = threading.Lock()
+
+
+def get_card_manifest():
+    """
+    Retourne le manifeste des cartes partagé du processus.
+
+    Returns:
+        CardManifest: Instance unique, créée au premier appel
+    """
+    global _card_manifest
+    with _card_manifest_lock:
+        if _card_manifest is None:
+            _card_manifest = CardManifest()
+        return _card_manifest
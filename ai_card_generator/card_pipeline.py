@@ -0,0 +1,574 @@
+"""
+Pipeline de génération d'une carte SquadField (règles, prompt, DALL·E, Firebase).
+
+Ce module est exécuté par les workers de la file de jobs, en dehors des
+requêtes HTTP du serveur Flask.
+"""
+
+import os
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import openai
+
+# Import des modules locaux
+from rules import apply_squadfield_rules, apply_squadfield_rules_bulk
+from player_schema import validate_roster, validate_prompt_fields, format_errors
+from scratch_space import get_scratch_space
+from video_frames import extract_video_frames, best_portrait_frame
+from video_analysis import analyze_video_stats, get_cached_analysis
+from prompt_builder import build_dalle_prompt, validate_prompt_data
+from firebase_uploader import upload_image_from_url, upload_image_from_bytes
+from card_renderer import render_card_bytes
+from card_derivatives import create_card_derivatives
+from background_atlas import get_background_atlas
+from metrics import time_stage, record_card, IN_FLIGHT
+from generation_log import get_generation_log
+from image_cache import compute_cache_key, get_image_cache, is_cache_enabled
+from singleflight import SingleFlight
+from openai_scheduler import get_image_scheduler, is_retryable
+from circuit_breaker import get_breaker, CircuitOpenError, OPEN
+
+
+# Disjoncteur OpenAI: seules les pannes (429, 5xx, réseau) l'ouvrent
+openai_breaker = get_breaker('openai', error_filter=is_retryable)
+
+
+# Moteurs de rendu disponibles
+RENDERERS = ('dalle', 'local')
+
+
+# Générations en cours, coalescées par clé de prompt
+image_flights = SingleFlight()
+
+
+# Client OpenAI partagé (pool de connexions HTTP réutilisé entre les générations)
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+
+class GenerationError(Exception):
+    """Erreur métier levée par une étape du pipeline de génération."""
+
+
+def get_openai_client():
+    """
+    Retourne le client OpenAI partagé du processus.
+
+    Les retries sont désactivés côté SDK : ils sont gérés par l'ordonnanceur.
+
+    Returns:
+        openai.OpenAI: Client unique, créé au premier appel
+    """
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            _openai_client = openai.OpenAI(
+                api_key=openai.api_key or os.getenv('OPENAI_API_KEY'),
+                timeout=float(os.getenv('OPENAI_TIMEOUT', '120')),
+                max_retries=0
+            )
+        return _openai_client
+
+
+def get_dalle_settings():
+    """
+    Retourne les réglages DALL·E lus dans l'environnement.
+
+    Returns:
+        dict: model, size et quality
+    """
+    return {
+        "model": os.getenv('DALLE_MODEL', 'dall-e-3'),
+        "size": os.getenv('DALLE_SIZE', '1024x1024'),
+        "quality": os.getenv('DALLE_QUALITY', 'standard')
+    }
+
+
+def get_renderer(player_data):
+    """
+    Retourne le moteur de rendu d'une carte : 'dalle' ou 'local' (composition Pillow).
+
+    Args:
+        player_data (dict): Données du joueur (clé renderer optionnelle)
+
+    Returns:
+        str: Moteur demandé, sinon CARD_RENDERER (défaut: dalle)
+    """
+    renderer = player_data.get('renderer') or os.getenv('CARD_RENDERER', 'dalle')
+    return renderer if renderer in RENDERERS else 'dalle'
+
+
+def generate_dalle_image(prompt, photo_path=None):
+    """
+    Génère une image avec DALL·E 3.
+
+    Args:
+        prompt (str): Prompt pour DALL·E
+        photo_path (str, optional): Chemin vers la photo du joueur
+
+    Returns:
+        str: URL de l'image générée, None si erreur
+    """
+    try:
+        print("🎨 Génération de l'image avec DALL·E 3...")
+        print(f"📝 Prompt: {prompt[:100]}...")
+
+        # Configuration DALL·E
+        settings = get_dalle_settings()
+
+        # Appel à l'API OpenAI via le disjoncteur et l'ordonnanceur partagé
+        # (concurrence adaptative, retries)
+        with time_stage('dalle'), IN_FLIGHT.track(kind='dalle'):
+            response = openai_breaker.call(
+                get_image_scheduler().call,
+                get_openai_client().images.generate,
+                model=settings['model'],
+                prompt=prompt,
+                size=settings['size'],
+                quality=settings['quality'],
+                n=1
+            )
+
+        if response.data and len(response.data) > 0:
+            image_url = response.data[0].url
+            print(f"✅ Image générée avec succès: {image_url}")
+            return image_url
+        else:
+            print("❌ Aucune image générée par DALL·E")
+            return None
+
+    except CircuitOpenError as e:
+        print(f"⚡ {e}")
+        return None
+    except openai.OpenAIError as e:
+        print(f"❌ Erreur OpenAI: {e}")
+        return None
+    except Exception as e:
+        print(f"❌ Erreur inattendue: {e}")
+        return None
+
+
+def save_generation_log(player_data, prompt, image_url, firebase_url, success=True, **details):
+    """
+    Ajoute la génération au journal append-only (logs/generations.jsonl).
+
+    Args:
+        player_data (dict): Données (enrichies si disponibles) du joueur
+        prompt (str): Prompt DALL·E
+        image_url (str): URL DALL·E
+        firebase_url (str): URL Firebase
+        success (bool): Génération réussie
+        **details: Champs complémentaires (cache_hit, renderer, error, ...)
+    """
+    try:
+        log_data = {
+            "timestamp": datetime.now().isoformat(),
+            "player": player_data['prenom'],
+            "age_category": player_data.get('age_category'),
+            "overall_score": player_data.get('overall_score'),
+            "card_color": player_data.get('card_color'),
+            "rules_version": player_data.get('rules_version'),
+            "prompt": prompt,
+            "dalle_url": image_url,
+            "firebase_url": firebase_url,
+            "success": success
+        }
+        log_data.update(details)
+
+        with time_stage('log_write'):
+            get_generation_log().append(log_data)
+
+    except Exception as e:
+        print(f"⚠️ Erreur de sauvegarde du log: {e}")
+
+
+def cleanup_files(*paths):
+    """Supprime les fichiers temporaires d'une génération."""
+    for path in paths:
+        try:
+            # Les uploads de l'espace de travail libèrent aussi leur quota
+            if get_scratch_space().discard(path):
+                continue
+            if path and os.path.exists(path):
+                os.unlink(path)
+        except Exception as e:
+            print(f"⚠️ Erreur de nettoyage: {e}")
+
+
+def _upload_card(image_url, enriched_data, cache_key, use_cache):
+    """
+    Upload une image DALL·E sur Firebase et l'enregistre dans le cache d'images.
+
+    Returns:
+        str: URL Firebase, None si l'upload a échoué
+    """
+    print("☁️ Upload sur Firebase Storage...")
+    with time_stage('upload'), IN_FLIGHT.track(kind='upload'):
+        firebase_url = upload_image_from_url(
+            image_url,
+            enriched_data['prenom'],
+            enriched_data['card_color']
+        )
+
+    if not firebase_url:
+        print("⚠️ Erreur d'upload Firebase, mais image DALL·E disponible")
+        return None
+
+    if use_cache:
+        get_image_cache().put(cache_key, firebase_url, image_url)
+    return firebase_url
+
+
+def _generate_with_dalle(player_data, enriched_data, prompt, checkpoint, report):
+    """
+    Étapes DALL·E + Firebase : cache d'images, reprise, génération coalescée.
+
+    Returns:
+        tuple: (dalle_url, firebase_url, cache_hit)
+    """
+    # Recherche dans le cache d'images (clé: prompt normalisé + réglages DALL·E)
+    use_cache = is_cache_enabled() and not player_data.get('bypass_cache')
+    cache_key = compute_cache_key(prompt, get_dalle_settings())
+    cache_hit = checkpoint.get('cache_hit', False)
+    if use_cache and 'dalle_url' not in checkpoint:
+        cached = get_image_cache().get(cache_key)
+        if cached:
+            print(f"⚡ Carte identique en cache: {cached['firebase_url']}")
+            cache_hit = True
+            checkpoint = dict(checkpoint, cache_hit=True, **cached)
+            report('image_generated', dalle_url=cached['dalle_url'], cache_hit=True)
+            report('firebase_uploaded', firebase_url=cached['firebase_url'])
+
+    if 'dalle_url' in checkpoint:
+        # Image déjà générée (reprise de job ou cache)
+        image_url = checkpoint['dalle_url']
+        print(f"♻️ Image déjà générée, réutilisation: {image_url}")
+
+        if 'firebase_url' in checkpoint:
+            firebase_url = checkpoint['firebase_url']
+        else:
+            firebase_url = _upload_card(image_url, enriched_data, cache_key, use_cache)
+            report('firebase_uploaded', firebase_url=firebase_url)
+    else:
+        # Génération DALL·E + upload, partagés entre demandes identiques simultanées
+        def produce():
+            url = generate_dalle_image(prompt, player_data.get('photo_path'))
+            if not url and openai_breaker.state == OPEN:
+                raise GenerationError("Service OpenAI indisponible (disjoncteur ouvert)")
+            if not url:
+                raise GenerationError("Erreur de génération DALL·E")
+            report('image_generated', dalle_url=url)
+
+            uploaded_url = _upload_card(url, enriched_data, cache_key, use_cache)
+            report('firebase_uploaded', firebase_url=uploaded_url)
+            return {"dalle_url": url, "firebase_url": uploaded_url}
+
+        # Une génération forcée (bypass_cache) n'est coalescée qu'avec d'autres générations forcées
+        flight_key = f"{cache_key}:{'cache' if use_cache else 'bypass'}"
+        outcome, coalesced = image_flights.do(flight_key, produce)
+        image_url = outcome['dalle_url']
+        firebase_url = outcome['firebase_url']
+
+        if coalesced:
+            print(f"🔗 Génération identique en cours partagée: {image_url}")
+            report('image_generated', dalle_url=image_url, coalesced=True)
+            report('firebase_uploaded', firebase_url=firebase_url)
+
+    return image_url, firebase_url, cache_hit
+
+
+def _render_locally(enriched_data, photo_path, checkpoint, report):
+    """
+    Étapes de composition locale : rendu Pillow, sauvegarde et upload Firebase.
+
+    Returns:
+        tuple: (card_path, firebase_url)
+    """
+    card_path = checkpoint.get('card_path')
+    if card_path is None or not os.path.exists(card_path):
+        print("🖌️ Composition locale de la carte...")
+        # Fond pré-généré (couleur, catégorie) s'il existe dans l'atlas
+        background = get_background_atlas().get(
+            enriched_data['card_color'], enriched_data['age_category'], seed=enriched_data['prenom']
+        )
+        with time_stage('render'):
+            image_bytes = render_card_bytes(enriched_data, photo_path, background=background)
+
+        output_dir = os.getenv('CARD_OUTPUT_DIR', 'output')
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        card_path = os.path.join(
+            output_dir,
+            f"{enriched_data['prenom']}_{enriched_data['card_color']}_{timestamp}.png"
+        )
+        with open(card_path, 'wb') as f:
+            f.write(image_bytes)
+        print(f"✅ Carte composée: {card_path}")
+        report('image_generated', card_path=card_path)
+    else:
+        print(f"♻️ Carte déjà composée, réutilisation: {card_path}")
+        with open(card_path, 'rb') as f:
+            image_bytes = f.read()
+
+    if 'firebase_url' in checkpoint:
+        return card_path, checkpoint['firebase_url']
+
+    print("☁️ Upload sur Firebase Storage...")
+    with time_stage('upload'), IN_FLIGHT.track(kind='upload'):
+        firebase_url = upload_image_from_bytes(
+            image_bytes,
+            enriched_data['prenom'],
+            enriched_data['card_color']
+        )
+    if not firebase_url:
+        print("⚠️ Erreur d'upload Firebase, mais carte disponible localement")
+    report('firebase_uploaded', firebase_url=firebase_url)
+    return card_path, firebase_url
+
+
+def _read_card(card_path):
+    """Contenu d'une carte composée localement, None si absente."""
+    if not card_path or not os.path.exists(card_path):
+        return None
+    with open(card_path, 'rb') as f:
+        return f.read()
+
+
+def run_card_generation(player_data, report_stage=None, checkpoint=None):
+    """
+    Exécute le pipeline complet de génération pour un joueur validé.
+
+    Les étapes déjà présentes dans le checkpoint (job repris après un
+    redémarrage) ne sont pas rejouées : un DALL·E déjà payé est réutilisé.
+    Une carte au prompt identique déjà stockée sur Firebase est servie depuis
+    le cache d'images, sauf si player_data['bypass_cache'] est vrai ; une carte
+    identique en cours de génération dans un autre worker est attendue et partagée.
+    Avec le moteur 'local', la carte est composée par Pillow sans appel DALL·E.
+    Quand une vidéo est fournie, les stats sont remplacées par celles analysées
+    par GPT-4 sur ses images clés (en cache seulement avec le moteur 'local').
+
+    Args:
+        player_data (dict): Données du joueur (validées, fichiers déjà sauvegardés)
+        report_stage (callable, optional): Callback report_stage(stage, **artifacts)
+            appelé à la fin de chaque étape avec les résultats à persister
+        checkpoint (dict, optional): Résultats des étapes déjà terminées
+
+    Returns:
+        dict: Résultat de la génération
+
+    Raises:
+        GenerationError: Si une étape bloquante échoue
+    """
+    checkpoint = checkpoint or {}
+
+    def report(stage, **artifacts):
+        if report_stage:
+            report_stage(stage, **artifacts)
+
+    enriched_data = checkpoint.get('enriched_data')
+    prompt = checkpoint.get('prompt')
+    frames = checkpoint.get('frames')
+    video_stats = checkpoint.get('video_stats')
+    renderer = get_renderer(player_data)
+    IN_FLIGHT.inc(kind='generation')
+    try:
+        print(f"\n⚙️ === GÉNÉRATION EN ARRIÈRE-PLAN: {player_data['prenom']} ===")
+
+        # Analyse déjà en cache pour cette vidéo: ni décodage ni appel GPT-4
+        needs_analysis = enriched_data is None and 'video_stats' not in checkpoint
+        if needs_analysis and player_data.get('video_sha256'):
+            video_stats = get_cached_analysis(player_data, player_data['video_sha256'])
+            if video_stats:
+                report('stats_analyzed', video_stats=video_stats)
+                needs_analysis = False
+        # Sans photo, le rendu local prend son portrait dans les images clés
+        needs_portrait = renderer == 'local' and not player_data.get('photo_path')
+
+        # Images clés de la vidéo (pool de processus, budget de temps par vidéo)
+        if frames is None and player_data.get('video_path') and (needs_analysis or needs_portrait):
+            print("🎞️ Extraction des images clés de la vidéo...")
+            with time_stage('video_frames'), IN_FLIGHT.track(kind='video'):
+                frames = extract_video_frames(player_data['video_path'])
+            report('frames_extracted', frames=frames)
+
+        # Stats analysées par GPT-4 sur les images clés (cache par hash de la vidéo)
+        if needs_analysis and frames:
+            video_stats = analyze_video_stats(player_data, frames, player_data.get('video_sha256'),
+                                              allow_api=renderer != 'local')
+            report('stats_analyzed', video_stats=video_stats)
+        if enriched_data is None and video_stats:
+            player_data = dict(player_data, stats=video_stats['stats'])
+
+        # Application des règles SquadField
+        if enriched_data is None:
+            print("⚽ Application des règles SquadField...")
+            with time_stage('rules'):
+                enriched_data = apply_squadfield_rules(player_data)
+            report('rules_applied', enriched_data=enriched_data)
+
+        print(f"📊 Score global: {enriched_data['overall_score']}")
+        print(f"👥 Catégorie: {enriched_data['age_category']}")
+        print(f"🎨 Couleur de carte: {enriched_data['card_color']}")
+
+        # Construction du prompt DALL·E
+        if prompt is None:
+            is_valid, error_msg = validate_prompt_data(enriched_data)
+            if not is_valid:
+                raise GenerationError(f"Données prompt invalides: {error_msg}")
+
+            print("🤖 Construction du prompt DALL·E...")
+            with time_stage('prompt'):
+                prompt = build_dalle_prompt(enriched_data)
+            report('prompt_built', prompt=prompt)
+
+        # Image de la carte: composition locale ou DALL·E
+        card_path = None
+        if renderer == 'local':
+            image_url, cache_hit = None, False
+            # Sans photo, l'image clé la plus nette de la vidéo sert de portrait
+            portrait = best_portrait_frame(frames or [])
+            photo_path = player_data.get('photo_path') or (portrait['path'] if portrait else None)
+            card_path, firebase_url = _render_locally(enriched_data, photo_path, checkpoint, report)
+        else:
+            image_url, firebase_url, cache_hit = _generate_with_dalle(
+                player_data, enriched_data, prompt, checkpoint, report
+            )
+
+        # Miniatures pour les galeries (pool de processus, non bloquant en cas d'échec)
+        derivatives = checkpoint.get('derivatives')
+        if derivatives is None and firebase_url:
+            with time_stage('derivatives'), IN_FLIGHT.track(kind='derivatives'):
+                derivatives = create_card_derivatives(
+                    firebase_url, enriched_data['prenom'], enriched_data['card_color'],
+                    image_bytes=_read_card(card_path)
+                )
+            report('derivatives_built', derivatives=derivatives)
+
+        # Sauvegarde du log
+        save_generation_log(enriched_data, prompt, image_url, firebase_url,
+                            cache_hit=cache_hit, renderer=renderer)
+
+        result = {
+            "success": True,
+            "player": enriched_data['prenom'],
+            "age_category": enriched_data['age_category'],
+            "overall_score": enriched_data['overall_score'],
+            "card_color": enriched_data['card_color'],
+            "dalle_url": image_url,
+            "firebase_url": firebase_url,
+            "card_path": card_path,
+            "derivatives": derivatives,
+            "prompt": prompt,
+            "renderer": renderer,
+            "cache_hit": cache_hit,
+            "stats_source": ('cache' if video_stats['cached'] else 'video') if video_stats else 'input',
+            "message": "Carte générée avec succès"
+        }
+
+        print("\n🎉 === GÉNÉRATION TERMINÉE AVEC SUCCÈS ===")
+        print(f"🏃‍♂️ Joueur: {result['player']}")
+        print(f"📊 Score: {result['overall_score']} ({result['card_color']})")
+        if result['dalle_url']:
+            print(f"🔗 URL DALL·E: {result['dalle_url']}")
+        if result['card_path']:
+            print(f"🖼️ Carte locale: {result['card_path']}")
+        if result['firebase_url']:
+            print(f"☁️ URL Firebase: {result['firebase_url']}")
+        print("="*50 + "\n")
+
+        record_card(True, result['card_color'], result['age_category'])
+        return result
+
+    except Exception as e:
+        failed_data = enriched_data or player_data
+        record_card(False, failed_data.get('card_color'), failed_data.get('age_category'))
+        save_generation_log(failed_data, prompt, None, None,
+                            success=False, error=str(e))
+        raise
+
+    finally:
+        IN_FLIGHT.dec(kind='generation')
+        # Nettoyage des fichiers temporaires, succès ou échec
+        cleanup_files(player_data.get('photo_path'), player_data.get('video_path'),
+                      *[frame['path'] for frame in frames or []])
+
+
+def prepare_roster(players):
+    """
+    Valide et enrichit tout un effectif en une seule passe.
+
+    Args:
+        players (list): Données des joueurs (format test_players.json)
+
+    Returns:
+        tuple: (prepared, errors) - prepared est une liste de (index, player, enriched_data),
+               errors une liste de {index, player, errors, error} (toutes les erreurs du joueur)
+    """
+    # Validation de tout l'effectif en une passe: toutes les erreurs de chaque joueur
+    errors = [dict(report, error=format_errors(report['errors'])) for report in validate_roster(players)]
+    invalid = {report['index'] for report in errors}
+    valid = [(index, player) for index, player in enumerate(players) if index not in invalid]
+
+    # Règles SquadField appliquées à tout l'effectif en un seul calcul vectorisé
+    enriched = apply_squadfield_rules_bulk([player for _, player in valid])
+
+    prepared = []
+    for (index, player), enriched_data in zip(valid, enriched):
+        prompt_errors = validate_prompt_fields(enriched_data)
+        if prompt_errors:
+            errors.append({"index": index, "player": player.get('prenom'),
+                           "errors": prompt_errors, "error": format_errors(prompt_errors)})
+            continue
+
+        prepared.append((index, player, enriched_data))
+
+    errors.sort(key=lambda error: error['index'])
+    return prepared, errors
+
+
+def get_batch_concurrency():
+    """Nombre de cartes générées en parallèle pour un lot (BATCH_CONCURRENCY, défaut 4)."""
+    return int(os.getenv('BATCH_CONCURRENCY', '4'))
+
+
+def run_batch_generation(players, concurrency=None, bypass_cache=False, renderer=None):
+    """
+    Génère les cartes de tout un effectif en parallèle (concurrence bornée).
+
+    Args:
+        players (list): Données des joueurs
+        concurrency (int, optional): Générations simultanées (défaut: BATCH_CONCURRENCY)
+        bypass_cache (bool): Forcer de nouvelles générations DALL·E
+        renderer (str, optional): Moteur de rendu, 'dalle' ou 'local' (défaut: CARD_RENDERER)
+
+    Returns:
+        list: Un résultat par joueur, dans l'ordre du roster
+              ({index, player, success, error?, ...résultat de run_card_generation})
+    """
+    concurrency = concurrency or get_batch_concurrency()
+    prepared, errors = prepare_roster(players)
+
+    results = {error['index']: dict(error, success=False) for error in errors}
+    print(f"👥 {len(prepared)} joueur(s) valides, {len(errors)} rejeté(s), "
+          f"{concurrency} génération(s) en parallèle")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-card') as executor:
+        futures = {}
+        for index, player, enriched_data in prepared:
+            payload = dict(player, bypass_cache=bypass_cache)
+            if renderer:
+                payload['renderer'] = renderer
+            future = executor.submit(
+                run_card_generation, payload, None, {'enriched_data': enriched_data}
+            )
+            futures[future] = (index, player['prenom'])
+
+        for future, (index, name) in futures.items():
+            try:
+                results[index] = dict(future.result(), index=index, player=name)
+            except Exception as e:
+                print(f"❌ Échec de la carte de {name}: {e}")
+                results[index] = {"index": index, "player": name, "success": False, "error": str(e)}
+
+    return [results[index] for index in sorted(results)]
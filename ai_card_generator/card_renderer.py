@@ -0,0 +1,239 @@
+"""
+Moteur de composition locale des cartes SquadField avec Pillow.
+
+Les modèles d'images écrivent mal le texte : au lieu de demander à DALL·E de
+dessiner le prénom, la catégorie, la note et les statistiques, la carte est
+composée localement à partir d'un fond par couleur (mis en cache) et du
+portrait du joueur, selon le layout décrit par build_dalle_prompt. Une carte
+dont les stats changent est re-rendue en quelques millisecondes, sans appel API.
+"""
+
+import os
+import random
+from io import BytesIO
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+
+CARD_SIZE = (1024, 1024)
+
+# Ordre des statistiques dans les cases du bas (identique au prompt DALL·E)
+STAT_LAYOUT = [
+    ('technique', 'TEC'),
+    ('vitesse', 'VIT'),
+    ('physique', 'PHY'),
+    ('tirs', 'TIR'),
+    ('defense', 'DEF'),
+    ('passe', 'PAS')
+]
+
+# Palette de chaque couleur de carte: dégradé haut, dégradé bas, accent
+CARD_PALETTES = {
+    "gris": ((70, 74, 80), (165, 170, 178), (225, 228, 232)),
+    "bronze": ((95, 50, 20), (205, 127, 50), (245, 195, 135)),
+    "jaune": ((170, 120, 0), (255, 215, 50), (255, 245, 180)),
+    "vert": ((0, 80, 45), (40, 180, 110), (175, 255, 205)),
+    "violet": ((50, 15, 90), (140, 70, 200), (220, 185, 255)),
+    "doré": ((130, 95, 15), (240, 200, 80), (255, 240, 170)),
+    "platine": ((105, 115, 125), (225, 230, 236), (255, 255, 255)),
+    "star": ((8, 8, 35), (60, 30, 110), (255, 215, 90))
+}
+
+CARD_COLORS = list(CARD_PALETTES)
+
+TEXT_COLOR = (255, 255, 255)
+OUTLINE_COLOR = (20, 20, 25)
+MARGIN = 48
+
+
+@lru_cache(maxsize=32)
+def get_font(size):
+    """
+    Charge la police des cartes à une taille donnée (CARD_FONT_PATH, DejaVu ou police Pillow).
+
+    Args:
+        size (int): Taille en pixels
+
+    Returns:
+        ImageFont.FreeTypeFont: Police chargée
+    """
+    for path in (os.getenv('CARD_FONT_PATH'), 'DejaVuSans-Bold.ttf'):
+        if not path:
+            continue
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _draw_gradient(size, top, bottom):
+    """Dégradé vertical de top vers bottom."""
+    width, height = size
+    column = Image.new('RGB', (1, height))
+    for y in range(height):
+        ratio = y / max(1, height - 1)
+        column.putpixel((0, y), tuple(round(a + (b - a) * ratio) for a, b in zip(top, bottom)))
+    return column.resize(size)
+
+
+def build_background(card_color, size):
+    """
+    Construit le fond d'une couleur de carte.
+
+    Un fichier {CARD_BACKGROUNDS_DIR}/{card_color}.png est utilisé s'il existe ;
+    sinon le fond est dessiné à partir de la palette de la couleur.
+    """
+    backgrounds_dir = os.getenv('CARD_BACKGROUNDS_DIR', 'assets/backgrounds')
+    background_path = os.path.join(backgrounds_dir, f"{card_color}.png")
+    if os.path.exists(background_path):
+        with Image.open(background_path) as background:
+            return ImageOps.fit(background.convert('RGB'), size)
+
+    top, bottom, accent = CARD_PALETTES.get(card_color, CARD_PALETTES['gris'])
+    background = _draw_gradient(size, top, bottom)
+    draw = ImageDraw.Draw(background, 'RGBA')
+    width, height = size
+
+    # Reflet diagonal et cadre intérieur
+    draw.polygon(
+        [(0, height * 0.35), (width, 0), (width, height * 0.15), (0, height * 0.5)],
+        fill=accent + (40,)
+    )
+    draw.rounded_rectangle(
+        [MARGIN // 2, MARGIN // 2, width - MARGIN // 2, height - MARGIN // 2],
+        radius=36, outline=accent + (200,), width=6
+    )
+
+    if card_color == 'star':
+        # Constellation reproductible: même fond à chaque rendu
+        rng = random.Random(card_color)
+        for _ in range(160):
+            x, y = rng.randrange(width), rng.randrange(height)
+            radius = rng.choice((1, 1, 2, 3))
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius],
+                         fill=accent + (rng.randrange(120, 255),))
+
+    return background
+
+
+@lru_cache(maxsize=len(CARD_PALETTES) * 2)
+def get_background(card_color, size=CARD_SIZE):
+    """
+    Retourne le fond d'une couleur de carte, construit une seule fois par processus.
+
+    L'image retournée est partagée : la copier avant de dessiner dessus.
+
+    Args:
+        card_color (str): Couleur de carte (gris, bronze, ..., star)
+        size (tuple): Taille de la carte en pixels
+
+    Returns:
+        Image.Image: Fond RGB
+    """
+    return build_background(card_color, size)
+
+
+def _draw_text(draw, position, text, size, anchor):
+    """Écrit un texte lisible (contour sombre) à la position donnée."""
+    draw.text(position, text, font=get_font(size), fill=TEXT_COLOR, anchor=anchor,
+              stroke_width=max(2, size // 18), stroke_fill=OUTLINE_COLOR)
+
+
+def _fit_text_size(draw, text, size, max_width, min_size=32):
+    """Réduit la taille de police jusqu'à ce que le texte tienne dans max_width."""
+    while size > min_size and draw.textlength(text, font=get_font(size)) > max_width:
+        size -= 4
+    return size
+
+
+def _paste_portrait(card, photo_path, box):
+    """Colle le portrait du joueur, recadré dans un cercle, dans la zone box."""
+    left, top, right, bottom = box
+    size = (right - left, bottom - top)
+
+    with Image.open(photo_path) as photo:
+        portrait = ImageOps.fit(ImageOps.exif_transpose(photo).convert('RGB'), size)
+
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).ellipse([0, 0, size[0] - 1, size[1] - 1], fill=255)
+    card.paste(portrait, (left, top), mask)
+
+
+def render_card(player_data, photo_path=None, background=None):
+    """
+    Compose la carte d'un joueur : fond de sa couleur, portrait, prénom en haut
+    à gauche, catégorie en haut à droite, note globale dans un cercle et les
+    6 statistiques dans des cases alignées en bas.
+
+    Args:
+        player_data (dict): Données enrichies (prenom, age_category, overall_score, card_color, stats)
+        photo_path (str, optional): Chemin vers la photo du joueur
+        background (Image.Image, optional): Fond pré-généré (atlas), sinon fond de la couleur
+
+    Returns:
+        Image.Image: Carte RGB
+    """
+    card_color = player_data['card_color']
+    if background is None:
+        background = get_background(card_color)
+    elif background.size != CARD_SIZE:
+        background = ImageOps.fit(background, CARD_SIZE)
+    card = background.convert('RGB')
+    width, height = card.size
+    accent = CARD_PALETTES.get(card_color, CARD_PALETTES['gris'])[2]
+    draw = ImageDraw.Draw(card, 'RGBA')
+
+    # Portrait centré
+    portrait_box = (width // 2 - 230, 150, width // 2 + 230, 610)
+    draw.ellipse([portrait_box[0] - 10, portrait_box[1] - 10, portrait_box[2] + 10, portrait_box[3] + 10],
+                 fill=accent + (255,))
+    if photo_path and os.path.exists(photo_path):
+        _paste_portrait(card, photo_path, portrait_box)
+    else:
+        draw.ellipse(portrait_box, fill=OUTLINE_COLOR + (160,))
+
+    # Prénom en haut à gauche, catégorie en haut à droite
+    name_size = _fit_text_size(draw, player_data['prenom'], 72, width * 0.6)
+    _draw_text(draw, (MARGIN + 16, MARGIN + 16), player_data['prenom'], name_size, 'la')
+    _draw_text(draw, (width - MARGIN - 16, MARGIN + 16), player_data['age_category'], 60, 'ra')
+
+    # Note globale dans un cercle, à cheval sur le bas du portrait
+    center_x, center_y, radius = width // 2, 640, 88
+    draw.ellipse([center_x - radius, center_y - radius, center_x + radius, center_y + radius],
+                 fill=OUTLINE_COLOR + (230,), outline=accent + (255,), width=8)
+    _draw_text(draw, (center_x, center_y), str(player_data['overall_score']), 96, 'mm')
+
+    # 6 cases de statistiques alignées en bas
+    stats = player_data.get('stats', {})
+    gap = 16
+    box_top, box_bottom = height - MARGIN - 200, height - MARGIN - 24
+    box_width = (width - 2 * (MARGIN + 16) - gap * (len(STAT_LAYOUT) - 1)) / len(STAT_LAYOUT)
+    for i, (stat, label) in enumerate(STAT_LAYOUT):
+        left = MARGIN + 16 + i * (box_width + gap)
+        right = left + box_width
+        draw.rounded_rectangle([left, box_top, right, box_bottom], radius=18,
+                               fill=OUTLINE_COLOR + (170,), outline=accent + (255,), width=4)
+        middle = (left + right) / 2
+        _draw_text(draw, (middle, box_top + 48), str(stats.get(stat, '-')), 64, 'mm')
+        _draw_text(draw, (middle, box_bottom - 36), label, 32, 'mm')
+
+    return card
+
+
+def render_card_bytes(player_data, photo_path=None, image_format='PNG', background=None):
+    """
+    Compose la carte d'un joueur et l'encode.
+
+    Args:
+        player_data (dict): Données enrichies du joueur
+        photo_path (str, optional): Chemin vers la photo du joueur
+        image_format (str): Format Pillow (PNG, WEBP, JPEG)
+        background (Image.Image, optional): Fond pré-généré (atlas)
+
+    Returns:
+        bytes: Image encodée
+    """
+    buffer = BytesIO()
+    render_card(player_data, photo_path, background).save(buffer, format=image_format)
+    return buffer.getvalue()
@@ -0,0 +1,225 @@
+"""
+Disjoncteurs (circuit breakers) autour des dépendances externes : OpenAI et Firebase.
+
+Après une série d'échecs, le disjoncteur s'ouvre : les appels échouent
+immédiatement au lieu d'attendre un service dégradé. Après un délai de
+récupération, il passe en semi-ouvert et laisse passer un appel d'essai ;
+un succès le referme, un échec le rouvre.
+"""
+
+import os
+import time
+import functools
+import threading
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Levée quand une dépendance est court-circuitée (disjoncteur ouvert)."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Service {name} indisponible (disjoncteur ouvert), réessayer dans {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états : closed, open, half_open.
+    """
+
+    def __init__(self, name, failure_threshold=None, recovery_timeout=None, half_open_max_calls=1,
+                 error_filter=None):
+        """
+        Args:
+            name (str): Nom de la dépendance (openai, firebase)
+            failure_threshold (int, optional): Échecs consécutifs avant ouverture
+                (défaut: BREAKER_FAILURE_THRESHOLD ou 5)
+            recovery_timeout (float, optional): Secondes avant l'essai semi-ouvert
+                (défaut: BREAKER_RECOVERY_TIMEOUT ou 30)
+            half_open_max_calls (int): Appels d'essai simultanés en semi-ouvert
+            error_filter (callable, optional): Prédicat sur une exception indiquant une
+                panne de la dépendance ; les autres erreurs (ex: requête refusée)
+                prouvent que le service répond et ne comptent pas comme échec
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+        self.recovery_timeout = recovery_timeout if recovery_timeout is not None else \
+            float(os.getenv('BREAKER_RECOVERY_TIMEOUT', '30'))
+        self.half_open_max_calls = half_open_max_calls
+        self.error_filter = error_filter
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """État courant (passe automatiquement de open à half_open après le délai)."""
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        """Passe en semi-ouvert si le délai de récupération est écoulé (sous verrou)."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+
+    def retry_after(self):
+        """Secondes restantes avant le prochain essai (0 si fermé)."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def allow_request(self):
+        """
+        Réserve le droit d'appeler la dépendance.
+
+        Returns:
+            bool: True si l'appel peut être tenté
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self):
+        """Enregistre un appel réussi (referme le disjoncteur)."""
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"✅ Disjoncteur {self.name} refermé")
+            self._state = CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self):
+        """Enregistre un échec (ouvre le disjoncteur au-delà du seuil ou en semi-ouvert)."""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"🔌 Disjoncteur {self.name} ouvert après {self._failures} échec(s)")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def release_trial(self):
+        """Rend un essai semi-ouvert réservé sans verdict (appel interrompu)."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """
+        Exécute fn sous la protection du disjoncteur.
+
+        Args:
+            fn (callable): Appel vers la dépendance
+            is_failure (callable, optional): Prédicat sur le résultat signalant un échec
+                (pour les fonctions qui retournent None au lieu de lever)
+
+        Returns:
+            Le résultat de fn
+
+        Raises:
+            CircuitOpenError: Si le disjoncteur est ouvert
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self.error_filter is None or self.error_filter(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            # KeyboardInterrupt, SystemExit, annulation: ni succès ni panne de la
+            # dépendance, mais l'essai semi-ouvert doit être rendu
+            self.release_trial()
+            raise
+
+        if is_failure and is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def guard(self, fallback=None, is_failure=None):
+        """
+        Décorateur : court-circuite la fonction quand le disjoncteur est ouvert.
+
+        Args:
+            fallback: Valeur retournée immédiatement quand le disjoncteur est ouvert
+            is_failure (callable, optional): Prédicat sur le résultat signalant un échec
+
+        Returns:
+            callable: Décorateur
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                try:
+                    return self.call(fn, *args, is_failure=is_failure, **kwargs)
+                except CircuitOpenError as e:
+                    print(f"⚡ {e}")
+                    return fallback
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """
+        Retourne l'état du disjoncteur (pour /health).
+
+        Returns:
+            dict: state, failures, retry_after
+        """
+        state = self.state
+        with self._lock:
+            failures = self._failures
+        return {
+            "state": state,
+            "failures": failures,
+            "retry_after": round(self.retry_after(), 1)
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **options):
+    """
+    Retourne le disjoncteur partagé d'une dépendance (créé au premier appel).
+
+    Args:
+        name (str): Nom de la dépendance (openai, firebase)
+        **options: Paramètres de CircuitBreaker, utilisés à la création
+
+    Returns:
+        CircuitBreaker: Disjoncteur du processus
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **options)
+        return _breakers[name]
+
+
+def breaker_states():
+    """Retourne l'état de tous les disjoncteurs du processus."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
@@ -3,12 +3,86 @@ Module pour uploader les cartes générées sur Firebase Storage.
 """
 
 import os
-import uuid
+import base64
+import shutil
+import hashlib
+import tempfile
+import threading
 from datetime import datetime
+from urllib.parse import urlparse, unquote
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, storage
+from google.cloud.storage.batch import Batch
 import requests
-from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from circuit_breaker import get_breaker, CircuitOpenError, OPEN
+from upload_index import get_upload_index, hash_bytes, hash_file, is_dedup_enabled
+from card_manifest import get_card_manifest, CARDS_PREFIX
+from image_cache import get_image_cache
+
+
+# Disjoncteur Firebase Storage: court-circuite les uploads quand le service est dégradé.
+# Seuls les appels Storage (_publish, _delete_batch) passent par lui : une config
+# absente, un téléchargement DALL·E ou un fichier local en échec ne l'ouvrent pas.
+firebase_breaker = get_breaker('firebase')
+
+# Timeouts du téléchargement DALL·E (connexion, lecture entre deux paquets)
+DOWNLOAD_TIMEOUT = (
+    float(os.getenv('DOWNLOAD_CONNECT_TIMEOUT', '5')),
+    float(os.getenv('DOWNLOAD_READ_TIMEOUT', '30'))
+)
+
+# Taille des chunks de l'upload résumable (multiple de 256 KB imposé par GCS)
+UPLOAD_CHUNK_SIZE = int(os.getenv('FIREBASE_UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
+# Suppressions par requête batch (100 max côté Storage) et batchs envoyés en parallèle
+DELETE_BATCH_SIZE = min(100, int(os.getenv('FIREBASE_DELETE_BATCH_SIZE', '100')))
+DELETE_CONCURRENCY = int(os.getenv('FIREBASE_DELETE_CONCURRENCY', '4'))
+
+# Taille gardée en mémoire d'une image téléchargée avant débordement sur disque
+# (un chunk d'upload : la mémoire reste bornée à un chunk, comme pour le transfert)
+DOWNLOAD_SPOOL_BYTES = int(os.getenv('DOWNLOAD_SPOOL_BYTES', str(UPLOAD_CHUNK_SIZE)))
+
+
+class HashingStream:
+    """
+    Flux en lecture seule au-dessus d'une réponse HTTP en streaming.
+
+    Lit les paquets au fur et à mesure de la demande du lecteur (mémoire
+    bornée à un chunk) et calcule SHA-256 et MD5 au passage.
+    """
+
+    def __init__(self, response, chunk_size=64 * 1024):
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._buffer = bytearray()
+        self._position = 0
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5()
+
+    def read(self, size=-1):
+        """Lit jusqu'à size octets (tout le reste si size < 0)."""
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer.extend(chunk)
+
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+
+        self.sha256.update(data)
+        self.md5.update(data)
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        """Position courante (octets déjà transmis)."""
+        return self._position
 
 
 def initialize_firebase():
@@ -43,10 +117,171 @@ def initialize_firebase():
         return False
 
 
+class CardUploader:
+    """
+    Uploader longue durée partagé par toutes les générations du processus.
+
+    Possède une session HTTP poolée (keep-alive) pour télécharger les images
+    DALL·E et garde en cache le bucket Firebase (et donc son client Storage
+    authentifié) : les uploads successifs réutilisent les connexions TLS.
+    """
+
+    def __init__(self, pool_size=None):
+        """
+        Args:
+            pool_size (int, optional): Connexions gardées ouvertes par hôte (défaut: HTTP_POOL_SIZE ou 16)
+        """
+        self.pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', '16'))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=self.pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                              allowed_methods=['GET'])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    def get_bucket(self):
+        """
+        Retourne le bucket Firebase, initialisé au premier appel.
+
+        Returns:
+            Bucket: Bucket Storage, None si Firebase n'est pas configuré
+        """
+        with self._lock:
+            if self._bucket is None:
+                if not initialize_firebase():
+                    return None
+                self._bucket = storage.bucket()
+            return self._bucket
+
+    def download(self, url):
+        """
+        Ouvre un téléchargement en streaming sur la session poolée.
+
+        Args:
+            url (str): URL à télécharger
+
+        Returns:
+            requests.Response: Réponse en streaming (à utiliser avec `with`)
+        """
+        return self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader():
+    """
+    Retourne l'uploader partagé du processus.
+
+    Returns:
+        CardUploader: Instance unique, créée au premier appel
+    """
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = CardUploader()
+        return _uploader
+
+
+def _object_name(prefix, player_name, card_color, sha256, file_extension):
+    """Nom d'un objet: {prefix}/{joueur}_{couleur}_{horodatage}_{début du SHA-256}{extension}."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{prefix}/{player_name}_{card_color}_{timestamp}_{sha256[:16]}{file_extension}"
+
+
+def _find_duplicate(sha256, prefix):
+    """
+    Cherche un objet au contenu identique déjà stocké dans le dossier.
+
+    Returns:
+        str: URL publique de l'objet existant, None si absent (ou déduplication désactivée)
+    """
+    if not is_dedup_enabled():
+        return None
+    entry = get_upload_index().get(sha256, prefix)
+    if entry is None:
+        return None
+    print(f"♻️ Contenu déjà stocké ({sha256[:12]}), upload évité: {entry['object_name']}")
+    return entry['public_url']
+
+
+def _record_upload(sha256, prefix, blob, size):
+    """Indexe un objet uploadé et rendu public (et l'ajoute au manifeste si c'est une carte)."""
+    get_upload_index().put(sha256, prefix, blob.name, blob.public_url, size)
+    if blob.name.startswith(CARDS_PREFIX):
+        get_card_manifest().record(blob.name, blob.public_url, size,
+                                   md5=getattr(blob, 'md5_hash', None),
+                                   generation=getattr(blob, 'generation', None))
+
+
+def _content_type(file_extension):
+    """Content-type d'une image selon son extension (PNG par défaut)."""
+    extension = file_extension.lower()
+    if extension in ['.jpg', '.jpeg']:
+        return 'image/jpeg'
+    if extension == '.webp':
+        return 'image/webp'
+    if extension == '.avif':
+        return 'image/avif'
+    return 'image/png'
+
+
+def _storage_available():
+    """
+    Vérifie le disjoncteur Firebase avant de préparer un upload (téléchargement, hash).
+
+    Returns:
+        bool: False (avec un message) si le disjoncteur est ouvert
+    """
+    if firebase_breaker.state == OPEN:
+        print(f"⚡ {CircuitOpenError(firebase_breaker.name, firebase_breaker.retry_after())}")
+        return False
+    return True
+
+
+def _publish(blob, send, local_md5=None):
+    """
+    Envoie un objet puis le rend public, sous la protection du disjoncteur Firebase.
+
+    Args:
+        blob: Objet de destination dans le bucket
+        send (callable): Upload du contenu vers blob
+        local_md5 (str, optional): MD5 base64 calculé localement, comparé à celui de Storage
+
+    Returns:
+        str: URL publique, None si le checksum ne correspond pas (objet supprimé)
+
+    Raises:
+        CircuitOpenError: Si le disjoncteur est ouvert
+        Exception: Erreur Storage (comptée comme échec par le disjoncteur)
+    """
+    def store():
+        send()
+        # Vérification d'intégrité: MD5 calculé au passage vs MD5 calculé par Storage
+        if local_md5 and blob.md5_hash and blob.md5_hash != local_md5:
+            print(f"❌ Checksum invalide pour {blob.name}, suppression de l'objet")
+            blob.delete()
+            return None
+        blob.make_public()
+        return blob.public_url
+
+    return firebase_breaker.call(store)
+
+
 def upload_image_from_url(image_url, player_name, card_color):
     """
     Upload une image depuis une URL vers Firebase Storage.
     
+    L'image est téléchargée dans un tampon borné (débordant sur disque) pour
+    connaître son SHA-256 avant l'upload : un contenu déjà stocké n'est pas
+    réenvoyé.
+    
     Args:
         image_url (str): URL de l'image à uploader
         player_name (str): Nom du joueur pour le nommage
@@ -56,40 +291,47 @@ def upload_image_from_url(image_url, player_name, card_color):
         str: URL publique de l'image uploadée, None si erreur
     """
     try:
-        if not initialize_firebase():
+        uploader = get_uploader()
+        bucket = uploader.get_bucket()
+        if bucket is None or not _storage_available():
             return None
         
-        # Téléchargement de l'image depuis l'URL
-        print(f"📥 Téléchargement de l'image depuis {image_url}")
-        response = requests.get(image_url)
-        response.raise_for_status()
-        
-        # Génération d'un nom de fichier unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        filename = f"cards_ai/{player_name}_{card_color}_{timestamp}_{unique_id}.png"
-        
-        # Upload vers Firebase Storage
-        bucket = storage.bucket()
-        blob = bucket.blob(filename)
-        
-        # Upload des données binaires
-        blob.upload_from_string(
-            response.content,
-            content_type='image/png'
-        )
-        
-        # Rendre l'image publique
-        blob.make_public()
+        with tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES) as spool:
+            # Téléchargement en streaming, haché au passage
+            print(f"📥 Téléchargement de l'image depuis {image_url}")
+            with uploader.download(image_url) as response:
+                response.raise_for_status()
+                stream = HashingStream(response)
+                shutil.copyfileobj(stream, spool, UPLOAD_CHUNK_SIZE)
+            
+            sha256 = stream.sha256.hexdigest()
+            duplicate = _find_duplicate(sha256, 'cards_ai')
+            if duplicate:
+                return duplicate
+            
+            # Nom adressé par le contenu, transmis chunk par chunk à l'upload résumable
+            filename = _object_name('cards_ai', player_name, card_color, sha256, '.png')
+            blob = bucket.blob(filename, chunk_size=UPLOAD_CHUNK_SIZE)
+            spool.seek(0)
+            public_url = _publish(
+                blob,
+                lambda: blob.upload_from_file(spool, content_type='image/png', size=stream.tell()),
+                local_md5=base64.b64encode(stream.md5.digest()).decode('ascii')
+            )
+        if public_url is None:
+            return None
         
-        # Obtenir l'URL publique
-        public_url = blob.public_url
+        _record_upload(sha256, 'cards_ai', blob, stream.tell())
         
-        print(f"✅ Image uploadée avec succès: {filename}")
+        print(f"✅ Image uploadée avec succès: {filename} "
+              f"({stream.tell()} octets, sha256 {sha256[:12]})")
         print(f"🔗 URL publique: {public_url}")
         
         return public_url
         
+    except CircuitOpenError as e:
+        print(f"⚡ {e}")
+        return None
     except requests.RequestException as e:
         print(f"❌ Erreur de téléchargement de l'image: {e}")
         return None
@@ -102,6 +344,8 @@ def upload_image_from_file(file_path, player_name, card_color):
     """
     Upload un fichier image local vers Firebase Storage.
     
+    Un contenu déjà stocké (même SHA-256) n'est pas réenvoyé : l'URL existante est retournée.
+    
     Args:
         file_path (str): Chemin vers le fichier local
         player_name (str): Nom du joueur pour le nommage
@@ -111,97 +355,97 @@ def upload_image_from_file(file_path, player_name, card_color):
         str: URL publique de l'image uploadée, None si erreur
     """
     try:
-        if not initialize_firebase():
+        bucket = get_uploader().get_bucket()
+        if bucket is None or not _storage_available():
             return None
         
         if not os.path.exists(file_path):
             print(f"❌ Fichier introuvable: {file_path}")
             return None
         
-        # Génération d'un nom de fichier unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        file_extension = os.path.splitext(file_path)[1] or '.png'
-        filename = f"cards_ai/{player_name}_{card_color}_{timestamp}_{unique_id}{file_extension}"
-        
-        # Upload vers Firebase Storage
-        bucket = storage.bucket()
-        blob = bucket.blob(filename)
-        
-        print(f"📤 Upload du fichier: {file_path}")
-        
-        # Upload du fichier
         with open(file_path, 'rb') as file_data:
-            blob.upload_from_file(file_data, content_type='image/png')
-        
-        # Rendre l'image publique
-        blob.make_public()
+            # Hash du contenu avant l'upload: un doublon n'est pas réenvoyé
+            sha256, size = hash_file(file_data)
+            duplicate = _find_duplicate(sha256, 'cards_ai')
+            if duplicate:
+                return duplicate
+            
+            # Nom adressé par le contenu
+            file_extension = os.path.splitext(file_path)[1] or '.png'
+            filename = _object_name('cards_ai', player_name, card_color, sha256, file_extension)
+            
+            # Upload vers Firebase Storage
+            blob = bucket.blob(filename)
+            
+            print(f"📤 Upload du fichier: {file_path}")
+            content_type = _content_type(file_extension)
+            public_url = _publish(blob, lambda: blob.upload_from_file(file_data, content_type=content_type))
         
-        # Obtenir l'URL publique
-        public_url = blob.public_url
+        _record_upload(sha256, 'cards_ai', blob, size)
         
         print(f"✅ Fichier uploadé avec succès: {filename}")
         print(f"🔗 URL publique: {public_url}")
         
         return public_url
         
+    except CircuitOpenError as e:
+        print(f"⚡ {e}")
+        return None
     except Exception as e:
         print(f"❌ Erreur d'upload Firebase: {e}")
         return None
 
 
-def upload_image_from_bytes(image_bytes, player_name, card_color, file_extension='.png'):
+def upload_image_from_bytes(image_bytes, player_name, card_color, file_extension='.png',
+                            prefix='cards_ai'):
     """
     Upload des données binaires d'image vers Firebase Storage.
     
+    Un contenu déjà stocké dans le dossier (même SHA-256) n'est pas réenvoyé :
+    l'URL existante est retournée.
+    
     Args:
         image_bytes (bytes): Données binaires de l'image
         player_name (str): Nom du joueur pour le nommage
         card_color (str): Couleur de la carte pour le nommage
         file_extension (str): Extension du fichier (défaut: .png)
+        prefix (str): Dossier de destination dans le bucket (défaut: cards_ai)
         
     Returns:
         str: URL publique de l'image uploadée, None si erreur
     """
     try:
-        if not initialize_firebase():
+        bucket = get_uploader().get_bucket()
+        if bucket is None or not _storage_available():
             return None
         
-        # Génération d'un nom de fichier unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        filename = f"cards_ai/{player_name}_{card_color}_{timestamp}_{unique_id}{file_extension}"
+        # Contenu déjà stocké dans ce dossier: URL existante, sans upload
+        sha256 = hash_bytes(image_bytes)
+        duplicate = _find_duplicate(sha256, prefix)
+        if duplicate:
+            return duplicate
+        
+        # Nom adressé par le contenu
+        filename = _object_name(prefix, player_name, card_color, sha256, file_extension)
         
         # Upload vers Firebase Storage
-        bucket = storage.bucket()
         blob = bucket.blob(filename)
         
         print(f"📤 Upload des données binaires vers: {filename}")
         
-        # Déterminer le content-type selon l'extension
-        content_type = 'image/png'
-        if file_extension.lower() in ['.jpg', '.jpeg']:
-            content_type = 'image/jpeg'
-        elif file_extension.lower() == '.webp':
-            content_type = 'image/webp'
-        
-        # Upload des données binaires
-        blob.upload_from_string(
-            image_bytes,
-            content_type=content_type
-        )
-        
-        # Rendre l'image publique
-        blob.make_public()
-        
-        # Obtenir l'URL publique
-        public_url = blob.public_url
+        # Upload des données binaires puis publication
+        content_type = _content_type(file_extension)
+        public_url = _publish(blob, lambda: blob.upload_from_string(image_bytes, content_type=content_type))
+        _record_upload(sha256, prefix, blob, len(image_bytes))
         
         print(f"✅ Données uploadées avec succès: {filename}")
         print(f"🔗 URL publique: {public_url}")
         
         return public_url
         
+    except CircuitOpenError as e:
+        print(f"⚡ {e}")
+        return None
     except Exception as e:
         print(f"❌ Erreur d'upload Firebase: {e}")
         return None
@@ -238,9 +482,151 @@ def check_firebase_config():
     return True
 
 
+def object_name_from_url(file_url):
+    """
+    Retrouve le nom d'un objet du bucket à partir de son URL publique.
+    
+    Args:
+        file_url (str): URL storage.googleapis.com/{bucket}/{objet} ou
+            firebasestorage.googleapis.com/v0/b/{bucket}/o/{objet encodé}
+    
+    Returns:
+        str: Nom de l'objet, None si l'URL n'est pas une URL Storage
+    """
+    parsed = urlparse(file_url or '')
+    parts = parsed.path.split('/')
+    if parsed.netloc == 'storage.googleapis.com' and len(parts) > 2:
+        return unquote('/'.join(parts[2:])) or None
+    if parsed.netloc == 'firebasestorage.googleapis.com' and len(parts) > 5 and parts[4] == 'o':
+        return unquote('/'.join(parts[5:])) or None
+    return None
+
+
+class _DeleteBatch(Batch):
+    """Batch Storage qui conserve les réponses retournées par finish() (une par sous-requête)."""
+    
+    responses = ()
+    
+    def finish(self, raise_exception=True):
+        self.responses = super().finish(raise_exception=raise_exception)
+        return self.responses
+
+
+def _delete_batch(bucket, names):
+    """
+    Supprime des objets en une requête batch, sans vérifier leur existence au préalable.
+    
+    Returns:
+        list: Code HTTP de chaque suppression, dans l'ordre des noms
+    """
+    # raise_exception=False: un objet absent ou en échec n'interrompt pas le batch
+    with _DeleteBatch(bucket.client, raise_exception=False) as batch:
+        for name in names:
+            bucket.delete_blob(name)
+    return [response.status_code for response in batch.responses]
+
+
+def _forget_object(name, url):
+    """Retire un objet supprimé de l'index des uploads, du manifeste, des miniatures et du cache d'images."""
+    # Import tardif: card_derivatives importe ce module
+    from card_derivatives import get_derivative_store
+    get_upload_index().forget(name)
+    get_card_manifest().forget(name)
+    if url:
+        get_derivative_store().forget(url)
+        # Une génération au même prompt ne doit plus servir l'URL supprimée
+        get_image_cache().invalidate_url(url)
+
+
+def delete_images(urls=None, player=None, card_color=None, older_than=None, include_thumbnails=True,
+                  batch_size=None, concurrency=None):
+    """
+    Supprime des images en masse, désignées par URL et/ou par filtres du manifeste.
+    
+    Les suppressions sont envoyées par requêtes batch (sans sonde exists()),
+    plusieurs batchs en parallèle. Un objet déjà absent compte comme supprimé.
+    
+    Args:
+        urls (list, optional): URLs publiques des images
+        player (str, optional): Toutes les cartes de ce joueur
+        card_color (str, optional): Toutes les cartes de cette couleur
+        older_than (float, optional): Cartes plus anciennes que ce nombre de secondes
+        include_thumbnails (bool): Supprimer aussi les miniatures des cartes
+        batch_size (int, optional): Suppressions par batch (défaut: FIREBASE_DELETE_BATCH_SIZE ou 100)
+        concurrency (int, optional): Batchs simultanés (défaut: FIREBASE_DELETE_CONCURRENCY ou 4)
+    
+    Returns:
+        dict: requested, deleted, not_found, failed et results [{name, url, status, error}]
+              (status: deleted, not_found, invalid_url ou error)
+    """
+    batch_size = min(100, batch_size or DELETE_BATCH_SIZE)
+    concurrency = concurrency or DELETE_CONCURRENCY
+    results = []
+    targets = {}
+    
+    for url in urls or []:
+        name = object_name_from_url(url)
+        if name is None:
+            results.append({"name": None, "url": url, "status": "invalid_url", "error": "URL invalide"})
+        else:
+            targets.setdefault(name, url)
+    
+    # Sans filtre, le manifeste n'est pas parcouru (jamais de suppression de toutes les cartes)
+    if player or card_color or older_than is not None:
+        for card in get_card_manifest().iter_cards(player=player, card_color=card_color, older_than=older_than):
+            targets.setdefault(card['name'], card['public_url'])
+    
+    if include_thumbnails and targets:
+        # Import tardif: card_derivatives importe ce module
+        from card_derivatives import get_derivative_store
+        for record in get_derivative_store().get_many(url for url in list(targets.values()) if url).values():
+            for variant in record['variants']:
+                name = object_name_from_url(variant['url'])
+                if name:
+                    targets.setdefault(name, variant['url'])
+    
+    names = list(targets)
+    if names:
+        bucket = get_uploader().get_bucket()
+        chunks = [names[start:start + batch_size] for start in range(0, len(names), batch_size)]
+        
+        def run(chunk):
+            if bucket is None:
+                return chunk, None, "Firebase non configuré"
+            try:
+                return chunk, firebase_breaker.call(_delete_batch, bucket, chunk), None
+            except CircuitOpenError as e:
+                return chunk, None, str(e)
+            except Exception as e:
+                return chunk, None, f"Erreur de suppression: {e}"
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+            for chunk, statuses, error in executor.map(run, chunks):
+                for index, name in enumerate(chunk):
+                    status_code = statuses[index] if statuses else None
+                    if status_code is not None and (200 <= status_code < 300 or status_code == 404):
+                        _forget_object(name, targets[name])
+                        status = "deleted" if status_code != 404 else "not_found"
+                        results.append({"name": name, "url": targets[name], "status": status})
+                    else:
+                        results.append({"name": name, "url": targets[name], "status": "error",
+                                        "error": error or f"HTTP {status_code}"})
+    
+    report = {
+        "requested": len(results),
+        "deleted": sum(result['status'] == 'deleted' for result in results),
+        "not_found": sum(result['status'] == 'not_found' for result in results),
+        "failed": sum(result['status'] in ('error', 'invalid_url') for result in results),
+        "results": results
+    }
+    print(f"🗑️ Suppression en masse: {report['deleted']} supprimée(s), {report['not_found']} déjà absente(s), "
+          f"{report['failed']} en échec")
+    return report
+
+
 def delete_image(file_url):
     """
-    Supprime une image de Firebase Storage.
+    Supprime une image de Firebase Storage (et ses miniatures s'il s'agit d'une carte).
     
     Args:
         file_url (str): URL de l'image à supprimer
@@ -248,54 +634,36 @@ def delete_image(file_url):
     Returns:
         bool: True si suppression réussie
     """
-    try:
-        if not initialize_firebase():
-            return False
-        
-        # Extraire le nom du fichier de l'URL
-        # Format attendu: https://storage.googleapis.com/bucket-name/path/filename
-        if 'storage.googleapis.com' in file_url:
-            parts = file_url.split('/')
-            bucket_name = parts[3]
-            file_path = '/'.join(parts[4:])
-            
-            bucket = storage.bucket()
-            blob = bucket.blob(file_path)
-            
-            if blob.exists():
-                blob.delete()
-                print(f"✅ Image supprimée: {file_path}")
-                return True
-            else:
-                print(f"⚠️ Image introuvable: {file_path}")
-                return False
-        else:
-            print(f"❌ URL invalide: {file_url}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Erreur de suppression: {e}")
-        return False
+    result = delete_images(urls=[file_url])['results'][0]
+    if result['status'] == 'deleted':
+        print(f"✅ Image supprimée: {result['name']}")
+        return True
+    if result['status'] == 'not_found':
+        print(f"⚠️ Image introuvable: {result['name']}")
+    else:
+        print(f"❌ {result['error']}: {file_url}")
+    return False
 
 
-def list_cards_ai():
+def list_cards_ai(player=None, card_color=None):
     """
-    Liste toutes les cartes IA stockées dans Firebase.
+    Liste les cartes IA stockées dans Firebase, depuis le manifeste local.
+    
+    Le bucket n'est listé que si le manifeste est périmé (synchronisation incrémentale).
+    
+    Args:
+        player (str, optional): Filtre sur le prénom du joueur
+        card_color (str, optional): Filtre sur la couleur de carte
     
     Returns:
-        list: Liste des URLs des cartes IA
+        list: Liste des URLs des cartes IA (des plus récentes aux plus anciennes)
     """
     try:
-        if not initialize_firebase():
-            return []
-        
-        bucket = storage.bucket()
-        blobs = bucket.list_blobs(prefix='cards_ai/')
+        manifest = get_card_manifest()
+        if manifest.is_stale():
+            manifest.sync_bucket(get_uploader().get_bucket())
         
-        card_urls = []
-        for blob in blobs:
-            if blob.name.endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                card_urls.append(blob.public_url)
+        card_urls = [card['public_url'] for card in manifest.iter_cards(player=player, card_color=card_color)]
         
         print(f"📋 {len(card_urls)} cartes IA trouvées")
         return card_urls
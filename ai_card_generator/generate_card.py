@@ -3,18 +3,18 @@ Script principal pour générer automatiquement des cartes SquadField avec l'IA.
 """
 
 import os
-import json
 import argparse
 import sys
-from datetime import datetime
+import time
 from dotenv import load_dotenv
 import openai
 import requests
 
 # Import des modules locaux
-from rules import apply_squadfield_rules, validate_player_data
-from prompt_builder import build_dalle_prompt, validate_prompt_data
-from firebase_uploader import upload_image_from_url, check_firebase_config
+from firebase_uploader import check_firebase_config
+from card_pipeline import run_batch_generation
+from background_atlas import get_background_atlas
+from roster_store import get_roster_store
 
 # Chargement des variables d'environnement
 load_dotenv()
@@ -37,128 +37,61 @@ def setup_openai():
     return True
 
 
-def load_player_data(player_name):
+def load_roster(roster_path='test_players.json', sport=None, age_category=None, card_color=None):
     """
-    Charge les données d'un joueur depuis test_players.json.
+    Charge un effectif complet depuis un fichier JSON (liste de joueurs).
+    
+    Le fichier est parsé une seule fois et indexé (voir roster_store) ; les
+    filtres utilisent les index secondaires.
     
     Args:
-        player_name (str): Nom du joueur à charger
+        roster_path (str): Chemin du fichier roster
+        sport (str, optional): Ne garder que les joueurs de ce sport
+        age_category (str, optional): Ne garder que cette catégorie d'âge
+        card_color (str, optional): Ne garder que cette couleur de carte
         
     Returns:
-        dict: Données du joueur, None si introuvable
+        list: Données des joueurs, None si le fichier est illisible
     """
-    try:
-        with open('test_players.json', 'r', encoding='utf-8') as f:
-            players = json.load(f)
-        
-        for player in players:
-            if player['prenom'].lower() == player_name.lower():
-                print(f"✅ Joueur trouvé: {player['prenom']}")
-                return player
-        
-        print(f"❌ Joueur '{player_name}' introuvable")
-        print("Joueurs disponibles:", [p['prenom'] for p in players])
-        return None
-        
-    except FileNotFoundError:
-        print("❌ Fichier test_players.json introuvable")
-        return None
-    except json.JSONDecodeError:
-        print("❌ Erreur de format JSON dans test_players.json")
+    store = get_roster_store(roster_path)
+    if not store.load():
         return None
+    
+    return store.query(sport=sport, age_category=age_category, card_color=card_color)
 
 
-def generate_dalle_image(prompt, photo_url=None):
+def load_player_data(player_name):
     """
-    Génère une image avec DALL·E 3.
+    Charge les données d'un joueur depuis test_players.json (index des prénoms).
     
     Args:
-        prompt (str): Prompt pour DALL·E
-        photo_url (str, optional): URL de la photo du joueur
+        player_name (str): Nom du joueur à charger
         
     Returns:
-        str: URL de l'image générée, None si erreur
+        dict: Données du joueur, None si introuvable
     """
-    try:
-        print("🎨 Génération de l'image avec DALL·E 3...")
-        print(f"📝 Prompt: {prompt[:100]}...")
-        
-        # Configuration DALL·E
-        model = os.getenv('DALLE_MODEL', 'dall-e-3')
-        size = os.getenv('DALLE_SIZE', '1024x1024')
-        quality = os.getenv('DALLE_QUALITY', 'standard')
-        
-        # Appel à l'API OpenAI
-        response = openai.Image.create(
-            model=model,
-            prompt=prompt,
-            size=size,
-            quality=quality,
-            n=1
-        )
-        
-        if response.data and len(response.data) > 0:
-            image_url = response.data[0].url
-            print(f"✅ Image générée avec succès: {image_url}")
-            return image_url
-        else:
-            print("❌ Aucune image générée par DALL·E")
-            return None
-            
-    except openai.OpenAIError as e:
-        print(f"❌ Erreur OpenAI: {e}")
-        return None
-    except Exception as e:
-        print(f"❌ Erreur inattendue: {e}")
+    store = get_roster_store()
+    if not store.load():
         return None
-
-
-def save_generation_log(player_data, prompt, image_url, firebase_url, success=True):
-    """
-    Sauvegarde un log de la génération.
     
-    Args:
-        player_data (dict): Données du joueur
-        prompt (str): Prompt utilisé
-        image_url (str): URL de l'image DALL·E
-        firebase_url (str): URL Firebase finale
-        success (bool): Succès de l'opération
-    """
-    try:
-        log_data = {
-            "timestamp": datetime.now().isoformat(),
-            "player": player_data['prenom'],
-            "age_category": player_data.get('age_category'),
-            "overall_score": player_data.get('overall_score'),
-            "card_color": player_data.get('card_color'),
-            "prompt": prompt,
-            "dalle_url": image_url,
-            "firebase_url": firebase_url,
-            "success": success
-        }
-        
-        # Créer le dossier logs s'il n'existe pas
-        os.makedirs('logs', exist_ok=True)
-        
-        # Nom du fichier log
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"logs/generation_{timestamp}.json"
-        
-        with open(log_filename, 'w', encoding='utf-8') as f:
-            json.dump(log_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"📄 Log sauvegardé: {log_filename}")
-        
-    except Exception as e:
-        print(f"⚠️ Erreur de sauvegarde du log: {e}")
+    player = store.get(player_name)
+    if player is not None:
+        print(f"✅ Joueur trouvé: {player['prenom']}")
+        return player
+    
+    print(f"❌ Joueur '{player_name}' introuvable")
+    print("Joueurs disponibles:", store.names())
+    return None
 
 
-def generate_card_for_player(player_name):
+def generate_card_for_player(player_name, bypass_cache=False, renderer=None):
     """
     Génère une carte complète pour un joueur.
     
     Args:
         player_name (str): Nom du joueur
+        bypass_cache (bool): Forcer une nouvelle génération DALL·E
+        renderer (str, optional): Moteur de rendu, 'dalle' ou 'local'
         
     Returns:
         dict: Résultat de la génération
@@ -170,78 +103,46 @@ def generate_card_for_player(player_name):
     if not player_data:
         return {"success": False, "error": "Joueur introuvable"}
     
-    # 2. Validation des données
-    is_valid, error_msg = validate_player_data(player_data)
-    if not is_valid:
-        print(f"❌ Données invalides: {error_msg}")
-        return {"success": False, "error": error_msg}
-    
-    # 3. Application des règles SquadField
-    print("⚽ Application des règles SquadField...")
-    enriched_data = apply_squadfield_rules(player_data)
-    
-    print(f"📊 Score global: {enriched_data['overall_score']}")
-    print(f"👥 Catégorie: {enriched_data['age_category']}")
-    print(f"🎨 Couleur de carte: {enriched_data['card_color']}")
-    
-    # 4. Validation des données pour le prompt
-    is_valid, error_msg = validate_prompt_data(enriched_data)
-    if not is_valid:
-        print(f"❌ Données prompt invalides: {error_msg}")
-        return {"success": False, "error": error_msg}
-    
-    # 5. Construction du prompt DALL·E
-    print("🤖 Construction du prompt DALL·E...")
-    prompt = build_dalle_prompt(enriched_data)
-    
-    print("\n" + "="*80)
-    print("📝 PROMPT GÉNÉRÉ:")
-    print("="*80)
-    print(prompt)
-    print("="*80 + "\n")
+    # 2. Validation, règles SquadField, DALL·E et upload Firebase
+    return run_batch_generation(
+        [player_data], concurrency=1, bypass_cache=bypass_cache, renderer=renderer
+    )[0]
+
+
+def generate_cards_for_roster(players, concurrency=None, bypass_cache=False, renderer=None):
+    """
+    Génère les cartes de tout un effectif en une seule exécution.
     
-    # 6. Génération de l'image avec DALL·E
-    image_url = generate_dalle_image(prompt, enriched_data.get('photo_url'))
-    if not image_url:
-        return {"success": False, "error": "Erreur de génération DALL·E"}
+    Args:
+        players (list): Données des joueurs
+        concurrency (int, optional): Générations simultanées (défaut: BATCH_CONCURRENCY)
+        bypass_cache (bool): Forcer de nouvelles générations DALL·E
+        renderer (str, optional): Moteur de rendu, 'dalle' ou 'local'
+        
+    Returns:
+        list: Résultat par joueur, dans l'ordre du roster
+    """
+    print(f"\n👥 === Génération de {len(players)} cartes ===\n")
     
-    # 7. Upload sur Firebase Storage
-    print("☁️ Upload sur Firebase Storage...")
-    firebase_url = upload_image_from_url(
-        image_url,
-        enriched_data['prenom'],
-        enriched_data['card_color']
+    start = time.monotonic()
+    results = run_batch_generation(
+        players, concurrency=concurrency, bypass_cache=bypass_cache, renderer=renderer
     )
+    elapsed = time.monotonic() - start
     
-    if not firebase_url:
-        print("⚠️ Erreur d'upload Firebase, mais image DALL·E disponible")
-        firebase_url = None
-    
-    # 8. Sauvegarde du log
-    save_generation_log(enriched_data, prompt, image_url, firebase_url)
-    
-    # 9. Résultat final
-    result = {
-        "success": True,
-        "player": enriched_data['prenom'],
-        "age_category": enriched_data['age_category'],
-        "overall_score": enriched_data['overall_score'],
-        "card_color": enriched_data['card_color'],
-        "dalle_url": image_url,
-        "firebase_url": firebase_url,
-        "prompt": prompt
-    }
+    print("\n📋 === RÉSULTATS DU LOT ===")
+    for result in results:
+        if result['success']:
+            print(f"✅ {result['player']}: {result['overall_score']} ({result['card_color']}) "
+                  f"→ {result.get('firebase_url') or result.get('dalle_url') or result.get('card_path')}")
+        else:
+            print(f"❌ {result['player']}: {result['error']}")
     
-    print("\n🎉 === GÉNÉRATION TERMINÉE AVEC SUCCÈS ===")
-    print(f"🏃‍♂️ Joueur: {result['player']}")
-    print(f"📊 Score: {result['overall_score']} ({result['card_color']})")
-    print(f"👥 Catégorie: {result['age_category']}")
-    print(f"🔗 URL DALL·E: {result['dalle_url']}")
-    if result['firebase_url']:
-        print(f"☁️ URL Firebase: {result['firebase_url']}")
+    succeeded = sum(1 for result in results if result['success'])
+    print(f"📊 {succeeded}/{len(results)} cartes générées en {elapsed:.1f}s")
     print("="*50 + "\n")
     
-    return result
+    return results
 
 
 def main():
@@ -251,12 +152,53 @@ def main():
     parser = argparse.ArgumentParser(
         description="Générateur automatique de cartes SquadField avec IA"
     )
-    parser.add_argument(
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
         '--player',
         type=str,
-        required=True,
         help="Nom du joueur à traiter"
     )
+    target.add_argument(
+        '--all',
+        action='store_true',
+        help="Générer les cartes de tous les joueurs de test_players.json"
+    )
+    target.add_argument(
+        '--roster',
+        type=str,
+        help="Fichier JSON contenant l'effectif complet à générer"
+    )
+    parser.add_argument(
+        '--sport',
+        type=str,
+        help="Avec --all/--roster: ne générer que les joueurs de ce sport"
+    )
+    parser.add_argument(
+        '--category',
+        type=str,
+        help="Avec --all/--roster: ne générer que cette catégorie d'âge (U8 ... Master)"
+    )
+    parser.add_argument(
+        '--color',
+        type=str,
+        help="Avec --all/--roster: ne générer que cette couleur de carte"
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=None,
+        help="Nombre de cartes générées en parallèle (défaut: BATCH_CONCURRENCY ou 4)"
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Ignorer le cache d'images et forcer une nouvelle génération DALL·E"
+    )
+    parser.add_argument(
+        '--local-render',
+        action='store_true',
+        help="Composer la carte localement avec Pillow (sans appel DALL·E)"
+    )
     parser.add_argument(
         '--check-config',
         action='store_true',
@@ -270,7 +212,12 @@ def main():
     # Vérification de la configuration
     print("🔧 Vérification de la configuration...")
     
-    if not setup_openai():
+    renderer = 'local' if args.local_render else None
+    
+    # La composition locale n'appelle pas OpenAI, mais utilise l'atlas de fonds
+    if args.local_render:
+        get_background_atlas().preload()
+    elif not setup_openai():
         sys.exit(1)
     
     if args.check_config:
@@ -280,9 +227,36 @@ def main():
             print("⚠️ Configuration Firebase incomplète")
             print("ℹ️ L'upload Firebase sera désactivé")
     
-    # Génération de la carte
+    # Génération de la carte (ou de l'effectif)
     try:
-        result = generate_card_for_player(args.player)
+        if args.player:
+            result = generate_card_for_player(
+                args.player, bypass_cache=args.no_cache, renderer=renderer
+            )
+        else:
+            players = load_roster(
+                args.roster or 'test_players.json',
+                sport=args.sport,
+                age_category=args.category,
+                card_color=args.color
+            )
+            if players is None:
+                sys.exit(1)
+            if not players:
+                print("⚠️ Aucun joueur ne correspond aux filtres")
+                sys.exit(1)
+            
+            results = generate_cards_for_roster(
+                players,
+                concurrency=args.concurrency,
+                bypass_cache=args.no_cache,
+                renderer=renderer
+            )
+            failed = [r for r in results if not r['success']]
+            result = {
+                "success": not failed,
+                "error": f"{len(failed)} carte(s) en échec"
+            }
         
         if result['success']:
             print("✨ Génération réussie !")
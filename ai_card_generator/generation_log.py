@@ -0,0 +1,343 @@
+"""
+Journal des générations en append-only (JSONL), écrit par lots en arrière-plan.
+
+Remplace le fichier JSON par carte de logs/ : les générations sont ajoutées à
+logs/generations.jsonl par un thread d'écriture, et le fichier est archivé
+quand il dépasse une taille donnée. La commande de requête filtre par joueur,
+couleur, période et succès, et calcule des agrégats.
+
+Usage:
+    python generation_log.py --player Auguste --since 2025-01-01
+    python generation_log.py --color doré --failed --stats
+    python generation_log.py --import-legacy
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import queue
+import atexit
+import argparse
+import threading
+from datetime import datetime
+
+
+CURRENT_NAME = 'generations.jsonl'
+
+
+class GenerationLog:
+    """
+    Journal JSONL avec rotation par taille et thread d'écriture par lots.
+    """
+
+    def __init__(self, log_dir=None, max_bytes=None, flush_interval=None, max_batch=None):
+        """
+        Args:
+            log_dir (str, optional): Dossier du journal (défaut: GENERATION_LOG_DIR ou logs)
+            max_bytes (int, optional): Taille avant archivage (défaut: GENERATION_LOG_MAX_BYTES ou 10 MB)
+            flush_interval (float, optional): Attente max avant écriture d'un lot, en secondes
+                (défaut: GENERATION_LOG_FLUSH_INTERVAL ou 1)
+            max_batch (int, optional): Enregistrements max par lot (défaut: GENERATION_LOG_MAX_BATCH ou 500)
+        """
+        self.log_dir = log_dir or os.getenv('GENERATION_LOG_DIR', 'logs')
+        self.max_bytes = max_bytes or int(os.getenv('GENERATION_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.getenv('GENERATION_LOG_FLUSH_INTERVAL', '1'))
+        self.max_batch = max_batch or int(os.getenv('GENERATION_LOG_MAX_BATCH', '500'))
+        self.path = os.path.join(self.log_dir, CURRENT_NAME)
+        self._pending = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _ensure_writer(self):
+        """Démarre le thread d'écriture au premier enregistrement."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='generation-log', daemon=True)
+                self._writer.start()
+
+    def append(self, record):
+        """
+        Ajoute une génération au journal (écriture différée, non bloquante).
+
+        Args:
+            record (dict): Données de la génération (sérialisables en JSON)
+        """
+        if self._closed:
+            self._write_batch([record])
+            return
+        self._ensure_writer()
+        self._pending.put(record)
+
+    def _run(self):
+        """Boucle du thread d'écriture: regroupe les enregistrements et les écrit par lot."""
+        while True:
+            record = self._pending.get()
+            if record is None:
+                self._pending.task_done()
+                return
+
+            # Regroupe ce qui arrive avant l'échéance du lot (flush_interval après le
+            # premier enregistrement), jusqu'à max_batch ou l'arrêt : un trafic continu
+            # n'empêche pas l'écriture
+            batch = [record]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                while not stop and len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    item = self._pending.get(timeout=remaining)
+                    batch.append(item)
+                    stop = item is None
+            except queue.Empty:
+                pass
+
+            try:
+                self._write_batch([item for item in batch if item is not None])
+            except Exception as e:
+                print(f"⚠️ Erreur d'écriture du journal des générations: {e}")
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, records):
+        """Écrit un lot de lignes JSON puis archive le fichier s'il est trop gros."""
+        if not records:
+            return
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        with self._write_lock:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        """Archive le fichier courant sous generations-<horodatage>.jsonl (sous verrou)."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        archive = os.path.join(self.log_dir, f"generations-{timestamp}.jsonl")
+        os.replace(self.path, archive)
+        print(f"🗄️ Journal des générations archivé: {archive}")
+
+    def flush(self):
+        """Attend l'écriture de tous les enregistrements en attente."""
+        self._pending.join()
+
+    def close(self):
+        """Écrit les enregistrements en attente et arrête le thread d'écriture."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join(timeout=10)
+
+    def files(self):
+        """
+        Liste les fichiers du journal, du plus ancien au plus récent.
+
+        Returns:
+            list: Archives puis fichier courant
+        """
+        archives = sorted(glob.glob(os.path.join(self.log_dir, 'generations-*.jsonl')))
+        if os.path.exists(self.path):
+            archives.append(self.path)
+        return archives
+
+    def records(self):
+        """Itère sur toutes les générations enregistrées (lignes illisibles ignorées)."""
+        for path in self.files():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def query(self, player=None, card_color=None, since=None, until=None, success=None):
+        """
+        Filtre les générations enregistrées.
+
+        Args:
+            player (str, optional): Prénom du joueur (insensible à la casse)
+            card_color (str, optional): Couleur de carte
+            since (str, optional): Date/heure ISO de début (incluse)
+            until (str, optional): Date/heure ISO de fin (exclue)
+            success (bool, optional): Uniquement les succès (True) ou les échecs (False)
+
+        Yields:
+            dict: Générations correspondantes, dans l'ordre chronologique
+        """
+        player = player.casefold() if player else None
+        for record in self.records():
+            if player and (record.get('player') or '').casefold() != player:
+                continue
+            if card_color and record.get('card_color') != card_color:
+                continue
+            timestamp = record.get('timestamp', '')
+            if since and timestamp < since:
+                continue
+            if until and timestamp >= until:
+                continue
+            if success is not None and bool(record.get('success')) != success:
+                continue
+            yield record
+
+    def import_legacy(self, remove=False):
+        """
+        Importe les anciens fichiers logs/generation_*.json dans le journal.
+
+        Args:
+            remove (bool): Supprimer les fichiers importés
+
+        Returns:
+            int: Nombre de générations importées
+        """
+        paths = sorted(glob.glob(os.path.join(self.log_dir, 'generation_*.json')))
+        records = []
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    records.append(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Log illisible ignoré {path}: {e}")
+
+        records.sort(key=lambda record: record.get('timestamp', ''))
+        self._write_batch(records)
+        if remove:
+            for path in paths:
+                os.unlink(path)
+        return len(records)
+
+
+def aggregate(records):
+    """
+    Calcule des agrégats sur des générations.
+
+    Args:
+        records (iterable): Générations (dicts du journal)
+
+    Returns:
+        dict: total, successes, failures, success_rate, cache_hits, average_score,
+              by_color, by_category, first, last
+    """
+    stats = {
+        "total": 0, "successes": 0, "failures": 0, "cache_hits": 0,
+        "by_color": {}, "by_category": {}, "first": None, "last": None
+    }
+    scores = []
+    for record in records:
+        stats['total'] += 1
+        if record.get('success'):
+            stats['successes'] += 1
+        else:
+            stats['failures'] += 1
+        if record.get('cache_hit'):
+            stats['cache_hits'] += 1
+        if isinstance(record.get('overall_score'), (int, float)):
+            scores.append(record['overall_score'])
+
+        color = record.get('card_color') or 'inconnue'
+        category = record.get('age_category') or 'inconnue'
+        stats['by_color'][color] = stats['by_color'].get(color, 0) + 1
+        stats['by_category'][category] = stats['by_category'].get(category, 0) + 1
+
+        timestamp = record.get('timestamp')
+        if timestamp:
+            stats['first'] = min(stats['first'] or timestamp, timestamp)
+            stats['last'] = max(stats['last'] or timestamp, timestamp)
+
+    stats['success_rate'] = round(stats['successes'] / stats['total'], 3) if stats['total'] else None
+    stats['average_score'] = round(sum(scores) / len(scores), 1) if scores else None
+    return stats
+
+
+_generation_log = None
+_generation_log_lock = threading.Lock()
+
+
+def get_generation_log():
+    """
+    Retourne le journal des générations partagé du processus.
+
+    Returns:
+        GenerationLog: Instance unique, vidée à l'arrêt du processus
+    """
+    global _generation_log
+    with _generation_log_lock:
+        if _generation_log is None:
+            _generation_log = GenerationLog()
+            atexit.register(_generation_log.close)
+        return _generation_log
+
+
+def main():
+    """
+    Commande de requête du journal des générations.
+    """
+    parser = argparse.ArgumentParser(description="Requêtes sur le journal des générations SquadField")
+    parser.add_argument('--player', help="Prénom du joueur")
+    parser.add_argument('--color', help="Couleur de carte (gris, bronze, ..., star)")
+    parser.add_argument('--since', help="Date de début ISO (ex: 2025-01-31 ou 2025-01-31T08:00)")
+    parser.add_argument('--until', help="Date de fin ISO (exclue)")
+    outcome = parser.add_mutually_exclusive_group()
+    outcome.add_argument('--success', action='store_true', help="Uniquement les succès")
+    outcome.add_argument('--failed', action='store_true', help="Uniquement les échecs")
+    parser.add_argument('--stats', action='store_true', help="Afficher les agrégats au lieu des lignes")
+    parser.add_argument('--limit', type=int, default=50, help="Nombre max de lignes affichées (défaut: 50)")
+    parser.add_argument('--json', action='store_true', help="Sortie JSON")
+    parser.add_argument('--import-legacy', action='store_true',
+                        help="Importer les anciens logs/generation_*.json puis les supprimer")
+
+    args = parser.parse_args()
+    log = GenerationLog()
+
+    if args.import_legacy:
+        imported = log.import_legacy(remove=True)
+        print(f"📥 {imported} ancien(s) log(s) importé(s) dans {log.path}")
+        sys.exit(0)
+
+    success = True if args.success else False if args.failed else None
+    records = log.query(player=args.player, card_color=args.color,
+                        since=args.since, until=args.until, success=success)
+
+    if args.stats:
+        stats = aggregate(records)
+        if args.json:
+            print(json.dumps(stats, indent=2, ensure_ascii=False))
+        else:
+            print(f"📊 {stats['total']} génération(s) du {stats['first']} au {stats['last']}")
+            print(f"✅ Succès: {stats['successes']}  ❌ Échecs: {stats['failures']}  "
+                  f"(taux: {stats['success_rate']})")
+            print(f"⚡ Cache: {stats['cache_hits']}  📈 Score moyen: {stats['average_score']}")
+            print(f"🎨 Par couleur: {stats['by_color']}")
+            print(f"👥 Par catégorie: {stats['by_category']}")
+        sys.exit(0)
+
+    matched = list(records)
+    shown = matched[-args.limit:] if args.limit else matched
+    for record in shown:
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            status = "✅" if record.get('success') else "❌"
+            print(f"{status} {record.get('timestamp')} {record.get('player')} "
+                  f"{record.get('overall_score')} ({record.get('card_color')}, {record.get('age_category')}) "
+                  f"→ {record.get('firebase_url') or record.get('dalle_url')}")
+    if not args.json:
+        print(f"📋 {len(shown)}/{len(matched)} génération(s) affichée(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Cache des images générées, adressé par le contenu du prompt DALL·E.
+
+build_dalle_prompt est déterministe : un même joueur (mêmes stats, même couleur)
+produit le même prompt. La clé est un hash du prompt normalisé et des réglages
+DALL·E (modèle, taille, qualité) ; la valeur est l'URL Firebase déjà stockée.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_cache (
+    key TEXT PRIMARY KEY,
+    firebase_url TEXT NOT NULL,
+    dalle_url TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_image_cache_last_used ON image_cache(last_used);
+CREATE INDEX IF NOT EXISTS idx_image_cache_firebase_url ON image_cache(firebase_url);
+"""
+
+
+def normalize_prompt(prompt):
+    """
+    Normalise un prompt (espaces multiples, retours à la ligne) avant hachage.
+
+    Args:
+        prompt (str): Prompt DALL·E
+
+    Returns:
+        str: Prompt normalisé
+    """
+    return ' '.join(prompt.split())
+
+
+def compute_cache_key(prompt, settings):
+    """
+    Calcule la clé de cache d'une image.
+
+    Args:
+        prompt (str): Prompt DALL·E
+        settings (dict): Réglages DALL·E (model, size, quality)
+
+    Returns:
+        str: Hash SHA-256 hexadécimal
+    """
+    material = json.dumps({
+        "prompt": normalize_prompt(prompt),
+        "model": settings.get('model'),
+        "size": settings.get('size'),
+        "quality": settings.get('quality')
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    """
+    Cache clé de prompt -> URL Firebase, persisté dans SQLite,
+    avec expiration (TTL) et éviction LRU au-delà de max_entries.
+    """
+
+    def __init__(self, db_path=None, ttl=None, max_entries=None):
+        """
+        Args:
+            db_path (str, optional): Base SQLite (défaut: IMAGE_CACHE_DB_PATH ou data/image_cache.db)
+            ttl (int, optional): Durée de vie en secondes (défaut: IMAGE_CACHE_TTL ou 30 jours)
+            max_entries (int, optional): Entrées max (défaut: IMAGE_CACHE_MAX_ENTRIES ou 5000)
+        """
+        self.db_path = db_path or os.getenv('IMAGE_CACHE_DB_PATH', 'data/image_cache.db')
+        self.ttl = ttl if ttl is not None else int(os.getenv('IMAGE_CACHE_TTL', str(30 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', '5000'))
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def get(self, key):
+        """
+        Cherche une image en cache.
+
+        Args:
+            key (str): Clé calculée par compute_cache_key
+
+        Returns:
+            dict: {firebase_url, dalle_url}, None si absente ou expirée
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM image_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+
+            if self.ttl and now - row['created_at'] > self.ttl:
+                self._conn.execute("DELETE FROM image_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE image_cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return {"firebase_url": row['firebase_url'], "dalle_url": row['dalle_url']}
+
+    def put(self, key, firebase_url, dalle_url=None):
+        """
+        Enregistre une image stockée sur Firebase et applique l'éviction LRU.
+
+        Args:
+            key (str): Clé calculée par compute_cache_key
+            firebase_url (str): URL publique Firebase de la carte
+            dalle_url (str, optional): URL DALL·E d'origine (expire côté OpenAI)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_cache (key, firebase_url, dalle_url, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, firebase_url, dalle_url, now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM image_cache WHERE key IN ("
+                "SELECT key FROM image_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def invalidate(self, key):
+        """Supprime une entrée du cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM image_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def invalidate_url(self, firebase_url):
+        """
+        Supprime les entrées qui pointent vers une image Firebase (image supprimée du bucket).
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM image_cache WHERE firebase_url = ?", (firebase_url,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def size(self):
+        """Retourne le nombre d'entrées en cache."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM image_cache").fetchone()[0]
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def is_cache_enabled():
+    """Le cache peut être désactivé globalement avec IMAGE_CACHE_ENABLED=false."""
+    return os.getenv('IMAGE_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+def get_image_cache():
+    """
+    Retourne le cache d'images partagé du processus.
+
+    Returns:
+        ImageCache: Instance unique, créée au premier appel
+    """
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
@@ -0,0 +1,229 @@
+"""
+Diffusion en direct des étapes des jobs de génération (Server-Sent Events).
+
+La file de jobs publie chaque transition (étape terminée, statut final) sur un
+bus en mémoire ; chaque client abonné à GET /generate/<job_id>/events reçoit
+les événements avec leurs durées, sans interroger /jobs/<job_id> en boucle.
+Le bus ne traverse pas les processus : quand le job tourne dans un autre
+worker, le flux relit le store des jobs entre deux événements.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from datetime import datetime
+
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+# Libellés des étapes affichés par le frontend (AnalysisProgress)
+STAGE_LABELS = {
+    'uploaded': "Fichiers enregistrés",
+    'frames_extracted': "Images clés de la vidéo extraites",
+    'stats_analyzed': "Statistiques analysées depuis la vidéo",
+    'rules_applied': "Règles SquadField appliquées",
+    'prompt_built': "Prompt construit",
+    'image_generated': "Image générée",
+    'firebase_uploaded': "Upload Firebase terminé",
+    'derivatives_built': "Miniatures produites"
+}
+
+
+class JobEventBus:
+    """
+    Bus publish/subscribe par job, à l'intérieur d'un processus.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id):
+        """
+        Abonne un client aux événements d'un job.
+
+        Args:
+            job_id (str): Identifiant du job
+
+        Returns:
+            queue.Queue: File recevant les événements publiés
+        """
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(events)
+        return events
+
+    def unsubscribe(self, job_id, events):
+        """Désabonne un client (connexion SSE fermée)."""
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, [])
+            if events in subscribers:
+                subscribers.remove(events)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id, event):
+        """
+        Diffuse un événement à tous les abonnés d'un job.
+
+        Args:
+            job_id (str): Identifiant du job
+            event (dict): Événement (type, stage, status, at, ...)
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, []))
+        for events in subscribers:
+            events.put(event)
+
+    def subscriber_count(self):
+        """Retourne le nombre de connexions abonnées."""
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def elapsed_ms(start, end):
+    """Durée en millisecondes entre deux horodatages ISO."""
+    return round((datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds() * 1000)
+
+
+def stage_event(job_id, stage, at, created_at, previous_at):
+    """
+    Construit l'événement d'une étape terminée, avec ses durées.
+
+    Args:
+        job_id (str): Identifiant du job
+        stage (str): Étape terminée
+        at (str): Horodatage ISO de fin d'étape
+        created_at (str): Horodatage ISO de dépôt du job
+        previous_at (str): Horodatage ISO de l'étape précédente
+
+    Returns:
+        dict: job_id, stage, label, at, elapsed_ms (depuis le dépôt), duration_ms (de l'étape)
+    """
+    return {
+        "job_id": job_id,
+        "stage": stage,
+        "label": STAGE_LABELS.get(stage, stage),
+        "at": at,
+        "elapsed_ms": elapsed_ms(created_at, at),
+        "duration_ms": elapsed_ms(previous_at, at)
+    }
+
+
+def format_sse(event, data):
+    """
+    Formate un message Server-Sent Events.
+
+    Args:
+        event (str): Nom de l'événement (stage, completed, failed, ...)
+        data (dict): Données sérialisées en JSON
+
+    Returns:
+        str: Message SSE
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _final_event(job_id, status, at, created_at, result=None, error=None):
+    """Message SSE de fin de job (completed ou failed)."""
+    data = {"job_id": job_id, "status": status, "at": at, "elapsed_ms": elapsed_ms(created_at, at)}
+    if status == 'completed':
+        data['result'] = result
+    else:
+        data['error'] = error
+    return format_sse(status, data)
+
+
+def _stored_stages(job, sent):
+    """Étapes terminées d'un job lu dans le store, pas encore envoyées, dans l'ordre."""
+    return [(stage, at) for stage, at in sorted(job['stages'].items(), key=lambda item: item[1])
+            if stage != 'completed' and stage not in sent]
+
+
+def stream_job_events(job_queue, job_id, heartbeat=None, max_duration=None, poll_interval=None):
+    """
+    Générateur du flux SSE d'un job : rejoue les étapes déjà terminées, puis
+    diffuse les transitions en direct jusqu'au statut final.
+
+    Sans événement du bus pendant poll_interval (job exécuté par un autre
+    processus), l'état du job est relu dans le store. Un commentaire keep-alive
+    est envoyé régulièrement pour que les proxys ne coupent pas la connexion
+    pendant la génération DALL·E.
+
+    Args:
+        job_queue (JobQueue): File de jobs (store et bus d'événements)
+        job_id (str): Identifiant du job (existant)
+        heartbeat (float, optional): Secondes entre deux keep-alive (défaut: SSE_HEARTBEAT_INTERVAL ou 15)
+        max_duration (float, optional): Durée max du flux en secondes (défaut: SSE_MAX_DURATION ou 600)
+        poll_interval (float, optional): Secondes sans événement avant relecture du store
+            (défaut: SSE_POLL_INTERVAL ou 2)
+
+    Yields:
+        str: Messages SSE (status, stage, completed, failed, timeout)
+    """
+    heartbeat = heartbeat or float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+    max_duration = max_duration or float(os.getenv('SSE_MAX_DURATION', '600'))
+    poll_interval = poll_interval or float(os.getenv('SSE_POLL_INTERVAL', '2'))
+
+    # Abonnement avant la lecture du store: aucune transition ne peut être manquée
+    events = job_queue.events.subscribe(job_id)
+    try:
+        job = job_queue.get(job_id)
+        created_at = job['created_at']
+        yield format_sse('status', {"job_id": job_id, "status": job['status'], "stage": job['stage']})
+
+        sent = set()
+        previous_at = created_at
+        for stage, at in _stored_stages(job, sent):
+            yield format_sse('stage', stage_event(job_id, stage, at, created_at, previous_at))
+            sent.add(stage)
+            previous_at = at
+
+        if job['status'] in TERMINAL_STATUSES:
+            yield _final_event(job_id, job['status'], job['updated_at'], created_at,
+                               job['result'], job['error'])
+            return
+
+        deadline = time.monotonic() + max_duration
+        next_heartbeat = time.monotonic() + heartbeat
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                yield format_sse('timeout', {"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+                return
+
+            try:
+                event = events.get(timeout=max(0, min(poll_interval, next_heartbeat - now, deadline - now)))
+            except queue.Empty:
+                # Rien sur le bus local: le job peut tourner dans un autre processus
+                job = job_queue.get(job_id)
+                for stage, at in _stored_stages(job, sent):
+                    yield format_sse('stage', stage_event(job_id, stage, at, created_at, previous_at))
+                    sent.add(stage)
+                    previous_at = at
+                if job['status'] in TERMINAL_STATUSES:
+                    yield _final_event(job_id, job['status'], job['updated_at'], created_at,
+                                       job['result'], job['error'])
+                    return
+                if time.monotonic() >= next_heartbeat:
+                    yield ": keep-alive\n\n"
+                    next_heartbeat = time.monotonic() + heartbeat
+                continue
+
+            if event['type'] == 'stage':
+                if event['stage'] in sent:
+                    continue
+                yield format_sse('stage', stage_event(job_id, event['stage'], event['at'],
+                                                      created_at, previous_at))
+                sent.add(event['stage'])
+                previous_at = event['at']
+            elif event['status'] in TERMINAL_STATUSES:
+                yield _final_event(job_id, event['status'], event['at'], created_at,
+                                   event['result'], event['error'])
+                return
+            else:
+                yield format_sse('status', {"job_id": job_id, "status": event['status']})
+    finally:
+        job_queue.events.unsubscribe(job_id, events)
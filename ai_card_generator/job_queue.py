@@ -0,0 +1,224 @@
+"""
+File de jobs asynchrone pour la génération de cartes SquadField.
+
+Les requêtes HTTP déposent un job et reçoivent immédiatement son identifiant ;
+un pool borné de workers exécute la génération (DALL·E + Firebase) en arrière-plan.
+Les jobs et leurs étapes sont persistés dans un JobStore SQLite.
+
+Chaque processus serveur a sa propre file : un job n'est exécuté qu'après
+l'avoir réservé dans la table (bail renouvelé en arrière-plan), pour que deux
+workers gunicorn ne reprennent jamais le même job.
+"""
+
+import os
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from job_store import JobStore
+from job_events import JobEventBus
+
+
+class QueueFullError(Exception):
+    """Levée quand la file a atteint sa capacité maximale de jobs en attente."""
+
+
+class JobQueue:
+    """
+    File de jobs persistée, exécutée par un pool de threads borné.
+
+    Chaque job a un status (queued, running, completed, failed), la dernière
+    étape terminée (stage), l'horodatage de chaque étape, un result et une error.
+    """
+
+    def __init__(self, handler, store=None, max_workers=None, max_pending=None, events=None,
+                 owner=None, lease=None):
+        """
+        Args:
+            handler (callable): Fonction handler(payload, report_stage, checkpoint) -> dict résultat
+            store (JobStore, optional): Stockage des jobs (défaut: JobStore())
+            max_workers (int, optional): Nombre de workers (défaut: GENERATION_WORKERS ou 4)
+            max_pending (int, optional): Jobs en attente max (défaut: GENERATION_QUEUE_SIZE ou 100)
+            events (JobEventBus, optional): Bus recevant les transitions des jobs (SSE)
+            owner (str, optional): Identifiant de la file dans la table (défaut: hôte, pid et suffixe aléatoire)
+            lease (float, optional): Durée du bail des jobs réservés, en secondes
+                (défaut: JOB_LEASE_SECONDS ou 60), renouvelé au tiers de sa durée
+        """
+        self.handler = handler
+        self.store = store or JobStore()
+        self.events = events or JobEventBus()
+        self.max_workers = max_workers or int(os.getenv('GENERATION_WORKERS', '4'))
+        self.max_pending = max_pending or int(os.getenv('GENERATION_QUEUE_SIZE', '100'))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='card-worker'
+        )
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease = lease or float(os.getenv('JOB_LEASE_SECONDS', '60'))
+        self._active = 0
+        self._claimed = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._keeper = None
+        self._keeper_lock = threading.Lock()
+
+    def submit(self, payload, checkpoint=None, batch_id=None):
+        """
+        Dépose un job dans la file.
+
+        Args:
+            payload (dict): Données transmises au handler (sérialisables en JSON)
+            checkpoint (dict, optional): Étapes déjà calculées lors du dépôt
+            batch_id (str, optional): Identifiant du lot auquel appartient le job
+
+        Returns:
+            str: Identifiant du job
+
+        Raises:
+            QueueFullError: Si trop de jobs sont déjà en attente ou en cours
+        """
+        job_id = uuid.uuid4().hex
+
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise QueueFullError(
+                    f"File de génération pleine ({self.max_pending} jobs en cours)"
+                )
+            self._active += 1
+            self._claimed.add(job_id)
+
+        try:
+            self.store.create(job_id, payload, checkpoint=checkpoint, batch_id=batch_id,
+                              owner=self.owner, lease=self.lease)
+        except Exception:
+            with self._lock:
+                self._active -= 1
+                self._claimed.discard(job_id)
+            raise
+
+        self._ensure_keeper()
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def recover(self):
+        """
+        Remet en file les jobs interrompus par un arrêt du serveur.
+
+        Seuls les jobs réservés avec succès sont repris (sans propriétaire ou
+        bail expiré) : un job en cours dans un autre processus vivant est ignoré.
+        Ils reprennent à leur dernière étape terminée grâce au checkpoint.
+
+        Returns:
+            int: Nombre de jobs repris
+        """
+        self._ensure_keeper()
+        recovered = 0
+        for job in self.store.list_unfinished():
+            # Job déjà confié au pool de cette file
+            with self._lock:
+                if job['id'] in self._claimed:
+                    continue
+                self._claimed.add(job['id'])
+            if not self.store.claim(job['id'], self.owner, self.lease):
+                with self._lock:
+                    self._claimed.discard(job['id'])
+                continue
+            print(f"♻️ Reprise du job {job['id']} depuis l'étape '{job['stage']}'")
+            with self._lock:
+                self._active += 1
+            self._executor.submit(self._run, job['id'])
+            recovered += 1
+        return recovered
+
+    def _ensure_keeper(self):
+        """Démarre le thread de renouvellement des baux au premier job."""
+        with self._keeper_lock:
+            if self._keeper is None:
+                self._keeper = threading.Thread(target=self._keep_leases, name='job-leases', daemon=True)
+                self._keeper.start()
+
+    def _keep_leases(self):
+        """
+        Renouvelle les baux des jobs de cette file, et reprend ceux des
+        processus disparus (bail expiré) au fil de l'eau.
+        """
+        while not self._stopped.wait(self.lease / 3):
+            try:
+                self.store.renew_leases(self.owner, self.lease)
+                self.recover()
+            except Exception as e:
+                print(f"⚠️ Renouvellement des baux de jobs impossible: {e}")
+
+    def get(self, job_id):
+        """
+        Retourne l'état public d'un job.
+
+        Args:
+            job_id (str): Identifiant du job
+
+        Returns:
+            dict: État du job, None si inconnu
+        """
+        return self.store.get(job_id)
+
+    def get_batch(self, batch_id):
+        """
+        Retourne l'état de tous les jobs d'un lot.
+
+        Args:
+            batch_id (str): Identifiant du lot
+
+        Returns:
+            list: États publics des jobs (vide si lot inconnu)
+        """
+        return self.store.list_batch(batch_id)
+
+    def stats(self):
+        """Retourne les compteurs de la file (pour /health)."""
+        counts = self.store.count_by_status()
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "queued": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "completed": counts.get('completed', 0),
+            "failed": counts.get('failed', 0)
+        }
+
+    def _report_stage(self, job_id, stage, **artifacts):
+        """Persiste une étape terminée et la diffuse aux abonnés."""
+        at = self.store.save_stage(job_id, stage, **artifacts)
+        self.events.publish(job_id, {"type": "stage", "stage": stage, "at": at})
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        """Persiste un changement de statut et le diffuse aux abonnés."""
+        at = self.store.set_status(job_id, status, result=result, error=error)
+        self.events.publish(job_id, {
+            "type": "status", "status": status, "at": at, "result": result, "error": error
+        })
+
+    def _run(self, job_id):
+        """Exécute (ou reprend) un job réservé par cette file dans un worker du pool."""
+        try:
+            job = self.store.get(job_id, include_internal=True)
+            self._set_status(job_id, 'running')
+
+            result = self.handler(
+                job['payload'],
+                lambda stage, **artifacts: self._report_stage(job_id, stage, **artifacts),
+                job['checkpoint']
+            )
+            self._set_status(job_id, 'completed', result=result)
+        except Exception as e:
+            print(f"💥 Job {job_id} en échec: {e}")
+            self._set_status(job_id, 'failed', error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._claimed.discard(job_id)
+
+    def shutdown(self, wait=True):
+        """Arrête le pool de workers et le renouvellement des baux."""
+        self._stopped.set()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,304 @@
+"""
+Stockage durable des jobs de génération dans SQLite.
+
+Chaque étape terminée du pipeline est enregistrée avec ses résultats
+(données enrichies, prompt, URL DALL·E, URL Firebase) : après un redémarrage,
+un job interrompu reprend à sa dernière étape au lieu de repayer DALL·E.
+
+Plusieurs processus (workers gunicorn) partagent la table : chaque job est
+réservé par un propriétaire avec un bail renouvelé tant que le processus vit.
+Seul un job en file sans propriétaire, ou dont le bail a expiré, peut être repris.
+"""
+
+import os
+import time
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+
+# Étapes du pipeline, dans l'ordre
+JOB_STAGES = [
+    'uploaded',
+    'frames_extracted',
+    'stats_analyzed',
+    'rules_applied',
+    'prompt_built',
+    'image_generated',
+    'firebase_uploaded',
+    'derivatives_built',
+    'completed'
+]
+
+UNFINISHED_STATUSES = ('queued', 'running')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    checkpoint TEXT NOT NULL DEFAULT '{}',
+    stages TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs(batch_id);
+"""
+
+
+class JobStore:
+    """
+    Table de jobs SQLite partagée par les workers (une connexion, protégée par verrou).
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str, optional): Chemin de la base (défaut: JOBS_DB_PATH ou data/jobs.db)
+        """
+        self.db_path = db_path or os.getenv('JOBS_DB_PATH', 'data/jobs.db')
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            if self.db_path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._migrate()
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def _migrate(self):
+        """Ajoute les colonnes apparues après la création d'une base existante."""
+        columns = [row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if columns and 'batch_id' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+        if columns and 'owner' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+
+    def create(self, job_id, payload, checkpoint=None, batch_id=None, owner=None, lease=None):
+        """
+        Enregistre un nouveau job (fichiers déjà sauvegardés).
+
+        Args:
+            job_id (str): Identifiant du job
+            payload (dict): Données du joueur
+            checkpoint (dict, optional): Résultats d'étapes déjà calculées (ex: enriched_data)
+            batch_id (str, optional): Identifiant du lot (génération d'équipe)
+            owner (str, optional): Processus qui exécutera le job (réservé dès le dépôt)
+            lease (float, optional): Durée du bail du propriétaire, en secondes
+        """
+        now = datetime.now().isoformat()
+        stages = {'uploaded': now}
+        stage = 'uploaded'
+        if checkpoint and 'enriched_data' in checkpoint:
+            stages['rules_applied'] = now
+            stage = 'rules_applied'
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, batch_id, status, stage, payload, checkpoint, stages, "
+                "owner, lease_until, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, batch_id, stage, json.dumps(payload, ensure_ascii=False),
+                 json.dumps(checkpoint or {}, ensure_ascii=False), json.dumps(stages),
+                 owner, time.time() + lease if owner and lease else None, now, now)
+            )
+            self._conn.commit()
+
+    def save_stage(self, job_id, stage, **artifacts):
+        """
+        Enregistre la fin d'une étape et les résultats nécessaires à la reprise.
+
+        Args:
+            job_id (str): Identifiant du job
+            stage (str): Étape terminée (voir JOB_STAGES)
+            **artifacts: Résultats de l'étape, fusionnés dans le checkpoint
+
+        Returns:
+            str: Horodatage ISO de fin d'étape
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checkpoint, stages FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            checkpoint = json.loads(row['checkpoint'])
+            checkpoint.update(artifacts)
+            stages = json.loads(row['stages'])
+            stages[stage] = now
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, checkpoint = ?, stages = ?, updated_at = ? WHERE id = ?",
+                (stage, json.dumps(checkpoint, ensure_ascii=False),
+                 json.dumps(stages), now, job_id)
+            )
+            self._conn.commit()
+        return now
+
+    def set_status(self, job_id, status, result=None, error=None):
+        """
+        Met à jour le statut d'un job.
+
+        Args:
+            job_id (str): Identifiant du job
+            status (str): queued, running, completed ou failed
+            result (dict, optional): Résultat final
+            error (str, optional): Message d'erreur
+
+        Returns:
+            str: Horodatage ISO du changement de statut
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            if status == 'completed':
+                row = self._conn.execute(
+                    "SELECT stages FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                stages = json.loads(row['stages'])
+                stages['completed'] = now
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, stage = 'completed', stages = ?, result = ?, "
+                    "error = NULL, updated_at = ? WHERE id = ?",
+                    (status, json.dumps(stages),
+                     json.dumps(result, ensure_ascii=False), now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (status, error, now, job_id)
+                )
+            self._conn.commit()
+        return now
+
+    def get(self, job_id, include_internal=False):
+        """
+        Retourne l'état d'un job.
+
+        Args:
+            job_id (str): Identifiant du job
+            include_internal (bool): Inclure payload et checkpoint (usage workers)
+
+        Returns:
+            dict: État du job, None si inconnu
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row, include_internal) if row else None
+
+    def list_batch(self, batch_id):
+        """
+        Liste les jobs d'un lot, dans l'ordre de dépôt.
+
+        Args:
+            batch_id (str): Identifiant du lot
+
+        Returns:
+            list: États publics des jobs du lot
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at, rowid", (batch_id,)
+            ).fetchall()
+        return [self._row_to_job(row, include_internal=False) for row in rows]
+
+    def list_unfinished(self):
+        """
+        Liste les jobs interrompus (en file ou en cours) à reprendre.
+
+        Returns:
+            list: Jobs complets (avec payload et checkpoint), du plus ancien au plus récent
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at, rowid",
+                UNFINISHED_STATUSES
+            ).fetchall()
+        return [self._row_to_job(row, include_internal=True) for row in rows]
+
+    def claim(self, job_id, owner, lease):
+        """
+        Réserve atomiquement un job inachevé pour un processus.
+
+        La réservation réussit si le job est libre (sans propriétaire ou bail
+        expiré) ou déjà réservé par ce même propriétaire.
+
+        Args:
+            job_id (str): Identifiant du job
+            owner (str): Identifiant du processus
+            lease (float): Durée du bail, en secondes
+
+        Returns:
+            bool: True si le job est réservé par owner
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ? AND status IN (?, ?) "
+                "AND (owner IS NULL OR owner = ? OR lease_until IS NULL OR lease_until < ?)",
+                (owner, now + lease, job_id, *UNFINISHED_STATUSES, owner, now)
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def renew_leases(self, owner, lease):
+        """
+        Prolonge les baux des jobs inachevés d'un processus.
+
+        Args:
+            owner (str): Identifiant du processus
+            lease (float): Durée du bail, en secondes
+
+        Returns:
+            int: Nombre de jobs dont le bail a été prolongé
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?)",
+                (time.time() + lease, owner, *UNFINISHED_STATUSES)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def count_by_status(self):
+        """Retourne le nombre de jobs par statut."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def close(self):
+        """Ferme la connexion SQLite."""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_job(row, include_internal):
+        """Convertit une ligne SQLite en dict de job."""
+        payload = json.loads(row['payload'])
+        job = {
+            "id": row['id'],
+            "batch_id": row['batch_id'],
+            "player": payload.get('prenom'),
+            "status": row['status'],
+            "stage": row['stage'],
+            "stages": json.loads(row['stages']),
+            "result": json.loads(row['result']) if row['result'] else None,
+            "error": row['error'],
+            "created_at": row['created_at'],
+            "updated_at": row['updated_at']
+        }
+        if include_internal:
+            job['payload'] = payload
+            job['checkpoint'] = json.loads(row['checkpoint'])
+        return job
@@ -0,0 +1,287 @@
+"""
+Métriques du générateur de cartes, exposées au format texte Prometheus sur /metrics.
+
+Histogrammes de durée par étape (parse multipart, sauvegarde des fichiers,
+validation, règles, prompt, DALL·E, upload, écriture du log), compteurs de
+cartes réussies/échouées par couleur et catégorie, jauges de travaux en cours.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+
+# Bornes des histogrammes de durée, en secondes (de la validation à DALL·E HD)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value):
+    """Échappe une valeur de label (antislash, guillemet, retour à la ligne)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    """Formate un ensemble de labels: {a="1",b="2"} (vide si aucun)."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    """Formate une valeur numérique Prometheus."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base commune: nom, aide, labels et séries par combinaison de labels."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """Clé ordonnée des labels, vérifiée contre labelnames."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Labels attendus pour {self.name}: {self.labelnames}, reçus: {sorted(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self):
+        """
+        Retourne les lignes au format texte Prometheus.
+
+        Returns:
+            list: Lignes HELP, TYPE et échantillons
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(series))
+        return lines
+
+
+class Counter(_Metric):
+    """Compteur monotone."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Incrémente le compteur pour une combinaison de labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Retourne la valeur courante (0 si jamais incrémenté)."""
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, series):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in series]
+
+
+class Gauge(_Metric):
+    """Jauge (valeur qui monte et descend)."""
+
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        """Augmente la jauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Diminue la jauge."""
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        """Fixe la valeur de la jauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def value(self, **labels):
+        """Retourne la valeur courante (0 si jamais modifiée)."""
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """Compte un travail en cours pendant la durée du bloc."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _render_series(self, series):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in series]
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif (buckets, somme, nombre d'observations)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        """Enregistre une observation (en secondes pour les durées)."""
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc (succès ou exception)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        """Retourne le nombre d'observations pour une combinaison de labels."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series['count'] if series else 0
+
+    def _render_series(self, series):
+        lines = []
+        for key, data in series:
+            cumulative = 0
+            for bound, hits in zip(self.buckets, data['buckets']):
+                cumulative += hits
+                labels = key + (('le', _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(data['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {data['count']}")
+        return lines
+
+
+class Registry:
+    """
+    Ensemble des métriques du processus et des collecteurs calculés à la lecture.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Enregistre une métrique (une seule par nom) et la retourne."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def register_collector(self, collector):
+        """
+        Enregistre un collecteur appelé à chaque lecture de /metrics.
+
+        Args:
+            collector (callable): Fonction sans argument retournant une liste de
+                (nom, type, aide, [(labels dict, valeur), ...])
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """
+        Retourne toutes les métriques au format texte Prometheus (version 0.0.4).
+
+        Returns:
+            str: Exposition Prometheus
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"⚠️ Erreur de collecte des métriques: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Métriques du pipeline de génération
+STAGE_DURATION = REGISTRY.register(Histogram(
+    'squadfield_stage_duration_seconds',
+    "Durée de chaque étape de génération d'une carte",
+    ['stage']
+))
+
+CARDS_TOTAL = REGISTRY.register(Counter(
+    'squadfield_cards_total',
+    "Cartes générées, par résultat, couleur et catégorie d'âge",
+    ['outcome', 'card_color', 'age_category']
+))
+
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'squadfield_in_flight',
+    "Travaux en cours (requêtes /generate, générations, vidéos, analyses, appels DALL·E, uploads, miniatures)",
+    ['kind']
+))
+
+
+def time_stage(stage):
+    """
+    Mesure la durée d'une étape de génération.
+
+    Args:
+        stage (str): multipart_parse, file_save, validate, video_frames, analysis,
+            rules, prompt, dalle, render, upload, derivatives ou log_write
+
+    Returns:
+        Context manager mesurant le bloc
+    """
+    return STAGE_DURATION.time(stage=stage)
+
+
+def record_card(success, card_color=None, age_category=None):
+    """Compte une carte réussie ou échouée pour sa couleur et sa catégorie."""
+    CARDS_TOTAL.inc(
+        outcome='success' if success else 'failure',
+        card_color=card_color or 'unknown',
+        age_category=age_category or 'unknown'
+    )
+
+
+def render_metrics():
+    """Retourne l'exposition Prometheus du processus."""
+    return REGISTRY.render()
@@ -0,0 +1,287 @@
+"""
+Ordonnanceur partagé devant l'API d'images OpenAI.
+
+Toutes les générations DALL·E du processus passent par un limiteur de
+concurrence adaptatif (AIMD) : la limite augmente doucement tant que les
+appels réussissent et est divisée par deux à chaque surcharge (429, 5xx,
+timeout) ; les autres erreurs la laissent inchangée. Les erreurs
+transitoires sont rejouées avec un backoff exponentiel à jitter, en
+respectant l'en-tête Retry-After renvoyé par OpenAI.
+"""
+
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def get_status_code(error):
+    """
+    Extrait le code HTTP d'une erreur OpenAI (SDK 1.x: status_code, SDK 0.x: http_status).
+
+    Returns:
+        int: Code HTTP, None si l'erreur n'en porte pas
+    """
+    status = getattr(error, 'status_code', None) or getattr(error, 'http_status', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status
+
+
+def get_retry_after(error):
+    """
+    Lit le délai demandé par OpenAI (retry-after-ms ou Retry-After) sur une erreur.
+
+    Returns:
+        float: Délai en secondes, None si absent
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+
+    try:
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000
+
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, retry_at.timestamp() - time.time())
+    except Exception:
+        return None
+
+    return None
+
+
+def is_overload(error):
+    """
+    Indique si une erreur signale une surcharge de l'API (429, 408, 5xx, timeout,
+    connexion) : la concurrence doit alors diminuer.
+
+    Returns:
+        bool: True si la limite doit être divisée
+    """
+    status = get_status_code(error)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    name = type(error).__name__
+    return 'Connection' in name or 'Timeout' in name
+
+
+def is_retryable(error):
+    """
+    Indique si une erreur OpenAI est transitoire (429, 5xx, timeout, connexion).
+
+    Returns:
+        bool: True si l'appel peut être rejoué
+    """
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+
+    # Erreurs réseau sans réponse HTTP (APIConnectionError, APITimeoutError, ...)
+    name = type(error).__name__
+    return 'Connection' in name or 'Timeout' in name
+
+
+class AdaptiveLimiter:
+    """
+    Limiteur de concurrence AIMD (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=16):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Attend une place libre (et la fin d'une éventuelle pause Retry-After)."""
+        with self._cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self, throttled=False, retry_after=None, failed=False):
+        """
+        Libère une place et ajuste la limite.
+
+        Args:
+            throttled (bool): L'API est surchargée (429, 5xx, timeout: diminution multiplicative)
+            retry_after (float, optional): Pause globale demandée par l'API, en secondes
+            failed (bool): L'appel a échoué sans surcharge (limite inchangée)
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            elif not failed:
+                # +1 sur la limite après une "fenêtre" complète de succès
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def current_limit(self):
+        """Retourne la limite de concurrence courante (entière)."""
+        with self._cond:
+            return int(self.limit)
+
+
+class ImageScheduler:
+    """
+    Exécute les appels d'images OpenAI sous le limiteur adaptatif, avec retries.
+    """
+
+    def __init__(self, limiter=None, max_retries=None, base_delay=None, max_delay=None):
+        """
+        Args:
+            limiter (AdaptiveLimiter, optional): Limiteur (défaut: OPENAI_IMAGE_CONCURRENCY
+                initial, OPENAI_IMAGE_MAX_CONCURRENCY max)
+            max_retries (int, optional): Nombre de retries (défaut: OPENAI_MAX_RETRIES ou 4)
+            base_delay (float, optional): Délai de base du backoff en secondes (défaut: 1)
+            max_delay (float, optional): Délai max du backoff en secondes (défaut: 30)
+        """
+        self.limiter = limiter or AdaptiveLimiter(
+            initial_limit=int(os.getenv('OPENAI_IMAGE_CONCURRENCY', '4')),
+            max_limit=int(os.getenv('OPENAI_IMAGE_MAX_CONCURRENCY', '16'))
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OPENAI_MAX_RETRIES', '4'))
+        self.base_delay = base_delay if base_delay is not None else 1.0
+        self.max_delay = max_delay if max_delay is not None else 30.0
+        self._counters = {"calls": 0, "successes": 0, "throttled": 0, "retries": 0, "failures": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Délai avant le retry n° attempt (backoff exponentiel, full jitter).
+
+        Args:
+            attempt (int): Numéro du retry (0 pour le premier)
+            retry_after (float, optional): Délai minimum imposé par l'API
+
+        Returns:
+            float: Délai en secondes
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Exécute fn(*args, **kwargs) en respectant la limite et en rejouant les erreurs transitoires.
+
+        Returns:
+            Le résultat de fn
+
+        Raises:
+            Exception: La dernière erreur si les retries sont épuisés ou si elle n'est pas transitoire
+        """
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            self._count('calls')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                status = get_status_code(e)
+                retry_after = get_retry_after(e)
+                # Aucune augmentation sur erreur ; diminution si l'API est surchargée
+                self.limiter.release(throttled=is_overload(e), retry_after=retry_after, failed=True)
+                if status == 429:
+                    self._count('throttled')
+
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+
+                delay = self.backoff_delay(attempt, retry_after)
+                print(f"⏳ OpenAI indisponible ({status or type(e).__name__}), "
+                      f"nouvel essai dans {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                self._count('retries')
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.limiter.release()
+            self._count('successes')
+            return result
+
+    def metrics(self):
+        """
+        Retourne l'état de l'ordonnanceur (limite courante, appels en cours, compteurs).
+
+        Returns:
+            dict: Métriques
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update({
+            "concurrency_limit": self.limiter.current_limit(),
+            "in_flight": self.limiter.in_flight
+        })
+        return counters
+
+
+_image_scheduler = None
+_image_scheduler_lock = threading.Lock()
+
+
+def get_image_scheduler():
+    """
+    Retourne l'ordonnanceur d'images partagé du processus.
+
+    Returns:
+        ImageScheduler: Instance unique, créée au premier appel
+    """
+    global _image_scheduler
+    with _image_scheduler_lock:
+        if _image_scheduler is None:
+            _image_scheduler = ImageScheduler()
+        return _image_scheduler
+
+
+_analysis_scheduler = None
+_analysis_scheduler_lock = threading.Lock()
+
+
+def get_analysis_scheduler():
+    """
+    Retourne l'ordonnanceur des appels d'analyse (chat GPT-4) du processus.
+
+    Il a son propre limiteur (OPENAI_ANALYSIS_CONCURRENCY initial, défaut 2 ;
+    OPENAI_ANALYSIS_MAX_CONCURRENCY max, défaut 8) pour ne pas consommer la
+    concurrence des images.
+
+    Returns:
+        ImageScheduler: Instance unique, créée au premier appel
+    """
+    global _analysis_scheduler
+    with _analysis_scheduler_lock:
+        if _analysis_scheduler is None:
+            _analysis_scheduler = ImageScheduler(limiter=AdaptiveLimiter(
+                initial_limit=int(os.getenv('OPENAI_ANALYSIS_CONCURRENCY', '2')),
+                max_limit=int(os.getenv('OPENAI_ANALYSIS_MAX_CONCURRENCY', '8'))
+            ))
+        return _analysis_scheduler
@@ -0,0 +1,142 @@
+"""
+Schéma unique des données joueur, compilé une fois et partagé par le CLI,
+le serveur HTTP et les lots.
+
+Chaque schéma déclaratif est compilé en une liste de vérifications ; la
+validation d'un enregistrement retourne toutes ses erreurs (et non la
+première), et celle d'un effectif les regroupe par joueur en une passe.
+"""
+
+# Statistiques d'un joueur (les six stats canoniques des cartes)
+STAT_NAMES = ['technique', 'vitesse', 'physique', 'tirs', 'defense', 'passe']
+
+# Âges acceptés
+MIN_AGE, MAX_AGE = 5, 60
+
+# Données joueur en entrée (test_players.json, formulaire /generate, /generate/batch)
+PLAYER_SCHEMA = {
+    'prenom': {'type': str, 'required': True, 'not_blank': "Le prénom ne peut pas être vide"},
+    'age': {'type': int, 'required': True, 'min': MIN_AGE, 'max': MAX_AGE,
+            'message': f"Âge invalide (doit être entre {MIN_AGE} et {MAX_AGE} ans)"},
+    'sport': {'type': str, 'required': True, 'not_blank': "Le sport ne peut pas être vide"},
+    'photo_url': {'type': str},
+    'photo_path': {'type': str},
+    'stats': {'type': dict, 'keys': STAT_NAMES, 'values': {'type': int, 'min': 0, 'max': 100}}
+}
+
+# Données enrichies par les règles, nécessaires au prompt
+PROMPT_SCHEMA = {
+    'prenom': {'type': str, 'required': True, 'not_blank': "Le prénom ne peut pas être vide"},
+    'sport': {'type': str, 'required': True},
+    'age_category': {'type': str, 'required': True},
+    'card_color': {'type': str, 'required': True},
+    'overall_score': {'type': (int, float), 'required': True, 'min': 0, 'max': 100,
+                      'message': "Score global invalide (doit être entre 0 et 100)"}
+}
+
+_TYPE_LABELS = {str: 'texte', int: 'entier', float: 'nombre', dict: 'objet'}
+
+
+def _type_label(expected):
+    """Libellé d'un type attendu (ou de plusieurs)."""
+    if isinstance(expected, tuple):
+        return ' ou '.join(_TYPE_LABELS.get(kind, kind.__name__) for kind in expected)
+    return _TYPE_LABELS.get(expected, expected.__name__)
+
+
+def _is_type(value, expected):
+    """isinstance sans accepter les booléens comme nombres."""
+    return isinstance(value, expected) and not isinstance(value, bool)
+
+
+def _compile_value(label, rule):
+    """
+    Compile les contraintes d'une valeur en une fonction value -> liste d'erreurs.
+
+    Args:
+        label (str): Nom affiché dans les messages
+        rule (dict): type, min, max, not_blank, message, keys, values
+    """
+    expected = rule['type']
+    type_error = f"Type invalide pour {label} (attendu: {_type_label(expected)})"
+    low, high = rule.get('min'), rule.get('max')
+    range_error = rule.get('message') or f"Valeur invalide pour {label} (doit être entre {low} et {high})"
+    blank_error = rule.get('not_blank')
+    keys = rule.get('keys')
+    check_item = _compile_value('{}', rule['values']) if 'values' in rule else None
+    has_range = low is not None or high is not None
+
+    def check(value):
+        if not _is_type(value, expected):
+            return [rule.get('message') or type_error] if has_range else [type_error]
+        errors = []
+        if has_range and ((low is not None and value < low) or (high is not None and value > high)):
+            errors.append(range_error)
+        if blank_error and not value.strip():
+            errors.append(blank_error)
+        if keys is not None:
+            errors.extend(f"Statistique manquante: {key}" for key in keys if key not in value)
+            errors.extend(f"Statistique inconnue: {key}" for key in value if key not in keys)
+        if check_item is not None:
+            for key, item in value.items():
+                errors.extend(error.replace('{}', str(key)) for error in check_item(item))
+        return errors
+
+    return check
+
+
+def compile_schema(schema):
+    """
+    Compile un schéma déclaratif en validateur.
+
+    Args:
+        schema (dict): {champ: {type, required, min, max, not_blank, message, keys, values}}
+
+    Returns:
+        callable: record -> liste de {"field", "error"} (vide si valide)
+    """
+    checks = [(field, bool(rule.get('required')), _compile_value(field, rule))
+              for field, rule in schema.items()]
+
+    def validate(record):
+        if not isinstance(record, dict):
+            return [{"field": None, "error": "Entrée joueur invalide"}]
+        errors = []
+        for field, required, check in checks:
+            if field not in record:
+                if required:
+                    errors.append({"field": field, "error": f"Champ requis manquant: {field}"})
+                continue
+            errors.extend({"field": field, "error": error} for error in check(record[field]))
+        return errors
+
+    return validate
+
+
+validate_player = compile_schema(PLAYER_SCHEMA)
+validate_prompt_fields = compile_schema(PROMPT_SCHEMA)
+
+
+def validate_roster(players, validator=validate_player):
+    """
+    Valide tout un effectif en une passe et regroupe les erreurs par joueur.
+
+    Args:
+        players (list): Enregistrements à valider
+        validator (callable, optional): Validateur compilé (défaut: données joueur)
+
+    Returns:
+        list: Un {"index", "player", "errors"} par enregistrement invalide, dans l'ordre
+    """
+    report = []
+    for index, player in enumerate(players):
+        errors = validator(player)
+        if errors:
+            name = player.get('prenom') if isinstance(player, dict) else None
+            report.append({"index": index, "player": name, "errors": errors})
+    return report
+
+
+def format_errors(errors):
+    """Résume une liste d'erreurs de validation en un message."""
+    return '; '.join(error['error'] for error in errors)
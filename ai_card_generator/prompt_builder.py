@@ -2,6 +2,33 @@
 Module pour construire dynamiquement les prompts GPT-4 + DALL·E selon les règles SquadField.
 """
 
+from player_schema import validate_prompt_fields, format_errors
+
+# Descriptions des couleurs pour un rendu visuel optimal
+COLOR_DESCRIPTIONS = {
+    "gris": "fond gris métallique avec reflets subtils",
+    "bronze": "fond bronze brillant avec texture métallique cuivrée",
+    "jaune": "fond jaune doré éclatant avec éclats lumineux",
+    "vert": "fond vert émeraude vibrant avec reflets cristallins",
+    "violet": "fond violet royal profond avec éclats magiques",
+    "doré": "fond or premium avec textures luxueuses et reflets dorés",
+    "platine": "fond platine ultra-premium avec éclats argentés",
+    "star": "fond constellation étoilée avec effets galaxie et particules dorées"
+}
+
+# Ambiance du fond selon la catégorie d'âge
+CATEGORY_MOODS = {
+    "U8": "ambiance ludique et colorée, formes rondes",
+    "U10": "ambiance ludique et dynamique",
+    "U12": "ambiance dynamique et énergique",
+    "U15": "ambiance énergique avec lignes de vitesse",
+    "U17": "ambiance compétitive avec lignes de vitesse",
+    "U20": "ambiance compétitive et moderne",
+    "Elite": "ambiance stade de haut niveau, projecteurs intenses",
+    "Senior": "ambiance stade expérimentée, lumière chaude",
+    "Master": "ambiance légendaire et prestigieuse, lumière dorée"
+}
+
 def build_dalle_prompt(player_data):
     """
     Construit un prompt DALL·E optimisé pour générer une carte SquadField.
@@ -27,19 +54,7 @@ def build_dalle_prompt(player_data):
     defense = stats.get('defense', 70)
     passe = stats.get('passe', 70)
     
-    # Descriptions des couleurs pour un rendu visuel optimal
-    color_descriptions = {
-        "gris": "fond gris métallique avec reflets subtils",
-        "bronze": "fond bronze brillant avec texture métallique cuivrée",
-        "jaune": "fond jaune doré éclatant avec éclats lumineux",
-        "vert": "fond vert émeraude vibrant avec reflets cristallins",
-        "violet": "fond violet royal profond avec éclats magiques",
-        "doré": "fond or premium avec textures luxueuses et reflets dorés",
-        "platine": "fond platine ultra-premium avec éclats argentés",
-        "star": "fond constellation étoilée avec effets galaxie et particules dorées"
-    }
-    
-    color_desc = color_descriptions.get(card_color, "fond coloré brillant")
+    color_desc = COLOR_DESCRIPTIONS.get(card_color, "fond coloré brillant")
     
     # Construction du prompt principal
     prompt = f"""Génère une carte réaliste SquadField de collection avec {color_desc}.
@@ -80,13 +95,39 @@ CONTRAINTES:
     return prompt
 
 
-def build_gpt4_analysis_prompt(player_data, video_url=None):
+def build_background_prompt(card_color, age_category):
+    """
+    Construit un prompt DALL·E pour un fond de carte (sans joueur ni texte),
+    pré-généré une fois par couleur et catégorie d'âge.
+    
+    Args:
+        card_color (str): Couleur de la carte
+        age_category (str): Catégorie d'âge
+        
+    Returns:
+        str: Prompt formaté pour DALL·E
+    """
+    color_desc = COLOR_DESCRIPTIONS.get(card_color, "fond coloré brillant")
+    mood = CATEGORY_MOODS.get(age_category, "ambiance sportive moderne")
+    
+    return f"""Génère le fond d'une carte SquadField de collection avec {color_desc}, {mood}.
+
+CONTRAINTES:
+- Aucun texte, aucun chiffre, aucun joueur ni silhouette
+- Zone centrale dégagée pour un portrait circulaire
+- Bandeau bas sobre pour 6 cases de statistiques
+- Coins haut gauche et haut droit lisibles pour le prénom et la catégorie
+- Design moderne et premium, finition brillante, format carré"""
+
+
+def build_gpt4_analysis_prompt(player_data, video_url=None, frame_count=None):
     """
     Construit un prompt GPT-4 pour analyser les performances d'un joueur.
     
     Args:
         player_data (dict): Données du joueur
         video_url (str, optional): URL de la vidéo à analyser
+        frame_count (int, optional): Nombre d'images clés de la vidéo jointes au message
         
     Returns:
         str: Prompt d'analyse pour GPT-4
@@ -95,8 +136,10 @@ def build_gpt4_analysis_prompt(player_data, video_url=None):
     age = player_data['age']
     sport = player_data['sport']
     
-    if video_url:
-        prompt = f"""Analyse cette vidéo de {prenom}, {age} ans, pratiquant le {sport}.
+    if video_url or frame_count:
+        source = (f"à partir des {frame_count} images clés jointes (dans l'ordre chronologique)"
+                  if frame_count else "")
+        prompt = f"""Analyse cette vidéo de {prenom}, {age} ans, pratiquant le {sport}{' ' + source if source else ''}.
 
 OBJECTIF: Évaluer ses performances sur une échelle de 0 à 100 dans ces 6 domaines:
 - Technique: Maîtrise gestuelle, précision technique
@@ -160,19 +203,11 @@ def validate_prompt_data(player_data):
         player_data (dict): Données du joueur à valider
         
     Returns:
-        tuple: (bool, str) - (is_valid, error_message)
+        tuple: (bool, str) - (is_valid, error_message regroupant toutes les erreurs)
     """
-    required_for_prompt = ['prenom', 'age_category', 'overall_score', 'card_color', 'sport']
-    
-    for field in required_for_prompt:
-        if field not in player_data:
-            return False, f"Données manquantes pour le prompt: {field}"
-    
-    if not player_data['prenom'].strip():
-        return False, "Le prénom ne peut pas être vide"
-    
-    if player_data['overall_score'] < 0 or player_data['overall_score'] > 100:
-        return False, "Score global invalide (doit être entre 0 et 100)"
+    errors = validate_prompt_fields(player_data)
+    if errors:
+        return False, format_errors(errors)
     
     return True, "Données valides pour le prompt"
 
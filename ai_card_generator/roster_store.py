@@ -0,0 +1,298 @@
+"""
+Effectif indexé en mémoire, chargé une seule fois depuis le fichier roster.
+
+Remplace les relectures de test_players.json suivies d'un parcours linéaire :
+le fichier est parsé au premier accès, puis un index des prénoms (casefold)
+et des index secondaires par sport, catégorie d'âge et couleur de carte
+répondent en O(1). Les ajouts, mises à jour et suppressions modifient les
+index en place, sans reparser le fichier.
+"""
+
+import os
+import json
+import threading
+
+from rules import get_age_category, get_card_color, calculate_overall_score
+
+
+def _name_key(name):
+    """Clé d'index d'un prénom (insensible à la casse et aux espaces de bord)."""
+    return name.strip().casefold()
+
+
+class RosterStore:
+    """
+    Effectif indexé par prénom, sport, catégorie d'âge et couleur de carte.
+    """
+
+    def __init__(self, roster_path=None):
+        """
+        Args:
+            roster_path (str, optional): Fichier JSON de l'effectif (défaut: ROSTER_PATH ou test_players.json)
+        """
+        self.roster_path = roster_path or os.getenv('ROSTER_PATH', 'test_players.json')
+        self._players = {}
+        self._next_id = 0
+        self._by_name = {}
+        self._by_sport = {}
+        self._by_category = {}
+        self._by_color = {}
+        self._signature = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _file_signature(self):
+        """(mtime, taille) du fichier roster, None s'il n'existe pas."""
+        try:
+            stat = os.stat(self.roster_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def load(self, force=False):
+        """
+        Charge le fichier roster et construit les index (une seule fois, ou si
+        le fichier a été modifié par un autre processus).
+
+        Args:
+            force (bool): Reparser même si le fichier n'a pas changé
+
+        Returns:
+            bool: True si l'effectif est disponible
+        """
+        with self._lock:
+            signature = self._file_signature()
+            if self._loaded and not force and signature == self._signature:
+                return True
+
+            try:
+                with open(self.roster_path, 'r', encoding='utf-8') as f:
+                    players = json.load(f)
+            except FileNotFoundError:
+                print(f"❌ Fichier {self.roster_path} introuvable")
+                return False
+            except json.JSONDecodeError:
+                print(f"❌ Erreur de format JSON dans {self.roster_path}")
+                return False
+
+            if not isinstance(players, list):
+                print(f"❌ {self.roster_path} doit contenir une liste de joueurs")
+                return False
+
+            self._players = {}
+            self._next_id = 0
+            self._by_name, self._by_sport, self._by_category, self._by_color = {}, {}, {}, {}
+            for player in players:
+                self._insert(player)
+
+            self._signature = signature
+            self._loaded = True
+            print(f"📇 Effectif indexé: {len(self._players)} joueur(s) depuis {self.roster_path}")
+            return True
+
+    def _ensure_loaded(self):
+        """Charge l'effectif au premier accès."""
+        if not self._loaded:
+            self.load()
+
+    @staticmethod
+    def _attributes(player):
+        """Valeurs indexées d'un joueur: (prénom, sport, catégorie, couleur), None si non calculable."""
+        if not isinstance(player, dict):
+            return None, None, None, None
+
+        name = player.get('prenom')
+        name = _name_key(name) if isinstance(name, str) and name.strip() else None
+        sport = player.get('sport')
+        sport = sport.casefold() if isinstance(sport, str) else None
+
+        category = color = None
+        if isinstance(player.get('age'), int):
+            category = get_age_category(player['age'])
+        stats = player.get('stats', {})
+        if isinstance(stats, dict) and all(isinstance(value, (int, float)) for value in stats.values()):
+            color = get_card_color(calculate_overall_score(stats))
+        return name, sport, category, color
+
+    def _index(self, player_id, player, add):
+        """Ajoute (add=True) ou retire un joueur des index (sous verrou)."""
+        name, sport, category, color = self._attributes(player)
+        for index, key in ((self._by_name, name), (self._by_sport, sport),
+                           (self._by_category, category), (self._by_color, color)):
+            if key is None:
+                continue
+            if add:
+                index.setdefault(key, {})[player_id] = True
+            else:
+                ids = index.get(key, {})
+                ids.pop(player_id, None)
+                if not ids:
+                    index.pop(key, None)
+
+    def _insert(self, player):
+        """Ajoute un joueur en fin d'effectif (sous verrou)."""
+        player_id = self._next_id
+        self._next_id += 1
+        self._players[player_id] = player
+        self._index(player_id, player, add=True)
+        return player_id
+
+    def get(self, name):
+        """
+        Retourne un joueur par prénom (insensible à la casse), en O(1).
+
+        Args:
+            name (str): Prénom du joueur
+
+        Returns:
+            dict: Données du joueur (le premier en cas d'homonymes), None si introuvable
+        """
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._by_name.get(_name_key(name))
+            if not ids:
+                return None
+            return self._players[next(iter(ids))]
+
+    def find(self, name):
+        """Retourne tous les joueurs portant ce prénom (homonymes), dans l'ordre de l'effectif."""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._players[player_id] for player_id in sorted(self._by_name.get(_name_key(name), {}))]
+
+    def query(self, sport=None, age_category=None, card_color=None):
+        """
+        Filtre l'effectif par sport, catégorie d'âge et/ou couleur de carte.
+
+        Args:
+            sport (str, optional): Sport (insensible à la casse)
+            age_category (str, optional): Catégorie d'âge (U8 ... Master)
+            card_color (str, optional): Couleur de carte (gris ... star)
+
+        Returns:
+            list: Joueurs correspondants, dans l'ordre de l'effectif
+        """
+        with self._lock:
+            self._ensure_loaded()
+            selections = []
+            if sport is not None:
+                selections.append(self._by_sport.get(sport.casefold(), {}))
+            if age_category is not None:
+                selections.append(self._by_category.get(age_category, {}))
+            if card_color is not None:
+                selections.append(self._by_color.get(card_color, {}))
+
+            if not selections:
+                return self.all()
+
+            # Intersection en partant de l'index le plus sélectif
+            selections.sort(key=len)
+            ids = [player_id for player_id in selections[0]
+                   if all(player_id in other for other in selections[1:])]
+            return [self._players[player_id] for player_id in sorted(ids)]
+
+    def all(self):
+        """Retourne tout l'effectif, dans l'ordre du fichier (entrées invalides comprises)."""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._players[player_id] for player_id in sorted(self._players)]
+
+    def names(self):
+        """Retourne les prénoms de l'effectif."""
+        return [player['prenom'] for player in self.all()
+                if isinstance(player, dict) and 'prenom' in player]
+
+    def upsert(self, player):
+        """
+        Ajoute un joueur ou remplace celui qui porte le même prénom, index mis à jour en place.
+
+        Args:
+            player (dict): Données du joueur (avec prenom)
+
+        Returns:
+            bool: True si le joueur existait déjà (mise à jour)
+        """
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._by_name.get(_name_key(player['prenom']))
+            if not ids:
+                self._insert(player)
+                return False
+
+            player_id = next(iter(ids))
+            self._index(player_id, self._players[player_id], add=False)
+            self._players[player_id] = player
+            self._index(player_id, player, add=True)
+            return True
+
+    def remove(self, name):
+        """
+        Retire un joueur de l'effectif et des index.
+
+        Args:
+            name (str): Prénom du joueur
+
+        Returns:
+            bool: True si un joueur a été retiré
+        """
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._by_name.get(_name_key(name))
+            if not ids:
+                return False
+            player_id = next(iter(ids))
+            self._index(player_id, self._players.pop(player_id), add=False)
+            return True
+
+    def save(self):
+        """
+        Réécrit le fichier roster de façon atomique avec l'effectif courant.
+
+        Returns:
+            bool: True si l'écriture réussit
+        """
+        with self._lock:
+            try:
+                tmp_path = f"{self.roster_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.all(), f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.roster_path)
+                # Le fichier reflète déjà l'effectif en mémoire: pas de reparse
+                self._signature = self._file_signature()
+                return True
+            except OSError as e:
+                print(f"❌ Erreur d'écriture de l'effectif: {e}")
+                return False
+
+    def stats(self):
+        """Retourne la taille de l'effectif et de ses index."""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "players": len(self._players),
+                "names": len(self._by_name),
+                "sports": {sport: len(ids) for sport, ids in self._by_sport.items()},
+                "age_categories": {category: len(ids) for category, ids in self._by_category.items()},
+                "card_colors": {color: len(ids) for color, ids in self._by_color.items()}
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_roster_store(roster_path=None):
+    """
+    Retourne l'effectif indexé partagé pour un fichier roster.
+
+    Args:
+        roster_path (str, optional): Fichier roster (défaut: ROSTER_PATH ou test_players.json)
+
+    Returns:
+        RosterStore: Instance unique par fichier, chargée au premier accès
+    """
+    roster_path = roster_path or os.getenv('ROSTER_PATH', 'test_players.json')
+    with _stores_lock:
+        if roster_path not in _stores:
+            _stores[roster_path] = RosterStore(roster_path)
+        return _stores[roster_path]
@@ -1,36 +1,164 @@
 """
 Module des règles SquadField pour déterminer les catégories d'âge et couleurs de carte.
+
+Les seuils viennent des tables versionnées de rules_table.py (ou du JSON
+RULES_TABLE_PATH) ; chaque version est compilée en tableaux de correspondance
+indexés par âge (5-60) et par score (0-100), si bien qu'une catégorie ou une
+couleur se lit en un seul accès.
 """
 
-def get_age_category(age):
+import os
+import json
+import threading
+from bisect import bisect_left, bisect_right
+
+from rules_table import RULES_TABLES, CURRENT_RULES_VERSION
+from player_schema import STAT_NAMES, MIN_AGE, MAX_AGE, validate_player, format_errors
+
+# NumPy est optionnel: sans lui, le calcul en masse passe par les fonctions scalaires
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Catégories d'âge possibles, de la plus jeune à la plus âgée
+AGE_CATEGORIES = ["U8", "U10", "U12", "U15", "U17", "U20", "Elite", "Senior", "Master"]
+
+# Couleurs de carte, de la plus basse à la plus haute
+CARD_COLORS = ["gris", "bronze", "jaune", "vert", "violet", "doré", "platine", "star"]
+
+DEFAULT_OVERALL_SCORE = 60
+
+# Domaine des tableaux de correspondance par score (par âge: MIN_AGE..MAX_AGE)
+MAX_SCORE = 100
+
+
+class CompiledRules:
+    """
+    Une version des règles, compilée en tableaux de correspondance.
+    """
+
+    def __init__(self, table):
+        """
+        Args:
+            table (dict): Table de seuils (version, age_categories, card_colors)
+
+        Raises:
+            ValueError: Si la table est incohérente
+        """
+        self.version = table['version']
+        age_rows = table['age_categories']
+        color_rows = table['card_colors']
+
+        self.age_categories = [name for name, _ in age_rows]
+        self.age_upper_bounds = [bound for _, bound in age_rows[:-1]]
+        self.card_colors = [name for name, _ in color_rows]
+        self.color_lower_bounds = [bound for _, bound in color_rows[1:]]
+
+        if age_rows[-1][1] is not None or None in self.age_upper_bounds:
+            raise ValueError(f"Règles {self.version}: seule la dernière catégorie est sans limite d'âge")
+        if self.age_upper_bounds != sorted(set(self.age_upper_bounds)):
+            raise ValueError(f"Règles {self.version}: âges maximaux non strictement croissants")
+        if color_rows[0][1] != 0 or self.color_lower_bounds != sorted(set(self.color_lower_bounds)):
+            raise ValueError(f"Règles {self.version}: scores minimaux non strictement croissants depuis 0")
+
+        # Index de catégorie par âge (MIN_AGE..MAX_AGE) et de couleur par score (0..MAX_SCORE)
+        self.age_index = [bisect_left(self.age_upper_bounds, age) for age in range(MIN_AGE, MAX_AGE + 1)]
+        self.color_index = [bisect_right(self.color_lower_bounds, score) for score in range(MAX_SCORE + 1)]
+
+    def age_category(self, age):
+        """Catégorie d'âge (accès direct au tableau dans le domaine 5-60)."""
+        if isinstance(age, int) and MIN_AGE <= age <= MAX_AGE:
+            return self.age_categories[self.age_index[age - MIN_AGE]]
+        return self.age_categories[bisect_left(self.age_upper_bounds, age)]
+
+    def card_color(self, score):
+        """Couleur de carte (accès direct au tableau dans le domaine 0-100)."""
+        if isinstance(score, int) and 0 <= score <= MAX_SCORE:
+            return self.card_colors[self.color_index[score]]
+        return self.card_colors[bisect_right(self.color_lower_bounds, score)]
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def _load_rules():
+    """Compile les tables intégrées puis celles du JSON RULES_TABLE_PATH (prioritaires)."""
+    tables = {table['version']: table for table in RULES_TABLES}
+    current = CURRENT_RULES_VERSION
+
+    override_path = os.getenv('RULES_TABLE_PATH')
+    if override_path:
+        with open(override_path, 'r', encoding='utf-8') as f:
+            override = json.load(f)
+        for table in override.get('versions', []):
+            tables[table['version']] = table
+        current = override.get('current', current)
+
+    current = os.getenv('RULES_VERSION', current)
+    compiled = {version: CompiledRules(table) for version, table in tables.items()}
+    if current not in compiled:
+        raise ValueError(f"Version de règles inconnue: {current}")
+    return compiled, current
+
+
+def get_rules(rules_version=None):
+    """
+    Retourne une version compilée des règles.
+
+    Args:
+        rules_version (str, optional): Version voulue (défaut: version en vigueur)
+
+    Returns:
+        CompiledRules: Règles compilées
+
+    Raises:
+        ValueError: Si la version est inconnue
+    """
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = _load_rules()
+    compiled, current = _rules
+
+    rules = compiled.get(rules_version or current)
+    if rules is None:
+        raise ValueError(f"Version de règles inconnue: {rules_version}")
+    return rules
+
+
+def rules_versions():
+    """
+    Liste les versions de règles disponibles.
+
+    Returns:
+        tuple: (versions triées, version en vigueur)
+    """
+    get_rules()
+    compiled, current = _rules
+    return sorted(compiled), current
+
+
+def reset_rules():
+    """Oublie les règles compilées (rechargées au prochain accès, ex: après changement du JSON)."""
+    global _rules
+    with _rules_lock:
+        _rules = None
+
+
+def get_age_category(age, rules_version=None):
     """
     Détermine la catégorie d'âge selon les règles SquadField.
     
     Args:
         age (int): Âge du joueur
+        rules_version (str, optional): Version des règles (défaut: version en vigueur)
         
     Returns:
         str: Catégorie d'âge correspondante
     """
-    if age < 20:
-        if age <= 8:
-            return "U8"
-        elif age <= 10:
-            return "U10"
-        elif age <= 12:
-            return "U12"
-        elif age <= 15:
-            return "U15"
-        elif age <= 17:
-            return "U17"
-        else:
-            return "U20"
-    elif 20 <= age <= 29:
-        return "Elite"
-    elif 30 <= age <= 39:
-        return "Senior"
-    else:  # 40+
-        return "Master"
+    return get_rules(rules_version).age_category(age)
 
 
 def calculate_overall_score(stats):
@@ -44,98 +172,177 @@ def calculate_overall_score(stats):
         int: Score global calculé (moyenne des stats)
     """
     if not stats:
-        return 60  # Score par défaut
+        return DEFAULT_OVERALL_SCORE
     
     total = sum(stats.values())
     return round(total / len(stats))
 
 
-def get_card_color(score):
+def get_card_color(score, rules_version=None):
     """
     Détermine la couleur de carte selon le score global.
     
     Args:
         score (int): Score global du joueur (60-100)
+        rules_version (str, optional): Version des règles (défaut: version en vigueur)
         
     Returns:
         str: Couleur de carte correspondante
     """
-    if score < 65:
-        return "gris"
-    elif score < 75:
-        return "bronze"
-    elif score < 80:
-        return "jaune"
-    elif score < 85:
-        return "vert"
-    elif score < 90:
-        return "violet"
-    elif score < 95:
-        return "doré"
-    elif score < 99:
-        return "platine"
-    else:  # 99-100
-        return "star"
-
-
-def apply_squadfield_rules(player_data):
+    return get_rules(rules_version).card_color(score)
+
+
+def apply_squadfield_rules(player_data, rules_version=None):
     """
     Applique toutes les règles SquadField à un joueur.
     
     Args:
         player_data (dict): Données du joueur
+        rules_version (str, optional): Version des règles (défaut: version en vigueur)
         
     Returns:
-        dict: Données enrichies avec catégorie et couleur
+        dict: Données enrichies avec catégorie, couleur et version des règles
     """
+    rules = get_rules(rules_version)
+    
     # Calcul du score global
     overall_score = calculate_overall_score(player_data.get('stats', {}))
     
     # Détermination de la catégorie d'âge
-    age_category = get_age_category(player_data['age'])
+    age_category = rules.age_category(player_data['age'])
     
     # Détermination de la couleur de carte
-    card_color = get_card_color(overall_score)
+    card_color = rules.card_color(overall_score)
     
     # Enrichissement des données
     enriched_data = player_data.copy()
     enriched_data.update({
         'overall_score': overall_score,
         'age_category': age_category,
-        'card_color': card_color
+        'card_color': card_color,
+        'rules_version': rules.version
     })
     
     return enriched_data
 
 
+def score_roster(ages, stats, rules_version=None):
+    """
+    Calcule en une passe vectorisée les scores, catégories et couleurs d'un
+    effectif en colonnes (résultats identiques aux fonctions scalaires).
+
+    Args:
+        ages (array-like): Âges des joueurs, shape (n,)
+        stats (array-like): Statistiques, shape (n, k) (colonnes dans l'ordre de STAT_NAMES)
+        rules_version (str, optional): Version des règles (défaut: version en vigueur),
+            pour rescorer un historique avec les règles de l'époque
+
+    Returns:
+        tuple: (overall_scores, age_categories, card_colors) en tableaux NumPy
+
+    Raises:
+        RuntimeError: Si NumPy n'est pas installé
+    """
+    if np is None:
+        raise RuntimeError("NumPy est requis pour score_roster")
+
+    ages = np.asarray(ages)
+    if len(ages) == 0:
+        # Effectif vide: reshape(0, -1) est ambigu
+        return np.array([], dtype=int), np.array([], dtype=str), np.array([], dtype=str)
+    stats = np.asarray(stats, dtype=float).reshape(len(ages), -1)
+    counts = np.full(len(ages), stats.shape[1])
+    return _score_columns(ages, stats.sum(axis=1), counts, get_rules(rules_version))
+
+
+def roster_to_columns(players):
+    """
+    Convertit un effectif (liste de joueurs) en colonnes pour score_roster.
+
+    Args:
+        players (list): Données des joueurs avec les six stats de STAT_NAMES
+
+    Returns:
+        tuple: (ages shape (n,), stats shape (n, 6))
+    """
+    if np is None:
+        raise RuntimeError("NumPy est requis pour roster_to_columns")
+
+    ages = np.fromiter((player['age'] for player in players), dtype=int, count=len(players))
+    stats = np.array([[player['stats'][name] for name in STAT_NAMES] for player in players],
+                     dtype=float).reshape(len(players), len(STAT_NAMES))
+    return ages, stats
+
+
+def _score_columns(ages, totals, counts, rules):
+    """Scores, catégories et couleurs à partir des âges, sommes et nombres de stats."""
+    # round() de Python et np.rint arrondissent tous deux au pair le plus proche
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(counts > 0, np.rint(totals / np.maximum(counts, 1)), DEFAULT_OVERALL_SCORE)
+    scores = scores.astype(int)
+
+    # Accès direct aux tableaux compilés dans leur domaine, recherche dichotomique en dehors
+    categories = np.searchsorted(rules.age_upper_bounds, ages, side='left')
+    if np.issubdtype(ages.dtype, np.integer):
+        in_range = (ages >= MIN_AGE) & (ages <= MAX_AGE)
+        lookup = np.asarray(rules.age_index)[np.clip(ages, MIN_AGE, MAX_AGE) - MIN_AGE]
+        categories = np.where(in_range, lookup, categories)
+
+    in_range = (scores >= 0) & (scores <= MAX_SCORE)
+    colors = np.where(in_range, np.asarray(rules.color_index)[np.clip(scores, 0, MAX_SCORE)],
+                      np.searchsorted(rules.color_lower_bounds, scores, side='right'))
+    return scores, np.array(rules.age_categories)[categories], np.array(rules.card_colors)[colors]
+
+
+def apply_squadfield_rules_bulk(players, rules_version=None):
+    """
+    Applique les règles SquadField à tout un effectif en un seul calcul vectorisé.
+
+    Sans NumPy, retombe sur apply_squadfield_rules joueur par joueur.
+
+    Args:
+        players (list): Données des joueurs (avec age et stats)
+        rules_version (str, optional): Version des règles (défaut: version en vigueur)
+
+    Returns:
+        list: Données enrichies, dans l'ordre de l'effectif
+    """
+    if np is None or not players:
+        return [apply_squadfield_rules(player, rules_version) for player in players]
+
+    rules = get_rules(rules_version)
+    ages = np.fromiter((player['age'] for player in players), dtype=int, count=len(players))
+    stats = [player.get('stats') or {} for player in players]
+    totals = np.fromiter((sum(values.values()) for values in stats), dtype=float, count=len(players))
+    counts = np.fromiter((len(values) for values in stats), dtype=int, count=len(players))
+    scores, categories, colors = _score_columns(ages, totals, counts, rules)
+
+    enriched = []
+    for player, overall_score, age_category, card_color in zip(
+            players, scores.tolist(), categories.tolist(), colors.tolist()):
+        enriched_data = player.copy()
+        enriched_data.update({
+            'overall_score': overall_score,
+            'age_category': age_category,
+            'card_color': card_color,
+            'rules_version': rules.version
+        })
+        enriched.append(enriched_data)
+    return enriched
+
+
 def validate_player_data(player_data):
     """
-    Valide les données d'un joueur.
+    Valide les données d'un joueur (schéma partagé de player_schema).
     
     Args:
         player_data (dict): Données du joueur à valider
         
     Returns:
-        tuple: (bool, str) - (is_valid, error_message)
+        tuple: (bool, str) - (is_valid, error_message regroupant toutes les erreurs)
     """
-    required_fields = ['prenom', 'age', 'photo_url', 'sport']
-    
-    for field in required_fields:
-        if field not in player_data:
-            return False, f"Champ requis manquant: {field}"
-    
-    if not isinstance(player_data['age'], int) or player_data['age'] < 5 or player_data['age'] > 60:
-        return False, "Âge invalide (doit être entre 5 et 60 ans)"
-    
-    if 'stats' in player_data:
-        stats = player_data['stats']
-        required_stats = ['technique', 'vitesse', 'physique', 'tirs', 'defense', 'passe']
-        
-        for stat in required_stats:
-            if stat not in stats:
-                return False, f"Statistique manquante: {stat}"
-            
-            if not isinstance(stats[stat], int) or stats[stat] < 0 or stats[stat] > 100:
-                return False, f"Valeur invalide pour {stat} (doit être entre 0 et 100)"
+    errors = validate_player(player_data)
+    if errors:
+        return False, format_errors(errors)
     
     return True, "Données valides"
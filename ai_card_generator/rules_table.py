@@ -0,0 +1,29 @@
+"""
+Tables versionnées des seuils SquadField (catégories d'âge et couleurs de carte).
+
+Chaque version est conservée : une carte générée hier s'explique avec les
+règles en vigueur à ce moment-là, et un effectif peut être rescoré avec
+n'importe quelle version. Les nouvelles versions s'ajoutent ici, ou sans
+déploiement via un fichier JSON (RULES_TABLE_PATH) au même format :
+
+    {"current": "2025.2", "versions": [{"version": "2025.2", "age_categories": [...], ...}]}
+"""
+
+# Version appliquée par défaut (surchargée par RULES_VERSION ou le JSON)
+CURRENT_RULES_VERSION = "2025.1"
+
+RULES_TABLES = [
+    {
+        "version": "2025.1",
+        # (catégorie, âge maximal inclus) ; la dernière catégorie n'a pas de limite
+        "age_categories": [
+            ["U8", 8], ["U10", 10], ["U12", 12], ["U15", 15], ["U17", 17],
+            ["U20", 19], ["Elite", 29], ["Senior", 39], ["Master", None]
+        ],
+        # (couleur, score minimal inclus) ; la première couleur part de 0
+        "card_colors": [
+            ["gris", 0], ["bronze", 65], ["jaune", 75], ["vert", 80],
+            ["violet", 85], ["doré", 90], ["platine", 95], ["star", 99]
+        ]
+    }
+]
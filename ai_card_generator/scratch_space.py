@@ -0,0 +1,282 @@
+"""
+Espace de travail pour les fichiers uploadés (photos et vidéos des joueurs).
+
+Le corps multipart est écrit directement dans un fichier au nom unique, sans
+passer par le tampon de Werkzeug puis une copie, et haché (SHA-256) pendant
+l'écriture. Des quotas limitent la taille par requête et l'occupation totale.
+Chaque processus écrit dans son propre dossier ; au démarrage, les dossiers des
+processus arrêtés (crash compris) sont nettoyés, sauf les fichiers encore
+référencés par des jobs à reprendre.
+"""
+
+import os
+import uuid
+import atexit
+import shutil
+import hashlib
+import tempfile
+import threading
+from flask import Request
+from werkzeug.utils import secure_filename
+
+
+class ScratchQuotaError(Exception):
+    """Levée quand un upload dépasse le quota par requête (413) ou global (507)."""
+
+    def __init__(self, message, status=413):
+        super().__init__(message)
+        self.status = status
+
+
+def default_scratch_root():
+    """
+    Dossier racine de l'espace de travail: SCRATCH_DIR, sinon /dev/shm (tmpfs)
+    si SCRATCH_TMPFS=1, sinon le dossier temporaire du système.
+    """
+    if os.getenv('SCRATCH_DIR'):
+        return os.getenv('SCRATCH_DIR')
+    if os.getenv('SCRATCH_TMPFS', '').lower() in ('1', 'true', 'yes') and os.path.isdir('/dev/shm'):
+        return '/dev/shm/squadfield-scratch'
+    return os.path.join(tempfile.gettempdir(), 'squadfield-scratch')
+
+
+def _pid_alive(pid):
+    """True si un processus de ce pid existe encore."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ScratchFile:
+    """
+    Fichier de travail en écriture: compte les octets, applique les quotas et
+    calcule le SHA-256 au fil de l'eau. Les autres méthodes (read, seek, ...)
+    sont celles du fichier sous-jacent.
+    """
+
+    def __init__(self, space, path, budget=None):
+        self.space = space
+        self.path = path
+        self.size = 0
+        self.kept = False
+        self._budget = budget
+        self._hash = hashlib.sha256()
+        self._file = open(path, 'w+b')
+
+    def write(self, data):
+        """Écrit un bloc après vérification des quotas, et l'ajoute au hash."""
+        size = len(data)
+        if self._budget is not None and self._budget['used'] + size > self.space.max_request_bytes:
+            raise ScratchQuotaError(
+                f"Upload trop volumineux (max {self.space.max_request_bytes // (1024 * 1024)} MB par requête)"
+            )
+        self.space.reserve(size)
+        if self._budget is not None:
+            self._budget['used'] += size
+        self.size += size
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        """SHA-256 du contenu écrit."""
+        return self._hash.hexdigest()
+
+    def keep(self):
+        """
+        Termine l'écriture et garde le fichier au-delà de la requête (transmis à un job).
+
+        Returns:
+            tuple: (chemin, sha256)
+        """
+        self._file.close()
+        self.kept = True
+        return self.path, self.hexdigest()
+
+    def discard(self):
+        """Ferme et supprime le fichier (sauf s'il a été gardé)."""
+        if not self._file.closed:
+            self._file.close()
+        if not self.kept:
+            self.space.discard(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class ScratchSpace:
+    """
+    Espace de travail avec quotas: {root}/{pid}/{uuid}{extension}.
+    """
+
+    def __init__(self, root=None, max_request_bytes=None, max_total_bytes=None):
+        """
+        Args:
+            root (str, optional): Dossier racine (défaut: default_scratch_root())
+            max_request_bytes (int, optional): Octets max par requête (défaut: SCRATCH_MAX_REQUEST_BYTES ou 50 MB)
+            max_total_bytes (int, optional): Occupation max (défaut: SCRATCH_MAX_TOTAL_BYTES ou 1 GB)
+        """
+        self.root = os.path.abspath(root or default_scratch_root())
+        self.max_request_bytes = max_request_bytes or \
+            int(os.getenv('SCRATCH_MAX_REQUEST_BYTES', str(50 * 1024 * 1024)))
+        self.max_total_bytes = max_total_bytes or \
+            int(os.getenv('SCRATCH_MAX_TOTAL_BYTES', str(1024 * 1024 * 1024)))
+        self.process_dir = os.path.join(self.root, str(os.getpid()))
+        self._files = {}
+        self._adopted = {}
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        """
+        Réserve de la place dans le quota global.
+
+        Raises:
+            ScratchQuotaError: Si l'espace de travail est plein
+        """
+        with self._lock:
+            if self._used + size > self.max_total_bytes:
+                raise ScratchQuotaError("Espace de travail plein, réessayer plus tard", status=507)
+            self._used += size
+
+    def create(self, filename=None, budget=None):
+        """
+        Crée un fichier de travail au nom unique.
+
+        Args:
+            filename (str, optional): Nom d'origine (seule l'extension est conservée)
+            budget (dict, optional): Compteur {'used': octets} partagé par les fichiers d'une requête
+
+        Returns:
+            ScratchFile: Fichier ouvert en écriture
+        """
+        os.makedirs(self.process_dir, exist_ok=True)
+        extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+        path = os.path.join(self.process_dir, f"{uuid.uuid4().hex}{extension}")
+        scratch_file = ScratchFile(self, path, budget)
+        with self._lock:
+            self._files[path] = scratch_file
+        return scratch_file
+
+    def owns(self, path):
+        """True si le chemin est dans l'espace de travail."""
+        root = os.path.abspath(self.root) + os.sep
+        return bool(path) and os.path.abspath(path).startswith(root)
+
+    def discard(self, path):
+        """
+        Supprime un fichier de l'espace de travail et libère son quota.
+
+        Returns:
+            bool: True si le chemin appartient à l'espace de travail
+        """
+        if not self.owns(path):
+            return False
+
+        with self._lock:
+            scratch_file = self._files.pop(path, None)
+            self._used -= scratch_file.size if scratch_file is not None else self._adopted.pop(path, 0)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def cleanup_stale(self, keep=()):
+        """
+        Supprime les dossiers des processus arrêtés (fichiers laissés par un crash).
+
+        Args:
+            keep (iterable): Chemins à conserver (fichiers des jobs à reprendre)
+
+        Returns:
+            int: Nombre de fichiers supprimés
+        """
+        keep = {os.path.abspath(path) for path in keep if path}
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if not name.isdigit() or int(name) == os.getpid() or _pid_alive(int(name)):
+                continue
+
+            kept = 0
+            for filename in os.listdir(directory):
+                path = os.path.abspath(os.path.join(directory, filename))
+                if path in keep:
+                    kept += 1
+                    size = os.path.getsize(path)
+                    with self._lock:
+                        self._adopted[path] = size
+                        self._used += size
+                    continue
+                os.unlink(path)
+                removed += 1
+            if not kept:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        if removed:
+            print(f"🧹 Espace de travail: {removed} fichier(s) orphelin(s) supprimé(s)")
+        return removed
+
+    def close(self):
+        """Supprime les fichiers du processus qui n'ont pas été transmis à un job."""
+        with self._lock:
+            pending = [scratch_file for scratch_file in self._files.values() if not scratch_file.kept]
+        for scratch_file in pending:
+            scratch_file.discard()
+
+    def stats(self):
+        """Retourne l'occupation de l'espace de travail."""
+        with self._lock:
+            return {
+                "root": self.root,
+                "files": len(self._files) + len(self._adopted),
+                "used_bytes": self._used,
+                "max_total_bytes": self.max_total_bytes,
+                "max_request_bytes": self.max_request_bytes
+            }
+
+
+class ScratchRequest(Request):
+    """
+    Requête Flask dont les fichiers uploadés sont écrits directement dans
+    l'espace de travail (request.scratch_files).
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not hasattr(self, 'scratch_files'):
+            self.scratch_files = []
+            self.scratch_budget = {'used': 0}
+        scratch_file = get_scratch_space().create(filename, budget=self.scratch_budget)
+        self.scratch_files.append(scratch_file)
+        return scratch_file
+
+    def discard_scratch_files(self):
+        """Supprime les fichiers de la requête non transmis à un job (fin de requête)."""
+        for scratch_file in getattr(self, 'scratch_files', []):
+            scratch_file.discard()
+
+
+_scratch_space = None
+_scratch_space_lock = threading.Lock()
+
+
+def get_scratch_space():
+    """
+    Retourne l'espace de travail partagé du processus.
+
+    Returns:
+        ScratchSpace: Instance unique, nettoyée à l'arrêt du processus
+    """
+    global _scratch_space
+    with _scratch_space_lock:
+        if _scratch_space is None:
+            _scratch_space = ScratchSpace()
+            atexit.register(_scratch_space.close)
+        return _scratch_space
@@ -0,0 +1,84 @@
+"""
+Coalescence des appels identiques simultanés (singleflight).
+
+Quand plusieurs workers demandent la même carte en même temps (double clic,
+retry du frontend), seul le premier exécute la génération ; les autres
+attendent et partagent son résultat.
+"""
+
+import threading
+
+
+class InterruptedCallError(RuntimeError):
+    """Levée chez les suiveurs quand l'appel partagé a été interrompu sans résultat."""
+
+
+class _Call:
+    """Appel en cours pour une clé donnée."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Groupe d'appels coalescés par clé, à l'intérieur d'un processus.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Exécute fn une seule fois pour tous les appelants simultanés d'une même clé.
+
+        Args:
+            key (str): Clé de coalescence (hash du prompt)
+            fn (callable): Fonction sans argument à exécuter
+
+        Returns:
+            tuple: (résultat, shared) - shared est True si le résultat
+                   provient de l'appel d'un autre thread
+
+        Raises:
+            Exception: L'exception levée par fn, propagée à tous les appelants
+            InterruptedCallError: Chez les suiveurs, si l'appel partagé a été interrompu
+                (KeyboardInterrupt, SystemExit, ...) : ils ne reçoivent jamais un faux résultat
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call:
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if isinstance(call.error, Exception):
+                raise call.error
+            if call.error is not None:
+                raise InterruptedCallError(f"Appel partagé interrompu: {call.error!r}") from call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    def in_flight(self):
+        """Retourne le nombre de clés en cours d'exécution."""
+        with self._lock:
+            return len(self._calls)
@@ -4,6 +4,9 @@ Script de test pour vérifier le système de génération de cartes IA.
 
 import sys
 import os
+import time
+import traceback
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # Chargement des variables d'environnement
@@ -55,6 +58,154 @@ def test_player_rules():
         print(f"❌ Erreur de test des règles: {e}")
         return False
 
+def test_bulk_scoring():
+    """Test le calcul vectorisé des règles sur un effectif (identique au calcul scalaire)."""
+    import random
+    import rules
+    from rules import (apply_squadfield_rules, apply_squadfield_rules_bulk, score_roster,
+                       roster_to_columns, STAT_NAMES)
+    
+    rng = random.Random(16)
+    players = [
+        {"prenom": f"Joueur{i}", "age": rng.randint(5, 60), "sport": "football",
+         "stats": {name: rng.randint(0, 100) for name in STAT_NAMES}}
+        for i in range(2000)
+    ]
+    # Cas limites: bornes de catégories et de couleurs, stats absentes, arrondi au pair
+    players.append({"prenom": "SansStats", "age": 19, "stats": {}})
+    players.append({"prenom": "Demi", "age": 20, "stats": {"technique": 64, "vitesse": 65}})
+    players.extend({"prenom": f"Borne{age}", "age": age, "stats": {name: age + 50 for name in STAT_NAMES}}
+                   for age in (8, 9, 15, 17, 19, 29, 30, 39, 40))
+    
+    expected = [apply_squadfield_rules(player) for player in players]
+    if rules.np is None:
+        print("⚠️ NumPy absent: calcul en masse scalaire")
+    else:
+        ages, stats = roster_to_columns(players[:2000])
+        scores, categories, colors = score_roster(ages, stats)
+        assert scores.tolist() == [data['overall_score'] for data in expected[:2000]]
+        assert categories.tolist() == [data['age_category'] for data in expected[:2000]]
+        assert colors.tolist() == [data['card_color'] for data in expected[:2000]]
+        # Effectif vide: tableaux vides, sans erreur de reshape
+        scores, categories, colors = score_roster(*roster_to_columns([]))
+        assert (len(scores), len(categories), len(colors)) == (0, 0, 0)
+        assert len(score_roster([], [])[0]) == 0
+    
+    assert apply_squadfield_rules_bulk(players) == expected
+    assert apply_squadfield_rules_bulk([]) == []
+    
+    # Repli sans NumPy
+    numpy_module, rules.np = rules.np, None
+    try:
+        assert apply_squadfield_rules_bulk(players[:50]) == expected[:50]
+    finally:
+        rules.np = numpy_module
+    
+    print("✅ Calcul des règles en masse fonctionnel")
+
+def test_rules_versions():
+    """Test les tables de seuils versionnées, compilées en tableaux de correspondance."""
+    import json
+    import tempfile
+    import rules
+    from rules import (get_rules, get_age_category, get_card_color, apply_squadfield_rules,
+                       apply_squadfield_rules_bulk, rules_versions, reset_rules)
+    from rules_table import CURRENT_RULES_VERSION
+    
+    # La version intégrée reproduit les anciennes bornes sur tout le domaine compilé
+    bands = [(65, "gris"), (75, "bronze"), (80, "jaune"), (85, "vert"),
+             (90, "violet"), (95, "doré"), (99, "platine"), (101, "star")]
+    for score in range(0, 101):
+        assert get_card_color(score) == next(color for bound, color in bands if score < bound)
+    assert [get_age_category(age) for age in (5, 8, 9, 12, 13, 17, 18, 19, 20, 39, 40, 60)] == \
+        ["U8", "U8", "U10", "U12", "U15", "U17", "U20", "U20", "Elite", "Senior", "Master", "Master"]
+    assert get_age_category(72) == "Master" and get_card_color(104) == "star"
+    
+    player = {"prenom": "Test", "age": 12, "sport": "football",
+              "stats": {"technique": 78, "vitesse": 78, "physique": 78, "tirs": 78, "defense": 78, "passe": 78}}
+    assert apply_squadfield_rules(player)['rules_version'] == CURRENT_RULES_VERSION
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        override_path = os.path.join(tmp, 'rules.json')
+        with open(override_path, 'w', encoding='utf-8') as f:
+            json.dump({"current": "2026.1", "versions": [{
+                "version": "2026.1",
+                "age_categories": [["U12", 12], ["U18", 18], ["Adulte", None]],
+                "card_colors": [["gris", 0], ["vert", 70], ["doré", 90]]
+            }]}, f)
+        
+        previous = os.environ.get('RULES_TABLE_PATH')
+        os.environ['RULES_TABLE_PATH'] = override_path
+        reset_rules()
+        try:
+            assert rules_versions() == ([CURRENT_RULES_VERSION, "2026.1"], "2026.1")
+            enriched = apply_squadfield_rules(player)
+            assert (enriched['age_category'], enriched['card_color'], enriched['rules_version']) == \
+                ("U12", "vert", "2026.1")
+            
+            # Rescoring d'un historique avec les règles de l'époque
+            old = apply_squadfield_rules_bulk([player], rules_version=CURRENT_RULES_VERSION)[0]
+            assert (old['card_color'], old['rules_version']) == ("jaune", CURRENT_RULES_VERSION)
+            
+            try:
+                get_rules("1999.1")
+                assert False, "Version inconnue acceptée"
+            except ValueError:
+                pass
+        finally:
+            if previous is None:
+                os.environ.pop('RULES_TABLE_PATH', None)
+            else:
+                os.environ['RULES_TABLE_PATH'] = previous
+            reset_rules()
+    
+    # Table incohérente refusée à la compilation
+    try:
+        rules.CompiledRules({"version": "x", "age_categories": [["A", 20], ["B", 10], ["C", None]],
+                             "card_colors": [["gris", 0]]})
+        assert False, "Table incohérente acceptée"
+    except ValueError:
+        pass
+    
+    print("✅ Règles versionnées fonctionnelles")
+
+def test_player_schema():
+    """Test le schéma compilé: toutes les erreurs par joueur, effectif validé en une passe."""
+    from player_schema import validate_player, validate_prompt_fields, validate_roster, STAT_NAMES
+    from rules import validate_player_data, apply_squadfield_rules
+    
+    # Joueur du formulaire /generate: photo_path, pas de photo_url
+    flask_player = {"prenom": "Léa", "age": 12, "sport": "Football", "photo_path": "/tmp/lea.jpg",
+                    "stats": {name: 80 for name in STAT_NAMES}}
+    assert validate_player(flask_player) == []
+    assert validate_player_data(flask_player)[0]
+    assert validate_prompt_fields(apply_squadfield_rules(flask_player)) == []
+    
+    # Toutes les erreurs d'un enregistrement en une fois
+    broken = {"prenom": "  ", "age": "douze", "stats": {"technique": 120, "vitesse": True, "mental": 50}}
+    messages = [error['error'] for error in validate_player(broken)]
+    assert "Le prénom ne peut pas être vide" in messages
+    assert "Âge invalide (doit être entre 5 et 60 ans)" in messages
+    assert "Champ requis manquant: sport" in messages
+    assert "Valeur invalide pour technique (doit être entre 0 et 100)" in messages
+    assert "Type invalide pour vitesse (attendu: entier)" in messages
+    assert "Statistique inconnue: mental" in messages
+    assert "Statistique manquante: passe" in messages
+    is_valid, message = validate_player_data(broken)
+    assert not is_valid and message.count(';') == len(messages) - 1
+    
+    # Effectif complet: un rapport par joueur invalide
+    report = validate_roster([flask_player, broken, "invalide", dict(flask_player, age=61)])
+    assert [entry['index'] for entry in report] == [1, 2, 3]
+    assert len(report[0]['errors']) == len(messages)
+    assert report[2]['player'] == "Léa" and report[2]['errors'][0]['field'] == 'age'
+    
+    messages = [error['error'] for error in validate_prompt_fields({"prenom": "Léa", "overall_score": 140})]
+    assert "Score global invalide (doit être entre 0 et 100)" in messages
+    assert "Champ requis manquant: card_color" in messages
+    
+    print("✅ Schéma joueur fonctionnel")
+
 def test_prompt_generation():
     """Test la génération de prompt."""
     try:
@@ -90,6 +241,1358 @@ def test_prompt_generation():
         print(f"❌ Erreur de génération de prompt: {e}")
         return False
 
+def test_job_queue():
+    """Test la file de jobs asynchrone et la reprise après redémarrage."""
+    from job_queue import JobQueue
+    from job_store import JobStore
+    
+    def handler(payload, report_stage, checkpoint):
+        if 'dalle_url' not in checkpoint:
+            report_stage('image_generated', dalle_url="https://example.com/card.png")
+        if payload.get('fail'):
+            raise ValueError("échec simulé")
+        return {"player": payload['prenom'], "dalle_url": checkpoint.get('dalle_url')}
+    
+    store = JobStore(':memory:')
+    queue = JobQueue(handler, store=store, max_workers=2, max_pending=10)
+    ok_id = queue.submit({"prenom": "TestPlayer"})
+    ko_id = queue.submit({"prenom": "TestPlayer", "fail": True})
+    queue.shutdown(wait=True)
+    
+    ok_job = queue.get(ok_id)
+    ko_job = queue.get(ko_id)
+    assert ok_job['status'] == 'completed'
+    assert ok_job['result']['player'] == "TestPlayer"
+    assert ko_job['status'] == 'failed'
+    assert "échec simulé" in ko_job['error']
+    assert ko_job['stage'] == 'image_generated'
+    assert queue.get('inconnu') is None
+    print("✅ File de jobs fonctionnelle")
+    
+    # Job interrompu après DALL·E: la reprise réutilise l'image déjà générée
+    store.create('interrompu', {"prenom": "TestPlayer"})
+    store.save_stage('interrompu', 'image_generated', dalle_url="https://example.com/paid.png")
+    store.set_status('interrompu', 'running')
+    
+    recovery_queue = JobQueue(handler, store=store, max_workers=1, max_pending=10)
+    assert recovery_queue.recover() == 1
+    recovery_queue.shutdown(wait=True)
+    
+    resumed = store.get('interrompu')
+    assert resumed['status'] == 'completed'
+    assert resumed['result']['dalle_url'] == "https://example.com/paid.png"
+    
+    # Job réservé par un autre processus vivant: ignoré tant que son bail court
+    store.create('ailleurs', {"prenom": "TestPlayer"}, owner='autre-worker', lease=60)
+    assert not store.claim('ailleurs', 'moi', 60) and store.claim('ailleurs', 'autre-worker', 60)
+    sibling = JobQueue(handler, store=store, max_workers=1, max_pending=10, owner='moi')
+    assert sibling.recover() == 0
+    store.create('orphelin', {"prenom": "TestPlayer"}, owner='worker-mort', lease=-1)
+    assert sibling.recover() == 1
+    sibling.shutdown(wait=True)
+    assert store.get('orphelin')['status'] == 'completed' and store.get('ailleurs')['status'] == 'queued'
+    print("✅ Reprise des jobs interrompus fonctionnelle")
+    
+
+def _record_recovered_job(payload, report_stage, checkpoint):
+    """Handler des workers simulés: note chaque exécution dans un fichier partagé."""
+    with open(payload['runs_path'], 'a', encoding='utf-8') as f:
+        f.write(payload['prenom'] + '\n')
+    time.sleep(0.2)  # Assez long pour chevaucher la reprise de l'autre processus
+    return {"player": payload['prenom']}
+
+def _recover_in_process(db_path, ready, go):
+    """Worker gunicorn simulé: reprend les jobs interrompus au même moment que son voisin."""
+    from job_queue import JobQueue
+    from job_store import JobStore
+    queue = JobQueue(_record_recovered_job, store=JobStore(db_path), max_workers=2, max_pending=10)
+    ready.set()
+    go.wait(10)
+    queue.recover()
+    queue.shutdown(wait=True)
+
+def test_job_recovery_processes():
+    """Test la reprise simultanée par plusieurs processus: chaque job n'est exécuté qu'une fois."""
+    import tempfile
+    import multiprocessing
+    from job_store import JobStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'jobs.db')
+        runs_path = os.path.join(tmp, 'runs.txt')
+        store = JobStore(db_path)
+        names = [f"Joueur{i}" for i in range(6)]
+        for name in names:
+            store.create(name, {"prenom": name, "runs_path": runs_path})
+            store.set_status(name, 'running')  # Interrompu par l'arrêt du serveur
+        # Job en cours dans un troisième worker vivant: bail valide, personne ne le reprend
+        store.create('vivant', {"prenom": "vivant", "runs_path": runs_path}, owner='worker-vivant', lease=60)
+        store.set_status('vivant', 'running')
+        
+        context = multiprocessing.get_context('spawn')
+        go = context.Event()
+        workers = []
+        for _ in range(2):
+            ready = context.Event()
+            process = context.Process(target=_recover_in_process, args=(db_path, ready, go))
+            process.start()
+            workers.append((process, ready))
+        for _, ready in workers:
+            assert ready.wait(30), "Worker non démarré"
+        go.set()
+        for process, _ in workers:
+            process.join(30)
+            assert process.exitcode == 0
+        
+        with open(runs_path, encoding='utf-8') as f:
+            runs = f.read().split()
+        assert sorted(runs) == sorted(names)  # Aucun job exécuté deux fois, aucun oublié
+        assert all(store.get(name)['status'] == 'completed' for name in names)
+        assert store.get('vivant')['status'] == 'running'
+        store.close()
+    print("✅ Reprise multi-processus sans double exécution")
+
+def test_job_events():
+    """Test le flux SSE des étapes d'un job (rejeu puis diffusion en direct)."""
+    import json
+    import threading
+    from job_queue import JobQueue
+    from job_store import JobStore
+    from job_events import stream_job_events
+    
+    gate = threading.Event()
+    
+    def handler(payload, report_stage, checkpoint):
+        report_stage('rules_applied')
+        gate.wait(5)
+        report_stage('prompt_built', prompt="test")
+        report_stage('image_generated', dalle_url="https://example.com/card.png")
+        return {"player": payload['prenom']}
+    
+    queue = JobQueue(handler, store=JobStore(':memory:'), max_workers=1, max_pending=10)
+    job_id = queue.submit({"prenom": "TestPlayer"})
+    
+    messages = []
+    stream = stream_job_events(queue, job_id, heartbeat=0.05, max_duration=5)
+    for message in stream:
+        messages.append(message)
+        if message.startswith(': keep-alive'):
+            gate.set()
+    queue.shutdown(wait=True)
+    
+    events = [m.split('\n')[0].replace('event: ', '') for m in messages if m.startswith('event:')]
+    stages = [json.loads(m.split('data: ')[1])['stage'] for m in messages if m.startswith('event: stage')]
+    assert events[0] == 'status' and events[-1] == 'completed'
+    assert stages == ['uploaded', 'rules_applied', 'prompt_built', 'image_generated']
+    last_stage = json.loads([m for m in messages if m.startswith('event: stage')][-1].split('data: ')[1])
+    assert last_stage['duration_ms'] >= 0 and last_stage['elapsed_ms'] >= last_stage['duration_ms']
+    assert queue.events.subscriber_count() == 0
+    
+    # Job exécuté par un autre processus (aucun événement sur le bus local):
+    # le flux relit le store et se termine sur completed, sans attendre max_duration
+    remote_id = 'distant'
+    queue.store.create(remote_id, {"prenom": "Distant"}, owner='autre-worker', lease=60)
+    queue.store.set_status(remote_id, 'running')
+    remote = stream_job_events(queue, remote_id, heartbeat=0.05, max_duration=5, poll_interval=0.02)
+    first = [next(remote) for _ in range(2)]
+    assert first[0].startswith('event: status')
+    queue.store.save_stage(remote_id, 'prompt_built', prompt="test")
+    queue.store.set_status(remote_id, 'completed', result={"player": "Distant"})
+    remote_messages = first + list(remote)
+    assert remote_messages[-1].startswith('event: completed') and '"Distant"' in remote_messages[-1]
+    assert any('"prompt_built"' in m for m in remote_messages)
+    
+    # Job terminé: rejeu immédiat jusqu'au résultat final
+    replay = list(stream_job_events(queue, job_id, heartbeat=0.05, max_duration=1))
+    assert replay[-1].startswith('event: completed')
+    assert '"player": "TestPlayer"' in replay[-1]
+    
+    print(f"✅ Flux SSE fonctionnel ({len(stages)} étapes diffusées)")
+
+def test_image_cache():
+    """Test le cache d'images adressé par prompt."""
+    import time
+    from image_cache import ImageCache, compute_cache_key
+    
+    settings = {"model": "dall-e-3", "size": "1024x1024", "quality": "standard"}
+    key = compute_cache_key("Carte  de\nTestPlayer ", settings)
+    assert key == compute_cache_key("Carte de TestPlayer", settings)
+    assert key != compute_cache_key("Carte de TestPlayer", dict(settings, quality="hd"))
+    
+    cache = ImageCache(':memory:', ttl=3600, max_entries=2)
+    assert cache.get(key) is None
+    cache.put(key, "https://storage.googleapis.com/b/cards_ai/a.png", "https://dalle/a.png")
+    assert cache.get(key)['firebase_url'].endswith("a.png")
+    
+    # Éviction LRU: 'key' vient d'être lue, 'b' est la moins récente
+    time.sleep(0.01)
+    cache.put('b', "https://storage.googleapis.com/b/cards_ai/b.png")
+    time.sleep(0.01)
+    cache.get(key)
+    time.sleep(0.01)
+    cache.put('c', "https://storage.googleapis.com/b/cards_ai/c.png")
+    assert cache.size() == 2
+    assert cache.get('b') is None
+    assert cache.get(key) is not None
+    
+    # Expiration TTL
+    expired = ImageCache(':memory:', ttl=1)
+    expired.put(key, "https://storage.googleapis.com/b/cards_ai/a.png")
+    expired._conn.execute("UPDATE image_cache SET created_at = created_at - 10")
+    assert expired.get(key) is None
+    
+    print("✅ Cache d'images fonctionnel")
+
+def test_singleflight():
+    """Test la coalescence des générations identiques simultanées."""
+    import time
+    import threading
+    from singleflight import SingleFlight
+    
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+    
+    def slow_generation():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "https://example.com/card.png"
+    
+    def worker():
+        results.append(flight.do("prompt-hash", slow_generation))
+    
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.1)  # Laisser les suiveurs rejoindre l'appel en cours
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    
+    assert len(calls) == 1
+    assert len(results) == 4
+    assert sum(1 for _, shared in results if shared) == 3
+    assert all(url == "https://example.com/card.png" for url, _ in results)
+    assert flight.in_flight() == 0
+    
+    # Appel partagé interrompu (BaseException): les suiveurs n'obtiennent jamais None
+    from singleflight import InterruptedCallError
+    class Cancelled(BaseException):
+        pass
+    started.clear()
+    release.clear()
+    outcomes = []
+    def cancelled_generation():
+        started.set()
+        release.wait(5)
+        raise Cancelled()
+    def cancel_worker():
+        try:
+            outcomes.append(flight.do("prompt-annule", cancelled_generation))
+        except BaseException as e:
+            outcomes.append(type(e))
+    threads = [threading.Thread(target=cancel_worker)]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=cancel_worker) for _ in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(outcomes, key=lambda kind: kind.__name__) == [Cancelled, InterruptedCallError, InterruptedCallError]
+    assert flight.in_flight() == 0
+    
+    # Génération forcée (bypass_cache) jamais coalescée avec une génération ordinaire
+    import card_pipeline
+    from image_cache import ImageCache
+    started.clear()
+    release.clear()
+    generations = []
+    def fake_dalle(prompt, photo_path=None):
+        generations.append(prompt)
+        started.set()
+        release.wait(5)
+        return f"https://example.com/dalle-{len(generations)}.png"
+    previous = (card_pipeline.generate_dalle_image, card_pipeline.upload_image_from_url,
+                card_pipeline.get_image_cache)
+    cache = ImageCache(db_path=':memory:')
+    card_pipeline.generate_dalle_image = fake_dalle
+    card_pipeline.upload_image_from_url = lambda url, name, color: url.replace('dalle', 'firebase')
+    card_pipeline.get_image_cache = lambda: cache
+    try:
+        enriched = {"prenom": "Lucas", "card_color": "vert"}
+        def generate(bypass):
+            card_pipeline._generate_with_dalle({"bypass_cache": bypass}, enriched, "même prompt", {},
+                                               lambda stage, **artifacts: None)
+        threads = [threading.Thread(target=generate, args=(False,))]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=generate, args=(True,)))
+        threads[1].start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        assert len(generations) == 2
+    finally:
+        (card_pipeline.generate_dalle_image, card_pipeline.upload_image_from_url,
+         card_pipeline.get_image_cache) = previous
+    print("✅ Coalescence des générations fonctionnelle")
+
+def test_roster_preparation():
+    """Test la validation et l'enrichissement d'un effectif en une passe."""
+    import json
+    from card_pipeline import prepare_roster
+    
+    with open('test_players.json', 'r', encoding='utf-8') as f:
+        players = json.load(f)
+    
+    prepared, errors = prepare_roster(players + [{"prenom": "Incomplet"}, "invalide"])
+    
+    assert [player['prenom'] for _, player, _ in prepared] == ["Auguste", "Marie", "Lucas"]
+    assert prepared[0][2]['card_color'] == "jaune"
+    assert [error['index'] for error in errors] == [3, 4]
+    
+    print(f"✅ Roster préparé: {len(prepared)} valides, {len(errors)} rejetés")
+
+def test_openai_scheduler():
+    """Test l'ordonnanceur OpenAI (AIMD, Retry-After, retries)."""
+    from openai_scheduler import AdaptiveLimiter, ImageScheduler, get_retry_after
+    
+    class FakeRateLimitError(Exception):
+        status_code = 429
+        headers = {'retry-after-ms': '10'}
+    
+    class FakeBadRequestError(Exception):
+        status_code = 400
+    
+    assert get_retry_after(FakeRateLimitError()) == 0.01
+    
+    scheduler = ImageScheduler(AdaptiveLimiter(initial_limit=4), max_retries=3, base_delay=0.001)
+    attempts = []
+    
+    def flaky_call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeRateLimitError("429")
+        return "https://example.com/card.png"
+    
+    assert scheduler.call(flaky_call) == "https://example.com/card.png"
+    metrics = scheduler.metrics()
+    assert len(attempts) == 3
+    assert metrics['throttled'] == 2 and metrics['retries'] == 2
+    assert metrics['concurrency_limit'] == 2  # 4 -> 2 -> 1 (429), puis +1 après le succès
+    
+    # Une erreur non transitoire n'est pas rejouée
+    def bad_request():
+        attempts.append(1)
+        raise FakeBadRequestError("400")
+    
+    attempts.clear()
+    try:
+        scheduler.call(bad_request)
+        assert False, "L'erreur 400 aurait dû être propagée"
+    except FakeBadRequestError:
+        pass
+    assert len(attempts) == 1
+    
+    # Erreurs 5xx / timeout: limite divisée, jamais augmentée pendant la panne
+    class FakeServerError(Exception):
+        status_code = 503
+    
+    class FakeTimeoutError(Exception):
+        pass
+    
+    limiter = AdaptiveLimiter(initial_limit=8)
+    failing = ImageScheduler(limiter, max_retries=2, base_delay=0.001)
+    for error in (FakeServerError, FakeTimeoutError):
+        try:
+            failing.call(lambda: (_ for _ in ()).throw(error("panne")))
+            assert False, "L'erreur aurait dû être propagée"
+        except error:
+            pass
+    assert limiter.current_limit() == 1  # 8 -> 4 -> 2 -> 1 (3 essais 503), puis plancher
+    # Erreur non transitoire: limite inchangée
+    limiter = AdaptiveLimiter(initial_limit=4)
+    try:
+        ImageScheduler(limiter, max_retries=0).call(bad_request)
+    except FakeBadRequestError:
+        pass
+    assert limiter.limit == 4
+    
+    print(f"✅ Ordonnanceur OpenAI fonctionnel (limite: {metrics['concurrency_limit']})")
+
+def test_circuit_breaker():
+    """Test les états du disjoncteur (closed, open, half_open)."""
+    import time
+    from circuit_breaker import CircuitBreaker, CircuitOpenError
+    
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=0.05)
+    
+    @breaker.guard(fallback=None, is_failure=lambda url: url is None)
+    def failing_upload():
+        return None
+    
+    calls = []
+    
+    @breaker.guard(fallback=None, is_failure=lambda url: url is None)
+    def working_upload():
+        calls.append(1)
+        return "https://example.com/card.png"
+    
+    failing_upload()
+    assert breaker.state == 'closed'
+    failing_upload()
+    assert breaker.state == 'open'
+    
+    # Disjoncteur ouvert: échec immédiat, sans appel
+    assert working_upload() is None
+    assert calls == []
+    try:
+        breaker.call(lambda: "ok")
+        assert False, "CircuitOpenError attendue"
+    except CircuitOpenError as e:
+        assert e.retry_after > 0
+    
+    # Après le délai: un essai semi-ouvert qui réussit referme le disjoncteur
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert working_upload() == "https://example.com/card.png"
+    assert breaker.state == 'closed'
+    
+    # Essai semi-ouvert interrompu (BaseException): le créneau est rendu
+    class Cancelled(BaseException):
+        pass
+    def cancelled():
+        raise Cancelled()
+    failing_upload()
+    failing_upload()
+    time.sleep(0.06)
+    try:
+        breaker.call(cancelled)
+        assert False, "Cancelled attendue"
+    except Cancelled:
+        pass
+    assert breaker.state == 'half_open'
+    assert working_upload() == "https://example.com/card.png"
+    assert breaker.state == 'closed'
+    
+    print("✅ Disjoncteur fonctionnel")
+
+def test_streaming_upload():
+    """Test le flux de transfert DALL·E -> Firebase (mémoire bornée, checksum)."""
+    import hashlib
+    from firebase_uploader import HashingStream
+    
+    image_bytes = bytes(range(256)) * 4000  # ~1 MB
+    
+    class FakeResponse:
+        def iter_content(self, chunk_size):
+            for start in range(0, len(image_bytes), chunk_size):
+                yield image_bytes[start:start + chunk_size]
+    
+    stream = HashingStream(FakeResponse(), chunk_size=10000)
+    chunk_size = 256 * 1024
+    received = []
+    while True:
+        chunk = stream.read(chunk_size)
+        received.append(chunk)
+        assert len(stream._buffer) < chunk_size + 10000  # Jamais l'image entière en mémoire
+        if len(chunk) < chunk_size:
+            break
+    
+    assert b"".join(received) == image_bytes
+    assert stream.tell() == len(image_bytes)
+    assert stream.sha256.hexdigest() == hashlib.sha256(image_bytes).hexdigest()
+    
+    # Tampon de téléchargement: au plus un chunk d'upload en mémoire
+    from firebase_uploader import DOWNLOAD_SPOOL_BYTES, UPLOAD_CHUNK_SIZE
+    assert DOWNLOAD_SPOOL_BYTES <= UPLOAD_CHUNK_SIZE
+    
+    # Session HTTP poolée partagée entre les uploads
+    from firebase_uploader import get_uploader
+    uploader = get_uploader()
+    assert get_uploader() is uploader
+    adapter = uploader.session.get_adapter('https://oaidalleapiprodscus.blob.core.windows.net/')
+    assert adapter._pool_maxsize == uploader.pool_size
+    
+    print("✅ Transfert en streaming fonctionnel")
+
+class FakeBlob:
+    """Objet Storage factice : uploads et publications sont enregistrés par le bucket."""
+    def __init__(self, bucket, name):
+        self.bucket, self.name, self.md5_hash = bucket, name, None
+        self.public_url = f"https://storage.googleapis.com/test-bucket/{name}"
+    def upload_from_string(self, data, content_type=None):
+        if self.bucket.broken:
+            raise ConnectionError("Storage indisponible")
+        self.bucket.uploads.append(self.name)
+    def upload_from_file(self, file_obj, content_type=None, size=None, **kwargs):
+        self.bucket.uploads.append(self.name)
+        self.bucket.content_types[self.name] = content_type
+        self.bucket.contents[self.name] = file_obj.read()
+    def make_public(self):
+        self.bucket.public.append(self.name)
+    def exists(self):
+        raise AssertionError("Aucune sonde exists() attendue")
+    def delete(self):
+        pass
+
+class FakeDeleteBatch:
+    """Batch de suppressions factice : 404 pour les noms contenant 'absente', 500 pour 'bloquee'."""
+    def __init__(self, client, raise_exception=True):
+        self.bucket, self.names, self.responses = client.bucket, [], []
+    def __enter__(self):
+        self.bucket.local.batch = self
+        return self
+    def __exit__(self, *args):
+        self.bucket.batches.append(list(self.names))
+        for name in self.names:
+            code = 404 if 'absente' in name else 500 if 'bloquee' in name else 204
+            self.responses.append(type('Response', (), {'status_code': code})())
+
+class FakeBucket:
+    """Bucket Firebase factice (uploads, publications et batchs de suppressions)."""
+    def __init__(self):
+        import threading
+        self.uploads, self.public, self.contents, self.broken = [], [], {}, False
+        self.content_types = {}
+        self.local, self.batches = threading.local(), []
+        self.client = type('FakeClient', (), {'bucket': self})()
+    def blob(self, name, chunk_size=None):
+        return FakeBlob(self, name)
+    def delete_blob(self, name):
+        self.local.batch.names.append(name)
+
+@contextmanager
+def fake_storage(tmp):
+    """
+    Remplace le bucket Firebase et les registres partagés (index des uploads,
+    manifeste, miniatures, cache d'images) par des fakes dans tmp, puis les restaure.
+    
+    Yields:
+        FakeBucket: Bucket utilisé par firebase_uploader
+    """
+    import upload_index
+    import card_manifest
+    import card_derivatives
+    import image_cache
+    import firebase_uploader
+    
+    uploader = firebase_uploader.get_uploader()
+    previous = (upload_index._upload_index, card_manifest._card_manifest, card_derivatives._derivative_store,
+                image_cache._image_cache, firebase_uploader._DeleteBatch, uploader._bucket, uploader.download)
+    bucket = FakeBucket()
+    upload_index._upload_index = upload_index.UploadIndex(db_path=os.path.join(tmp, 'uploads.db'))
+    card_manifest._card_manifest = card_manifest.CardManifest(db_path=os.path.join(tmp, 'manifest.db'))
+    card_derivatives._derivative_store = card_derivatives.DerivativeStore(db_path=os.path.join(tmp, 'derivatives.db'))
+    image_cache._image_cache = image_cache.ImageCache(db_path=os.path.join(tmp, 'images.db'))
+    firebase_uploader._DeleteBatch = FakeDeleteBatch
+    uploader._bucket = bucket
+    try:
+        yield bucket
+    finally:
+        (upload_index._upload_index, card_manifest._card_manifest, card_derivatives._derivative_store,
+         image_cache._image_cache, firebase_uploader._DeleteBatch, uploader._bucket, uploader.download) = previous
+
+def test_upload_dedup():
+    """Test la déduplication des uploads Firebase par SHA-256 du contenu."""
+    import tempfile
+    import requests
+    import firebase_uploader
+    from image_cache import get_image_cache
+    
+    class FakeResponse:
+        def __init__(self, data):
+            self.data = data
+        def __enter__(self):
+            return self
+        def __exit__(self, *args):
+            pass
+        def raise_for_status(self):
+            pass
+        def iter_content(self, chunk_size):
+            for start in range(0, len(self.data), chunk_size):
+                yield self.data[start:start + chunk_size]
+    
+    image_bytes = bytes(range(256)) * 100
+    uploader = firebase_uploader.get_uploader()
+    with tempfile.TemporaryDirectory() as tmp, fake_storage(tmp) as bucket:
+        uploader.download = lambda url: FakeResponse(image_bytes)
+        first = firebase_uploader.upload_image_from_bytes(image_bytes, 'Lucas', 'vert')
+        second = firebase_uploader.upload_image_from_bytes(image_bytes, 'Emma', 'vert')
+        assert first == second
+        assert len(bucket.uploads) == 1 and len(bucket.public) == 1
+        # Même contenu dans un autre dossier: objet distinct
+        firebase_uploader.upload_image_from_bytes(image_bytes, 'Lucas', 'vert', prefix='thumbnails')
+        assert len(bucket.uploads) == 2
+        
+        # Téléchargement DALL·E déjà stocké: ni upload ni make_public
+        assert firebase_uploader.upload_image_from_url('https://example.com/a.png', 'Lucas', 'vert') == first
+        other = image_bytes[::-1]
+        uploader.download = lambda url: FakeResponse(other)
+        url = firebase_uploader.upload_image_from_url('https://example.com/b.png', 'Lucas', 'vert')
+        assert url != first and bucket.contents[bucket.uploads[-1]] == other
+        assert len(bucket.public) == 3
+        
+        # Fichier local identique à une image déjà stockée
+        file_path = os.path.join(tmp, 'card.png')
+        with open(file_path, 'wb') as f:
+            f.write(image_bytes)
+        assert firebase_uploader.upload_image_from_file(file_path, 'Lucas', 'vert') == first
+        
+        # Objet supprimé: il ne sert plus de doublon ni de carte en cache
+        get_image_cache().put('prompt-lucas', first)
+        assert firebase_uploader.delete_image(first)
+        assert get_image_cache().get('prompt-lucas') is None
+        firebase_uploader.upload_image_from_bytes(image_bytes, 'Lucas', 'vert')
+        assert len(bucket.uploads) == 4
+        
+        # Content-type déduit de l'extension du fichier
+        jpeg_path = os.path.join(tmp, 'photo.jpg')
+        with open(jpeg_path, 'wb') as f:
+            f.write(b'jpeg')
+        firebase_uploader.upload_image_from_file(jpeg_path, 'Lucas', 'vert')
+        assert bucket.content_types[bucket.uploads[-1]] == 'image/jpeg'
+        
+        # Seules les erreurs Storage comptent pour le disjoncteur Firebase
+        breaker = firebase_uploader.firebase_breaker
+        failures = breaker._failures
+        assert firebase_uploader.upload_image_from_file(os.path.join(tmp, 'absent.png'), 'Lucas', 'vert') is None
+        def broken_download(url):
+            raise requests.ConnectionError("DALL·E indisponible")
+        uploader.download = broken_download
+        assert firebase_uploader.upload_image_from_url('https://example.com/c.png', 'Lucas', 'vert') is None
+        assert breaker._failures == failures
+        bucket.broken = True
+        assert firebase_uploader.upload_image_from_bytes(b'nouvelle carte', 'Lucas', 'vert') is None
+        assert breaker._failures == failures + 1
+        
+        # Disjoncteur ouvert: ni hash ni index consultés, même pour un doublon
+        while breaker.state != 'open':
+            breaker.record_failure()
+        assert firebase_uploader.upload_image_from_file(file_path, 'Lucas', 'vert') is None
+        assert firebase_uploader.upload_image_from_bytes(image_bytes, 'Lucas', 'vert') is None
+        breaker.record_success()
+    
+    print("✅ Déduplication des uploads fonctionnelle")
+
+def test_card_manifest():
+    """Test le manifeste local des cartes (nommage, synchronisation incrémentale, pagination, ETag)."""
+    import tempfile
+    import card_manifest
+    import card_derivatives
+    from card_manifest import CardManifest, parse_card_name
+    from card_derivatives import DerivativeStore
+    
+    parsed = parse_card_name('cards_ai/Jean_Pierre_doré_20250612_101500_0123456789abcdef.png')
+    assert parsed == {"player": "Jean_Pierre", "card_color": "doré",
+                      "created_at": "2025-06-12T10:15:00", "content_hash": "0123456789abcdef"}
+    assert parse_card_name('cards_ai/Lucas_vert_20250101_120000_1a2b3c4d.png')['content_hash'] is None
+    assert parse_card_name('cards_thumbs/w256/Lucas_vert_20250101_120000_1a2b3c4d.webp') is None
+    assert parse_card_name('cards_ai/notes.txt') is None
+    
+    class FakeBlob:
+        def __init__(self, name, generation=1, size=1000):
+            self.name, self.generation, self.size, self.md5_hash = name, generation, size, 'md5'
+            self.public_url = f"https://storage.googleapis.com/test-bucket/{name}"
+    
+    names = [f"cards_ai/{player}_{color}_202501{day:02d}_120000_{day:016x}.png"
+             for day, (player, color) in enumerate([('Lucas', 'vert'), ('Emma', 'doré'), ('Lucas', 'doré'),
+                                                    ('Hugo', 'gris'), ('lucas', 'vert')], start=1)]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = CardManifest(db_path=os.path.join(tmp, 'manifest.db'), sync_interval=3600)
+        assert manifest.is_stale()
+        result = manifest.sync([FakeBlob(name) for name in names] + [FakeBlob('cards_ai/readme.txt')])
+        assert (result['added'], result['total']) == (5, 5) and not manifest.is_stale()
+        
+        # Incrémental: seuls les objets nouveaux ou modifiés sont réécrits
+        blobs = [FakeBlob(name, generation=2 if name == names[0] else 1) for name in names[1:4]] + [FakeBlob(names[0], 2)]
+        result = manifest.sync(blobs)
+        assert (result['added'], result['updated'], result['removed'], result['total']) == (0, 1, 1, 4)
+        # Carte uploadée pendant un listing qui ne la contient pas: conservée
+        manifest.record(names[4], 'https://example.com/new.png')
+        def listing():
+            yield from blobs
+            manifest.record(names[4], 'https://example.com/new.png')
+        result = manifest.sync(listing())
+        assert (result['removed'], result['total']) == (0, 5)
+        
+        # Filtres (prénom insensible à la casse) et pagination par curseur
+        lucas = manifest.query(player='LUCAS')['cards']
+        assert [card['created_at'][:10] for card in lucas] == ['2025-01-05', '2025-01-03', '2025-01-01']
+        assert [card['name'] for card in manifest.query(card_color='doré')['cards']] == [names[2], names[1]]
+        page = manifest.query(limit=2)
+        assert len(page['cards']) == 2 and page['next_cursor']
+        rest = manifest.query(limit=2, cursor=page['next_cursor'])
+        last = manifest.query(limit=2, cursor=rest['next_cursor'])
+        assert last['next_cursor'] is None
+        assert len({card['name'] for card in page['cards'] + rest['cards'] + last['cards']}) == 5
+        assert [card['name'] for card in manifest.iter_cards(batch_size=2)] == \
+            [card['name'] for card in manifest.query(limit=10)['cards']]
+        assert len(manifest.query(since='2025-01-03')['cards']) == 3
+        assert len(manifest.query(older_than=0)['cards']) == 5
+        try:
+            manifest.query(cursor='!!')
+            assert False, "Curseur invalide accepté"
+        except ValueError:
+            pass
+        assert manifest.forget(names[3]) and not manifest.forget(names[3])
+        
+        # Endpoint /cards: page filtrée, miniatures, ETag et 304
+        from app import app
+        app.config['TESTING'] = True
+        store = DerivativeStore(db_path=os.path.join(tmp, 'derivatives.db'))
+        store.put(lucas[0]['public_url'], 'data:image/webp;base64,xx', [{"width": 256, "url": "thumb"}])
+        previous = card_manifest._card_manifest, card_derivatives._derivative_store
+        card_manifest._card_manifest, card_derivatives._derivative_store = manifest, store
+        try:
+            client = app.test_client()
+            response = client.get('/cards?player=lucas&limit=2')
+            body = response.get_json()
+            assert response.status_code == 200 and body['count'] == 2 and body['next_cursor']
+            assert body['cards'][0]['thumbnails'][0]['width'] == 256
+            etag = response.headers['ETag']
+            assert client.get('/cards?player=lucas&limit=2', headers={'If-None-Match': etag}).status_code == 304
+            manifest.record(names[0].replace('20250101', '20250109'), 'https://example.com/other.png')
+            assert client.get('/cards?player=lucas&limit=2', headers={'If-None-Match': etag}).status_code == 200
+            assert client.get('/cards?cursor=!!').status_code == 400
+        finally:
+            card_manifest._card_manifest, card_derivatives._derivative_store = previous
+    
+    print("✅ Manifeste des cartes fonctionnel")
+
+def test_bulk_delete():
+    """Test la suppression en masse (batchs parallèles, filtres du manifeste, résultat par objet)."""
+    import tempfile
+    from card_manifest import get_card_manifest
+    from card_derivatives import get_derivative_store
+    from image_cache import get_image_cache
+    from firebase_uploader import delete_images, object_name_from_url
+    
+    base = "https://storage.googleapis.com/test-bucket/"
+    assert object_name_from_url(base + "cards_ai/L%C3%A9a_vert_20250101_120000_ab.png") == \
+        "cards_ai/Léa_vert_20250101_120000_ab.png"
+    assert object_name_from_url(
+        "https://firebasestorage.googleapis.com/v0/b/test-bucket/o/cards_ai%2FLucas.png?alt=media"
+    ) == "cards_ai/Lucas.png"
+    assert object_name_from_url("https://example.com/a.png") is None
+    
+    names = [f"cards_ai/Lucas_vert_2025010{day}_120000_{day:016x}.png" for day in range(1, 6)]
+    with tempfile.TemporaryDirectory() as tmp, fake_storage(tmp) as bucket:
+        manifest, store, cache = get_card_manifest(), get_derivative_store(), get_image_cache()
+        for name in names + ["cards_ai/Emma_doré_20250101_120000_absente.png",
+                             "cards_ai/Emma_doré_20250102_120000_bloquee.png"]:
+            manifest.record(name, base + name)
+        store.put(base + names[0], None, [{"width": 256, "url": base + "cards_thumbs/w256/Lucas.webp"}])
+        cache.put('prompt-lucas', base + names[0])
+        cache.put('prompt-emma', base + "cards_ai/Emma_doré_20250102_120000_bloquee.png")
+        
+        # Filtre du manifeste: 5 cartes + 1 miniature en batchs de 2, en parallèle
+        report = delete_images(player='lucas', batch_size=2, concurrency=3)
+        assert (report['requested'], report['deleted'], report['failed']) == (6, 6, 0)
+        assert sorted(len(batch) for batch in bucket.batches) == [2, 2, 2]
+        assert "cards_thumbs/w256/Lucas.webp" in sum(bucket.batches, [])
+        assert not manifest.query(player='lucas')['cards']
+        assert store.get(base + names[0]) is None
+        assert cache.get('prompt-lucas') is None  # Plus servie par le cache d'images
+        
+        # Résultat par objet: déjà absente, en échec (gardée au manifeste et en cache), URL invalide
+        report = delete_images(urls=["https://example.com/x.png"], card_color='doré')
+        statuses = {result['name']: result['status'] for result in report['results']}
+        assert statuses == {None: 'invalid_url',
+                            "cards_ai/Emma_doré_20250101_120000_absente.png": 'not_found',
+                            "cards_ai/Emma_doré_20250102_120000_bloquee.png": 'error'}
+        assert report['failed'] == 2 and len(manifest.query(card_color='doré')['cards']) == 1
+        assert cache.get('prompt-emma') is not None
+        
+        # Sans URL ni filtre: rien n'est supprimé
+        batches = len(bucket.batches)
+        assert delete_images()['requested'] == 0 and len(bucket.batches) == batches
+    
+    print("✅ Suppression en masse fonctionnelle")
+
+def test_card_renderer():
+    """Test la composition locale des cartes avec Pillow (sans appel DALL·E)."""
+    import tempfile
+    import card_pipeline
+    from PIL import Image
+    from card_renderer import CARD_COLORS, CARD_SIZE, get_background, render_card
+    from generation_log import GenerationLog
+    from rules import apply_squadfield_rules
+    
+    player = {
+        "prenom": "TestPlayer", "age": 16, "sport": "football",
+        "stats": {"technique": 85, "vitesse": 90, "physique": 80,
+                  "tirs": 88, "defense": 84, "passe": 92}
+    }
+    enriched = apply_squadfield_rules(player)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        import video_analysis
+        from video_analysis import AnalysisCache, compute_analysis_key
+        photo_path = os.path.join(tmp, "photo.jpg")
+        Image.new('RGB', (300, 400), (200, 50, 50)).save(photo_path)
+        
+        # Un fond par couleur, construit une seule fois
+        for color in CARD_COLORS:
+            card = render_card(dict(enriched, card_color=color), photo_path)
+            assert card.size == CARD_SIZE
+            assert get_background(color) is get_background(color)
+        
+        # Pipeline en mode local: aucune génération DALL·E
+        os.environ['CARD_OUTPUT_DIR'] = tmp
+        original_upload = card_pipeline.upload_image_from_bytes
+        original_dalle = card_pipeline.generate_dalle_image
+        original_log = card_pipeline.get_generation_log
+        original_derivatives = card_pipeline.create_card_derivatives
+        original_frames, original_cache = card_pipeline.extract_video_frames, video_analysis._analysis_cache
+        video_analysis._analysis_cache = AnalysisCache(db_path=os.path.join(tmp, 'analysis.db'))
+        video_analysis._analysis_cache.put(compute_analysis_key('sha-clip', 16, 'football'),
+                                           dict(player['stats'], technique=95))
+        decoded = []
+        card_pipeline.extract_video_frames = lambda path: decoded.append(path) or []
+        test_log = GenerationLog(log_dir=tmp, flush_interval=0.01)
+        card_pipeline.upload_image_from_bytes = lambda data, name, color: "https://example.com/local.png"
+        card_pipeline.generate_dalle_image = lambda *args: None
+        card_pipeline.get_generation_log = lambda: test_log
+        card_pipeline.create_card_derivatives = lambda url, name, color, image_bytes=None: {
+            "card_url": url, "placeholder": None, "variants": [], "local": image_bytes is not None
+        }
+        try:
+            stages = []
+            # Analyse de la vidéo déjà en cache: la vidéo n'est pas décodée
+            result = card_pipeline.run_card_generation(
+                dict(player, renderer='local', photo_path=photo_path,
+                     video_path=os.path.join(tmp, 'clip.mp4'), video_sha256='sha-clip'),
+                report_stage=lambda stage, **artifacts: stages.append(stage)
+            )
+        finally:
+            card_pipeline.upload_image_from_bytes = original_upload
+            card_pipeline.generate_dalle_image = original_dalle
+            card_pipeline.get_generation_log = original_log
+            card_pipeline.create_card_derivatives = original_derivatives
+            card_pipeline.extract_video_frames = original_frames
+            video_analysis._analysis_cache = original_cache
+            del os.environ['CARD_OUTPUT_DIR']
+        test_log.close()
+        
+        assert result['renderer'] == 'local'
+        assert result['dalle_url'] is None
+        assert result['firebase_url'] == "https://example.com/local.png"
+        assert os.path.exists(result['card_path'])
+        assert stages[-3:] == ['image_generated', 'firebase_uploaded', 'derivatives_built']
+        assert result['derivatives']['local']  # Miniatures produites depuis la carte locale
+        assert decoded == [] and result['stats_source'] == 'cache'
+        assert 'frames_extracted' not in stages and 'stats_analyzed' in stages
+        assert next(test_log.records())['renderer'] == 'local'
+    
+    print("✅ Composition locale des cartes fonctionnelle")
+
+def test_card_derivatives():
+    """Test les miniatures des cartes (largeurs fixes, WebP/AVIF, aperçu flou)."""
+    import tempfile
+    from io import BytesIO
+    from PIL import Image
+    import card_derivatives
+    from card_derivatives import (build_derivatives, available_formats, create_card_derivatives,
+                                  DerivativeStore)
+    
+    buffer = BytesIO()
+    Image.new('RGB', (1024, 1024), (30, 120, 60)).save(buffer, format='PNG')
+    card_bytes = buffer.getvalue()
+    
+    formats = available_formats(['webp', 'avif', 'gif'])
+    assert 'webp' in formats and 'gif' not in formats
+    built = build_derivatives(card_bytes, [256, 512, 2048], formats)
+    # Pas d'agrandissement: 2048 ignorée
+    assert sorted({variant['width'] for variant in built['variants']}) == [256, 512]
+    assert len(built['variants']) == 2 * len(formats)
+    smallest = min(len(variant['data']) for variant in built['variants'])
+    assert smallest * 10 < len(card_bytes)
+    webp = next(variant for variant in built['variants'] if variant['format'] == 'webp')
+    assert Image.open(BytesIO(webp['data'])).size == (webp['width'], webp['height'])
+    assert built['placeholder'].startswith('data:image/webp;base64,') and len(built['placeholder']) < 2000
+    
+    # Pool de processus + upload + registre par URL de carte
+    uploads = []
+    def fake_upload(data, name, color, file_extension='.png', prefix='cards_ai'):
+        uploads.append((prefix, file_extension))
+        return f"https://example.com/{prefix}/{name}{file_extension}"
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = card_derivatives._derivative_store, card_derivatives.upload_image_from_bytes
+        card_derivatives._derivative_store = DerivativeStore(db_path=os.path.join(tmp, 'derivatives.db'))
+        card_derivatives.upload_image_from_bytes = fake_upload
+        os.environ['CARD_THUMB_FORMATS'] = 'webp'
+        try:
+            record = create_card_derivatives('https://example.com/card.png', 'Lucas', 'vert',
+                                             image_bytes=card_bytes)
+            assert [variant['width'] for variant in record['variants']] == [256, 512]
+            assert uploads == [('cards_thumbs/w256', '.webp'), ('cards_thumbs/w512', '.webp')]
+            # Déjà produites: ni calcul ni upload
+            assert create_card_derivatives('https://example.com/card.png', 'Lucas', 'vert',
+                                           image_bytes=card_bytes) == record
+            assert len(uploads) == 2
+            stored = card_derivatives.get_derivative_store().get_many(['https://example.com/card.png'])
+            assert stored['https://example.com/card.png']['placeholder'] == record['placeholder']
+            assert create_card_derivatives(None, 'Lucas', 'vert') is None
+        finally:
+            card_derivatives._derivative_store, card_derivatives.upload_image_from_bytes = previous
+            del os.environ['CARD_THUMB_FORMATS']
+    
+    print("✅ Miniatures des cartes fonctionnelles")
+
+def test_background_atlas():
+    """Test la pré-génération de l'atlas de fonds et son cache LRU."""
+    import tempfile
+    from background_atlas import BackgroundAtlas, build_atlas
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        atlas = BackgroundAtlas(atlas_dir=tmp, max_entries=2)
+        summary = build_atlas(colors=['doré', 'star'], categories=['U12', 'Elite'],
+                              variants=2, source='local', upload=False, atlas=atlas)
+        assert summary['generated'] == 8
+        assert len(summary['manifest']['star']['Elite']) == 2
+        
+        # Déjà présents: pas de régénération
+        again = build_atlas(colors=['doré'], categories=['U12'], variants=2,
+                            source='local', upload=False, atlas=atlas)
+        assert again['generated'] == 0 and again['skipped'] == 2
+        
+        # Nouveau processus: index relu sur disque, cache LRU borné
+        reloaded = BackgroundAtlas(atlas_dir=tmp, max_entries=2)
+        assert reloaded.stats()['backgrounds'] == 8
+        assert reloaded.preload() == 2
+        background = reloaded.get('doré', 'U12', seed="TestPlayer")
+        assert background is reloaded.get('doré', 'U12', seed="TestPlayer")
+        assert reloaded.get('gris', 'U12') is None
+        reloaded.get('star', 'Elite', seed="A")
+        reloaded.get('star', 'U12', seed="B")
+        assert reloaded.stats()['in_memory'] == 2
+    
+    print("✅ Atlas de fonds fonctionnel")
+
+def test_metrics():
+    """Test les métriques par étape et leur exposition Prometheus."""
+    from metrics import Registry, Histogram, Counter, Gauge
+    
+    registry = Registry()
+    durations = registry.register(Histogram('test_stage_seconds', "Durées", ['stage'], buckets=(0.1, 1.0)))
+    cards = registry.register(Counter('test_cards_total', "Cartes", ['outcome', 'card_color']))
+    in_flight = registry.register(Gauge('test_in_flight', "En cours", ['kind']))
+    registry.register_collector(lambda: [('test_jobs', 'gauge', "Jobs", [({"status": "queued"}, 3)])])
+    
+    durations.observe(0.05, stage="rules")
+    durations.observe(0.5, stage="rules")
+    durations.observe(30, stage="dalle")
+    with durations.time(stage="prompt"):
+        pass
+    cards.inc(outcome="success", card_color="doré")
+    with in_flight.track(kind="dalle"):
+        assert in_flight.value(kind="dalle") == 1
+    
+    text = registry.render()
+    assert '# TYPE test_stage_seconds histogram' in text
+    assert 'test_stage_seconds_bucket{stage="rules",le="0.1"} 1' in text
+    assert 'test_stage_seconds_bucket{stage="rules",le="1"} 2' in text
+    assert 'test_stage_seconds_bucket{stage="dalle",le="+Inf"} 1' in text
+    assert 'test_stage_seconds_count{stage="prompt"} 1' in text
+    assert 'test_cards_total{outcome="success",card_color="doré"} 1' in text
+    assert 'test_in_flight{kind="dalle"} 0' in text
+    assert 'test_jobs{status="queued"} 3' in text
+    
+    try:
+        cards.inc(outcome="success")
+        return False
+    except ValueError:
+        pass
+    
+    print("✅ Métriques Prometheus fonctionnelles")
+
+def test_generation_log():
+    """Test le journal append-only des générations, sa rotation et ses requêtes."""
+    import json
+    import tempfile
+    import threading
+    from generation_log import GenerationLog, aggregate
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        log = GenerationLog(log_dir=tmp, max_bytes=2000, flush_interval=0.01)
+        
+        # Ancien format: un fichier JSON par génération
+        with open(os.path.join(tmp, 'generation_20240101_120000.json'), 'w', encoding='utf-8') as f:
+            json.dump({"timestamp": "2024-01-01T12:00:00", "player": "Ancien",
+                       "card_color": "gris", "success": True}, f)
+        assert log.import_legacy(remove=True) == 1
+        
+        # Générations simultanées: aucune n'écrase une autre
+        def write(worker):
+            for i in range(25):
+                log.append({"timestamp": f"2025-06-{10 + i % 5:02d}T10:00:00.{worker:02d}{i:04d}",
+                            "player": f"Joueur{worker}", "card_color": "doré" if i % 2 else "vert",
+                            "age_category": "U12", "overall_score": 90, "success": i % 5 != 0})
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.flush()
+        log.close()
+        
+        assert any('generations-' in path for path in log.files())  # Archivage par taille
+        assert sum(1 for _ in log.records()) == 101
+        assert len(list(log.query(player="joueur1"))) == 25
+        assert len(list(log.query(card_color="doré", success=False))) == 8
+        assert len(list(log.query(since="2025-06-12", until="2025-06-14"))) == 40
+        
+        stats = aggregate(log.query(since="2025"))
+        assert stats['total'] == 100 and stats['failures'] == 20
+        assert stats['success_rate'] == 0.8
+        assert stats['by_color'] == {"doré": 48, "vert": 52}
+    
+    # Trafic continu: les lots sont écrits à échéance, sans attendre un silence
+    with tempfile.TemporaryDirectory() as tmp:
+        import time
+        log = GenerationLog(log_dir=tmp, flush_interval=0.1)
+        stop = threading.Event()
+        def steady():
+            while not stop.is_set():
+                log.append({"player": "Continu", "success": True})
+                time.sleep(0.005)
+        writer = threading.Thread(target=steady)
+        writer.start()
+        try:
+            deadline = time.monotonic() + 2
+            while not os.path.exists(log.path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert os.path.exists(log.path)
+        finally:
+            stop.set()
+            writer.join()
+            log.close()
+        
+        # Lot plein: écrit sans attendre flush_interval
+        log = GenerationLog(log_dir=os.path.join(tmp, 'batch'), flush_interval=60, max_batch=5)
+        for i in range(5):
+            log.append({"player": f"Joueur{i}", "success": True})
+        deadline = time.monotonic() + 2
+        while sum(1 for _ in log.records()) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sum(1 for _ in log.records()) == 5
+        log.close()
+    
+    print("✅ Journal des générations fonctionnel")
+
+def test_roster_store():
+    """Test l'effectif indexé: recherche par prénom, filtres et mises à jour incrémentales."""
+    import json
+    import tempfile
+    from roster_store import RosterStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        roster_path = os.path.join(tmp, 'roster.json')
+        players = [
+            {"prenom": "Auguste", "age": 10, "sport": "football",
+             "stats": {"technique": 95, "vitesse": 95, "physique": 95, "tirs": 95, "defense": 95, "passe": 95}},
+            {"prenom": "Léa", "age": 15, "sport": "Basketball",
+             "stats": {"technique": 40, "vitesse": 40, "physique": 40, "tirs": 40, "defense": 40, "passe": 40}},
+            {"prenom": "Nino", "age": 10, "sport": "football",
+             "stats": {"technique": 40, "vitesse": 40, "physique": 40, "tirs": 40, "defense": 40, "passe": 40}},
+            {"age": 12}  # Entrée invalide: conservée mais non indexée
+        ]
+        with open(roster_path, 'w', encoding='utf-8') as f:
+            json.dump(players, f)
+        
+        store = RosterStore(roster_path)
+        assert store.get("  AUGUSTE ")['prenom'] == "Auguste"
+        assert store.get("léa")['sport'] == "Basketball"
+        assert store.get("Inconnu") is None
+        assert len(store.all()) == 4
+        
+        assert [p['prenom'] for p in store.query(sport="FOOTBALL")] == ["Auguste", "Nino"]
+        assert [p['prenom'] for p in store.query(sport="football", card_color="gris")] == ["Nino"]
+        assert [p['prenom'] for p in store.query(age_category="U15")] == ["Léa"]
+        assert store.query(sport="rugby") == []
+        
+        # Mises à jour incrémentales sans reparse du fichier
+        assert store.upsert(dict(players[2], sport="rugby")) is True
+        assert store.query(sport="football")[0]['prenom'] == "Auguste"
+        assert store.query(sport="rugby")[0]['prenom'] == "Nino"
+        assert store.upsert({"prenom": "Zoé", "age": 30, "sport": "rugby", "stats": {}}) is False
+        assert store.remove("auguste") and store.get("Auguste") is None
+        assert "football" not in store.stats()['sports']
+        
+        # Écriture atomique, puis rechargement si le fichier change ailleurs
+        assert store.save()
+        assert RosterStore(roster_path).get("zoé")['age'] == 30
+        with open(roster_path, 'w', encoding='utf-8') as f:
+            json.dump(players[:1], f)
+        assert store.load() and store.names() == ["Auguste"]
+    
+    print("✅ Effectif indexé fonctionnel")
+
+def test_scratch_space():
+    """Test l'écriture des uploads dans l'espace de travail: hash, quotas et nettoyage."""
+    import io
+    import hashlib
+    import tempfile
+    from flask import Flask, request, jsonify
+    import scratch_space
+    from scratch_space import ScratchSpace, ScratchRequest, ScratchQuotaError
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        space = ScratchSpace(root=tmp, max_request_bytes=64 * 1024, max_total_bytes=100 * 1024)
+        previous, scratch_space._scratch_space = scratch_space._scratch_space, space
+        try:
+            app = Flask('test_scratch')
+            app.request_class = ScratchRequest
+            app.teardown_request(lambda exc: request.discard_scratch_files())
+            
+            @app.route('/upload', methods=['POST'])
+            def upload():
+                try:
+                    files = request.files
+                except ScratchQuotaError as e:
+                    return jsonify({"error": str(e)}), e.status
+                path, digest = files['photo'].stream.keep()
+                return jsonify({"path": path, "sha256": digest, "video": files['video'].stream.path})
+            
+            client = app.test_client()
+            photo = os.urandom(20 * 1024)
+            response = client.post('/upload', data={
+                'photo': (io.BytesIO(photo), 'Léa photo.JPG'),
+                'video': (io.BytesIO(b'video' * 1000), 'clip.mp4')
+            }, content_type='multipart/form-data')
+            body = response.get_json()
+            
+            # Fichier gardé: nom unique, extension conservée, hash calculé pendant l'écriture
+            assert response.status_code == 200
+            assert body['sha256'] == hashlib.sha256(photo).hexdigest()
+            assert body['path'].startswith(space.process_dir) and body['path'].endswith('.jpg')
+            with open(body['path'], 'rb') as f:
+                assert f.read() == photo
+            # Fichier non transmis: supprimé en fin de requête
+            assert not os.path.exists(body['video'])
+            assert space.stats()['used_bytes'] == len(photo)
+            
+            # Quota par requête (413) puis quota global (507)
+            response = client.post('/upload', data={
+                'photo': (io.BytesIO(os.urandom(70 * 1024)), 'big.png'),
+                'video': (io.BytesIO(b'v'), 'clip.mp4')
+            }, content_type='multipart/form-data')
+            assert response.status_code == 413
+            second = client.post('/upload', data={
+                'photo': (io.BytesIO(os.urandom(40 * 1024)), 'second.png'),
+                'video': (io.BytesIO(b'v'), 'clip.mp4')
+            }, content_type='multipart/form-data').get_json()
+            response = client.post('/upload', data={
+                'photo': (io.BytesIO(os.urandom(50 * 1024)), 'big.png'),
+                'video': (io.BytesIO(b'v'), 'clip.mp4')
+            }, content_type='multipart/form-data')
+            assert response.status_code == 507
+            assert space.stats()['used_bytes'] == len(photo) + 40 * 1024
+            assert len(os.listdir(space.process_dir)) == 2
+            
+            assert space.discard(body['path']) and space.discard(second['path'])
+            assert space.stats()['used_bytes'] == 0
+            assert not space.discard('/etc/hosts')
+            
+            # Nettoyage au démarrage: dossier d'un processus arrêté, sauf fichiers à reprendre
+            dead_dir = os.path.join(tmp, '999999999')
+            os.makedirs(dead_dir)
+            for name in ('a.jpg', 'b.mp4'):
+                with open(os.path.join(dead_dir, name), 'wb') as f:
+                    f.write(b'x' * 10)
+            assert space.cleanup_stale(keep=[os.path.join(dead_dir, 'b.mp4')]) == 1
+            assert os.listdir(dead_dir) == ['b.mp4'] and space.stats()['used_bytes'] == 10
+        finally:
+            scratch_space._scratch_space = previous
+    
+    print("✅ Espace de travail des uploads fonctionnel")
+
+def test_video_frames():
+    """Test l'extraction d'images clés des vidéos (changements de scène, pas fixe, budget)."""
+    import tempfile
+    import scratch_space
+    from scratch_space import ScratchSpace
+    import video_frames
+    from video_frames import extract_keyframes, extract_video_frames, best_portrait_frame
+    
+    if not video_frames.is_available():
+        print("⚠️ OpenCV absent: extraction vidéo non testée")
+        return
+    
+    import cv2
+    import numpy as np
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Trois plans de 10 images (gris foncé, gris clair, damier net)
+        video_path = os.path.join(tmp, 'clip.mp4')
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (320, 240))
+        checker = (np.indices((240, 320)).sum(axis=0) // 20 % 2 * 255).astype(np.uint8)
+        for i in range(30):
+            if i < 10:
+                frame = np.full((240, 320, 3), 40, np.uint8)
+            elif i < 20:
+                frame = np.full((240, 320, 3), 200, np.uint8)
+            else:
+                frame = cv2.cvtColor(checker, cv2.COLOR_GRAY2BGR)
+            writer.write(frame)
+        writer.release()
+        
+        result = extract_keyframes(video_path, max_frames=3, mode='scene', max_width=160)
+        assert result['frame_count'] == 30 and not result['truncated']
+        assert [frame['index'] for frame in result['frames']] == [0, 10, 20]
+        assert result['frames'][1]['timestamp_ms'] == 1000
+        assert all(frame['jpeg'][:2] == b'\xff\xd8' for frame in result['frames'])
+        decoded = cv2.imdecode(np.frombuffer(result['frames'][0]['jpeg'], np.uint8), cv2.IMREAD_COLOR)
+        assert decoded.shape[1] == 160  # Réduite à max_width
+        
+        result = extract_keyframes(video_path, max_frames=5, mode='stride')
+        assert [frame['index'] for frame in result['frames']] == [3, 9, 15, 21, 27]
+        
+        # Budget de temps épuisé: arrêt immédiat, résultat partiel signalé
+        assert extract_keyframes(video_path, time_budget=1e-9)['truncated']
+        
+        # Pool de processus + enregistrement dans l'espace de travail
+        space = ScratchSpace(root=os.path.join(tmp, 'scratch'))
+        previous, scratch_space._scratch_space = scratch_space._scratch_space, space
+        try:
+            frames = extract_video_frames(video_path, max_frames=3, time_budget=30)
+            assert [frame['index'] for frame in frames] == [0, 10, 20]
+            assert all(os.path.exists(frame['path']) for frame in frames)
+            assert best_portrait_frame(frames)['index'] == 20
+            assert extract_video_frames(os.path.join(tmp, 'absente.mp4')) == []
+            for frame in frames:
+                space.discard(frame['path'])
+        finally:
+            scratch_space._scratch_space = previous
+    
+    print("✅ Extraction d'images clés fonctionnelle")
+
+def test_video_analysis():
+    """Test l'analyse des stats par GPT-4 et son cache par hash de vidéo."""
+    import tempfile
+    import video_analysis
+    from video_analysis import AnalysisCache, parse_analysis_stats, compute_analysis_key, analyze_video_stats
+    
+    # Réponse JSON, éventuellement dans un bloc ```json```, stats bornées et arrondies
+    stats, analysis = parse_analysis_stats(
+        'Voici: ```json\n{"technique": 81.6, "vitesse": 70, "physique": 65, "tirs": 120, '
+        '"defense": -3, "passe": "77", "analyse": "Bon appui"}\n```'
+    )
+    assert stats == {"technique": 82, "vitesse": 70, "physique": 65, "tirs": 100, "defense": 0, "passe": 77}
+    assert analysis == {"analyse": "Bon appui"}
+    for invalid in ('pas de json', '{"technique": 80}', '{"technique": "x", "vitesse": 1}'):
+        try:
+            parse_analysis_stats(invalid)
+            assert False, f"Réponse acceptée: {invalid}"
+        except ValueError:
+            pass
+    
+    assert compute_analysis_key('abc', 15, 'football', 'gpt-4o') == compute_analysis_key('abc', 15, 'Football', 'gpt-4o')
+    assert compute_analysis_key('abc', 15, 'football', 'gpt-4o') != compute_analysis_key('abc', 15, 'football', 'gpt-4o-mini')
+    # Même clip pour un autre âge ou un autre sport: autre analyse
+    assert compute_analysis_key('abc', 15, 'football') != compute_analysis_key('abc', 30, 'football')
+    assert compute_analysis_key('abc', 15, 'football') != compute_analysis_key('abc', 15, 'basket')
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Éviction LRU au-delà de max_bytes
+        cache = AnalysisCache(db_path=os.path.join(tmp, 'analysis.db'), max_bytes=500)
+        for i in range(3):
+            cache.put(f"cle{i}", stats, {"analyse": "x" * 50})
+        assert cache.get('cle0') is not None  # cle0 redevient la plus récente
+        cache.put('cle3', stats, {"analyse": "x" * 50})
+        assert cache.get('cle1') is None and cache.get('cle0') is not None
+        assert cache.stats()['bytes'] <= 500
+        
+        # Un seul appel au modèle pour deux uploads du même clip
+        calls = []
+        def fake_request(player_data, frames):
+            calls.append(len(frames))
+            return '{"technique": 90, "vitesse": 88, "physique": 70, "tirs": 85, "defense": 60, "passe": 80}'
+        
+        player = {"prenom": "Lucas", "age": 15, "sport": "football"}
+        frames = [{"path": os.path.join(tmp, 'frame.jpg')}]
+        previous = video_analysis._analysis_cache, video_analysis.request_analysis
+        video_analysis._analysis_cache = AnalysisCache(db_path=os.path.join(tmp, 'run.db'))
+        video_analysis.request_analysis = fake_request
+        try:
+            first = analyze_video_stats(player, frames, 'sha-clip')
+            second = analyze_video_stats(player, frames, 'sha-clip')
+            assert calls == [1] and not first['cached'] and second['cached']
+            assert second['stats']['technique'] == 90
+            assert video_analysis.get_cached_analysis(player, 'sha-clip')['cached']
+            assert video_analysis.get_cached_analysis(dict(player, age=30), 'sha-clip') is None
+            analyze_video_stats(dict(player, sport="basket"), frames, 'sha-clip')
+            assert calls == [1, 1]
+            # Hors ligne (rendu local): cache seulement
+            assert analyze_video_stats(player, frames, 'autre-clip', allow_api=False) is None
+            assert analyze_video_stats(player, [], 'sha-clip') is None
+            # Réponse inexploitable: None, les stats d'origine restent en place
+            video_analysis.request_analysis = lambda player_data, frames: 'désolé'
+            assert analyze_video_stats(player, frames, 'clip-3') is None
+        finally:
+            video_analysis._analysis_cache, video_analysis.request_analysis = previous
+    
+    print("✅ Analyse vidéo et cache fonctionnels")
+
+def test_app_startup():
+    """Test l'initialisation du serveur: une seule fois par processus, en arrière-plan dès la première requête."""
+    import time
+    import threading
+    import app as app_module
+    
+    calls = []
+    gate = threading.Event()
+    class Fake:
+        def __getattr__(self, name):
+            def call(*args, **kwargs):
+                if name == 'preload':
+                    gate.wait(5)  # Chargement lent: la requête ne l'attend pas
+                calls.append(name)
+                return []
+            return call
+    
+    fake = Fake()
+    names = ('get_background_atlas', 'get_roster_store', 'get_card_manifest', 'get_scratch_space', 'job_queue')
+    previous = {name: getattr(app_module, name) for name in names}
+    previous_done, previous_testing = app_module._startup_done, app_module.app.config.get('TESTING')
+    fake.store = fake
+    for name in names:
+        setattr(app_module, name, fake if name == 'job_queue' else (lambda: fake))
+    app_module._startup_done = False
+    app_module.app.config['TESTING'] = False
+    try:
+        client = app_module.app.test_client()
+        client.get('/health')
+        client.get('/health')
+        assert 'recover' not in calls
+        gate.set()
+        # Reprise des jobs sans reloader Flask ni __main__ (gunicorn, debug désactivé)
+        deadline = time.monotonic() + 5
+        while 'recover' not in calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert calls.count('recover') == 1 and calls.count('cleanup_stale') == 1
+        assert not app_module.startup()
+    finally:
+        for name, value in previous.items():
+            setattr(app_module, name, value)
+        app_module._startup_done = previous_done
+        app_module.app.config['TESTING'] = previous_testing
+    
+    print("✅ Initialisation du serveur fonctionnelle")
+
 def test_config():
     """Test la configuration du système."""
     try:
@@ -133,7 +1636,32 @@ def main():
     tests = [
         ("Import des modules", test_imports),
         ("Règles SquadField", test_player_rules),
+        ("Calcul des règles en masse", test_bulk_scoring),
+        ("Règles versionnées", test_rules_versions),
+        ("Schéma joueur", test_player_schema),
         ("Génération de prompt", test_prompt_generation),
+        ("File de jobs", test_job_queue),
+        ("Reprise multi-processus", test_job_recovery_processes),
+        ("Flux d'étapes SSE", test_job_events),
+        ("Cache d'images", test_image_cache),
+        ("Coalescence", test_singleflight),
+        ("Préparation d'effectif", test_roster_preparation),
+        ("Ordonnanceur OpenAI", test_openai_scheduler),
+        ("Disjoncteurs", test_circuit_breaker),
+        ("Upload en streaming", test_streaming_upload),
+        ("Déduplication des uploads", test_upload_dedup),
+        ("Manifeste des cartes", test_card_manifest),
+        ("Suppression en masse", test_bulk_delete),
+        ("Composition locale", test_card_renderer),
+        ("Miniatures des cartes", test_card_derivatives),
+        ("Atlas de fonds", test_background_atlas),
+        ("Métriques", test_metrics),
+        ("Journal des générations", test_generation_log),
+        ("Effectif indexé", test_roster_store),
+        ("Espace de travail des uploads", test_scratch_space),
+        ("Images clés vidéo", test_video_frames),
+        ("Analyse vidéo", test_video_analysis),
+        ("Initialisation du serveur", test_app_startup),
         ("Configuration", test_config),
     ]
     
@@ -141,11 +1669,13 @@ def main():
     for test_name, test_func in tests:
         print(f"🔍 Test: {test_name}")
         try:
-            result = test_func()
+            # Les tests à assertions ne retournent rien: seul False ou une exception est un échec
+            result = test_func() is not False
             results.append(result)
             print(f"{'✅' if result else '❌'} {test_name}: {'PASS' if result else 'FAIL'}\n")
         except Exception as e:
-            print(f"💥 Erreur inattendue dans {test_name}: {e}\n")
+            traceback.print_exc()
+            print(f"💥 Échec de {test_name}: {e!r}\n")
             results.append(False)
     
     # Résumé
@@ -0,0 +1,156 @@
+"""
+Index local des objets déjà stockés sur Firebase, adressé par le contenu.
+
+Une image aux octets identiques (même carte régénérée, fond d'atlas renvoyé,
+vidéo reuploadée) n'est stockée qu'une fois : la clé est le SHA-256 du contenu
+et le dossier de destination, la valeur l'URL publique de l'objet existant.
+Un doublon évite l'upload et l'appel make_public.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_index (
+    sha256 TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    object_name TEXT NOT NULL,
+    public_url TEXT NOT NULL,
+    size INTEGER,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (sha256, prefix)
+);
+CREATE INDEX IF NOT EXISTS idx_upload_index_url ON upload_index(public_url);
+"""
+
+
+def hash_bytes(data):
+    """SHA-256 hexadécimal de données binaires."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_obj, chunk_size=1024 * 1024):
+    """
+    SHA-256 hexadécimal d'un fichier ouvert, lu par blocs depuis le début.
+
+    Args:
+        file_obj (file): Fichier binaire (repositionné au début après lecture)
+        chunk_size (int): Taille des blocs lus
+
+    Returns:
+        tuple: (sha256, taille en octets)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest(), size
+
+
+def is_dedup_enabled():
+    """La déduplication peut être désactivée globalement avec UPLOAD_DEDUP_ENABLED=false."""
+    return os.getenv('UPLOAD_DEDUP_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+class UploadIndex:
+    """
+    Index (SHA-256, dossier) -> objet Firebase, persisté dans SQLite.
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str, optional): Base SQLite (défaut: UPLOAD_INDEX_DB_PATH ou data/upload_index.db)
+        """
+        self.db_path = db_path or os.getenv('UPLOAD_INDEX_DB_PATH', 'data/upload_index.db')
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def get(self, sha256, prefix):
+        """
+        Cherche un objet déjà stocké.
+
+        Args:
+            sha256 (str): Hash du contenu
+            prefix (str): Dossier de destination dans le bucket
+
+        Returns:
+            dict: {object_name, public_url, size}, None si absent
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT object_name, public_url, size FROM upload_index WHERE sha256 = ? AND prefix = ?",
+                (sha256, prefix)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put(self, sha256, prefix, object_name, public_url, size=None):
+        """
+        Enregistre un objet uploadé et rendu public.
+
+        Args:
+            sha256 (str): Hash du contenu
+            prefix (str): Dossier de destination dans le bucket
+            object_name (str): Nom de l'objet dans le bucket
+            public_url (str): URL publique de l'objet
+            size (int, optional): Taille en octets
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO upload_index (sha256, prefix, object_name, public_url, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, prefix, object_name, public_url, size, time.time())
+            )
+            self._conn.commit()
+
+    def forget(self, object_name):
+        """
+        Retire un objet supprimé du bucket (il ne doit plus servir de doublon).
+
+        Returns:
+            int: Nombre d'entrées retirées
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM upload_index WHERE object_name = ?", (object_name,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        """Retourne le nombre d'objets indexés et leur taille totale."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM upload_index"
+            ).fetchone()
+        return {"objects": row[0], "bytes": row[1]}
+
+
+_upload_index = None
+_upload_index_lock = threading.Lock()
+
+
+def get_upload_index():
+    """
+    Retourne l'index des uploads partagé du processus.
+
+    Returns:
+        UploadIndex: Instance unique, créée au premier appel
+    """
+    global _upload_index
+    with _upload_index_lock:
+        if _upload_index is None:
+            _upload_index = UploadIndex()
+        return _upload_index
@@ -100,10 +100,11 @@ def test_rules_system():
             'club': 'Test Club',
             'stats': {
                 'technique': 85,
-                'physique': 80,
-                'mental': 90,
                 'vitesse': 88,
-                'tir': 82
+                'physique': 80,
+                'tirs': 82,
+                'defense': 74,
+                'passe': 86
             }
         }
         
@@ -149,10 +150,11 @@ def test_prompt_system():
             'card_color': 'bronze',
             'stats': {
                 'technique': 85,
-                'physique': 80,
-                'mental': 90,
                 'vitesse': 88,
-                'tir': 82
+                'physique': 80,
+                'tirs': 82,
+                'defense': 74,
+                'passe': 86
             }
         }
         
@@ -0,0 +1,330 @@
+"""
+Statistiques d'un joueur analysées par GPT-4 à partir des images clés de sa vidéo.
+
+Le modèle d'analyse reçoit le prompt de build_gpt4_analysis_prompt et les
+images clés extraites par video_frames, et répond en JSON. Le résultat est mis
+en cache par hash du contenu de la vidéo (SHA-256 calculé à l'upload) : un
+même clip renvoyé pour un joueur de même âge et même sport n'est pas réanalysé. Le cache est une base SQLite bornée en
+octets, avec éviction des entrées les moins récemment utilisées.
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import sqlite3
+import hashlib
+import threading
+
+from player_schema import STAT_NAMES
+from prompt_builder import build_gpt4_analysis_prompt
+from openai_scheduler import get_analysis_scheduler, is_retryable
+from circuit_breaker import get_breaker
+from metrics import time_stage, IN_FLIGHT
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key TEXT PRIMARY KEY,
+    stats TEXT NOT NULL,
+    analysis TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used ON analysis_cache(last_used);
+"""
+
+# Même disjoncteur que la génération d'images : une panne OpenAI coupe les deux
+openai_breaker = get_breaker('openai', error_filter=is_retryable)
+
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+def get_analysis_model():
+    """Modèle d'analyse (ANALYSIS_MODEL, défaut gpt-4o)."""
+    return os.getenv('ANALYSIS_MODEL', 'gpt-4o')
+
+
+def is_analysis_enabled():
+    """L'analyse peut être désactivée globalement avec VIDEO_ANALYSIS_ENABLED=false."""
+    return os.getenv('VIDEO_ANALYSIS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+def compute_analysis_key(video_sha256, age=None, sport=None, model=None):
+    """
+    Calcule la clé de cache d'une analyse.
+
+    L'âge et le sport font partie du prompt d'analyse : un même clip annoncé
+    pour un autre joueur est réanalysé.
+
+    Args:
+        video_sha256 (str): SHA-256 du contenu de la vidéo
+        age (int, optional): Âge du joueur
+        sport (str, optional): Sport du joueur (insensible à la casse)
+        model (str, optional): Modèle d'analyse (défaut: get_analysis_model())
+
+    Returns:
+        str: Hash SHA-256 hexadécimal
+    """
+    material = json.dumps({
+        "video": video_sha256,
+        "age": age,
+        "sport": (sport or '').strip().casefold(),
+        "model": model or get_analysis_model(),
+        "stats": STAT_NAMES
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def parse_analysis_stats(text):
+    """
+    Extrait les statistiques de la réponse JSON du modèle d'analyse.
+
+    Args:
+        text (str): Réponse du modèle (JSON seul ou dans un bloc ```json```)
+
+    Returns:
+        tuple: (stats, analysis) - les six stats en entiers bornés à 0-100, et le
+               reste de la réponse (analyse, points_forts, ameliorations, ...)
+
+    Raises:
+        ValueError: Si la réponse n'est pas du JSON ou qu'une stat manque
+    """
+    match = _JSON_BLOCK.search(text or '')
+    if match:
+        raw = match.group(1)
+    else:
+        start, end = (text or '').find('{'), (text or '').rfind('}')
+        if start < 0 or end < start:
+            raise ValueError("Réponse d'analyse sans JSON")
+        raw = text[start:end + 1]
+
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON d'analyse invalide: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("JSON d'analyse invalide: objet attendu")
+
+    stats = {}
+    for name in STAT_NAMES:
+        try:
+            value = float(data[name])
+        except KeyError:
+            raise ValueError(f"Statistique manquante dans l'analyse: {name}")
+        except (TypeError, ValueError):
+            raise ValueError(f"Statistique invalide dans l'analyse: {name}")
+        stats[name] = min(100, max(0, round(value)))
+
+    analysis = {key: value for key, value in data.items() if key not in STAT_NAMES}
+    return stats, analysis
+
+
+class AnalysisCache:
+    """
+    Cache hash de vidéo -> statistiques analysées, persisté dans SQLite,
+    borné en octets avec éviction LRU.
+    """
+
+    def __init__(self, db_path=None, max_bytes=None):
+        """
+        Args:
+            db_path (str, optional): Base SQLite (défaut: ANALYSIS_CACHE_DB_PATH ou data/analysis_cache.db)
+            max_bytes (int, optional): Taille max des entrées (défaut: ANALYSIS_CACHE_MAX_BYTES ou 16 MB)
+        """
+        self.db_path = db_path or os.getenv('ANALYSIS_CACHE_DB_PATH', 'data/analysis_cache.db')
+        self.max_bytes = max_bytes or int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def get(self, key):
+        """
+        Cherche une analyse en cache.
+
+        Args:
+            key (str): Clé calculée par compute_analysis_key
+
+        Returns:
+            dict: {stats, analysis}, None si absente
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stats, analysis FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            self._conn.execute(
+                "UPDATE analysis_cache SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return {"stats": json.loads(row['stats']),
+                "analysis": json.loads(row['analysis']) if row['analysis'] else {}}
+
+    def put(self, key, stats, analysis=None):
+        """
+        Enregistre une analyse et évince les plus anciennes au-delà de max_bytes.
+
+        Args:
+            key (str): Clé calculée par compute_analysis_key
+            stats (dict): Statistiques analysées
+            analysis (dict, optional): Commentaires du modèle (analyse, points forts, ...)
+        """
+        stats_json = json.dumps(stats, ensure_ascii=False)
+        analysis_json = json.dumps(analysis or {}, ensure_ascii=False)
+        size = len(key) + len(stats_json.encode('utf-8')) + len(analysis_json.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, stats, analysis, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, stats_json, analysis_json, size, now, now)
+            )
+            # Éviction LRU: garde les plus récentes tant que le total tient dans max_bytes
+            self._conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, created_at DESC) AS total "
+                "FROM analysis_cache) WHERE total > ?)",
+                (self.max_bytes,)
+            )
+            self._conn.commit()
+
+    def invalidate(self, key):
+        """Supprime une entrée du cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def stats(self):
+        """Retourne le nombre d'entrées et la taille du cache."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache"
+            ).fetchone()
+        return {"entries": row[0], "bytes": row[1], "max_bytes": self.max_bytes}
+
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """
+    Retourne le cache d'analyses partagé du processus.
+
+    Returns:
+        AnalysisCache: Instance unique, créée au premier appel
+    """
+    global _analysis_cache
+    with _analysis_cache_lock:
+        if _analysis_cache is None:
+            _analysis_cache = AnalysisCache()
+        return _analysis_cache
+
+
+def _frame_part(path):
+    """Image clé JPEG en partie image_url (data URL) d'un message chat."""
+    with open(path, 'rb') as f:
+        encoded = base64.b64encode(f.read()).decode('ascii')
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}", "detail": "low"}}
+
+
+def request_analysis(player_data, frames):
+    """
+    Envoie les images clés au modèle d'analyse et retourne sa réponse brute.
+
+    Args:
+        player_data (dict): Données du joueur (prenom, age, sport)
+        frames (list): Images clés [{path, ...}] de extract_video_frames
+
+    Returns:
+        str: Réponse du modèle
+
+    Raises:
+        CircuitOpenError: Si le disjoncteur OpenAI est ouvert
+        Exception: Si l'appel échoue après les retries de l'ordonnanceur
+    """
+    # Import tardif: card_pipeline importe ce module
+    from card_pipeline import get_openai_client
+
+    prompt = build_gpt4_analysis_prompt(player_data, frame_count=len(frames))
+    content = [{"type": "text", "text": prompt}] + [_frame_part(frame['path']) for frame in frames]
+    response = openai_breaker.call(
+        get_analysis_scheduler().call,
+        get_openai_client().chat.completions.create,
+        model=get_analysis_model(),
+        messages=[{"role": "user", "content": content}],
+        response_format={"type": "json_object"},
+        temperature=0
+    )
+    return response.choices[0].message.content
+
+
+def _player_analysis_key(player_data, video_sha256):
+    """Clé de cache de l'analyse d'une vidéo pour un joueur."""
+    return compute_analysis_key(video_sha256, player_data.get('age'), player_data.get('sport'))
+
+
+def get_cached_analysis(player_data, video_sha256):
+    """
+    Cherche l'analyse d'une vidéo en cache, avant tout décodage de ses images clés.
+
+    Args:
+        player_data (dict): Données du joueur (age, sport)
+        video_sha256 (str): Hash du contenu de la vidéo
+
+    Returns:
+        dict: {stats, analysis, cached}, None si absente ou si l'analyse est désactivée
+    """
+    if not video_sha256 or not is_analysis_enabled():
+        return None
+    cached = get_analysis_cache().get(_player_analysis_key(player_data, video_sha256))
+    if not cached:
+        return None
+    print("⚡ Analyse vidéo trouvée en cache")
+    return dict(cached, cached=True)
+
+
+def analyze_video_stats(player_data, frames, video_sha256=None, allow_api=True):
+    """
+    Statistiques d'un joueur analysées à partir des images clés de sa vidéo.
+
+    Args:
+        player_data (dict): Données du joueur
+        frames (list): Images clés de extract_video_frames
+        video_sha256 (str, optional): Hash du contenu de la vidéo (clé de cache)
+        allow_api (bool): False pour ne consulter que le cache (rendu local hors ligne)
+
+    Returns:
+        dict: {stats, analysis, cached}, None si l'analyse est désactivée,
+              indisponible ou a échoué (les stats d'origine restent alors en place)
+    """
+    if not frames or not is_analysis_enabled():
+        return None
+
+    cached = get_cached_analysis(player_data, video_sha256)
+    if cached:
+        return cached
+    if not allow_api:
+        return None
+
+    print(f"🔎 Analyse GPT-4 de {len(frames)} image(s) clé(s)...")
+    try:
+        with time_stage('analysis'), IN_FLIGHT.track(kind='analysis'):
+            text = request_analysis(player_data, frames)
+        stats, analysis = parse_analysis_stats(text)
+    except Exception as e:
+        print(f"⚠️ Analyse vidéo impossible, stats d'origine conservées: {e}")
+        return None
+
+    if video_sha256:
+        get_analysis_cache().put(_player_analysis_key(player_data, video_sha256), stats, analysis)
+    return {"stats": stats, "analysis": analysis, "cached": False}
@@ -0,0 +1,255 @@
+"""
+Extraction d'images clés des vidéos uploadées (MP4/MOV), dans un pool de processus.
+
+Le décodage tourne hors des workers HTTP et des threads de génération : un
+pool de processus borné décode la vidéo image par image (une seule image
+décodée en mémoire à la fois), retient un nombre borné d'images clés par
+changement de scène ou à pas fixe, puis les réduit et les encode en JPEG pour
+l'analyse GPT-4 ou le choix d'un portrait. Chaque vidéo a un budget de temps.
+"""
+
+import os
+import time
+import heapq
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from scratch_space import get_scratch_space
+
+# OpenCV est optionnel: sans lui, les vidéos ne sont pas analysées
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+SAMPLING_MODES = ('scene', 'stride')
+
+# Taille des vignettes de comparaison entre images (détection de changement de scène)
+_THUMB_SIZE = (64, 36)
+
+
+def is_available():
+    """True si OpenCV est installé."""
+    return cv2 is not None
+
+
+def _video_options(max_frames=None, mode=None, max_width=None, jpeg_quality=None, time_budget=None):
+    """Options d'extraction, complétées par les variables d'environnement."""
+    return {
+        "max_frames": max_frames or int(os.getenv('VIDEO_MAX_FRAMES', '8')),
+        "mode": mode or os.getenv('VIDEO_SAMPLING_MODE', 'scene'),
+        "max_width": max_width or int(os.getenv('VIDEO_FRAME_WIDTH', '512')),
+        "jpeg_quality": jpeg_quality or int(os.getenv('VIDEO_JPEG_QUALITY', '85')),
+        "time_budget": time_budget or float(os.getenv('VIDEO_TIME_BUDGET', '20'))
+    }
+
+
+def _encode_frame(frame, max_width, jpeg_quality):
+    """Réduit une image à max_width et l'encode en JPEG."""
+    height, width = frame.shape[:2]
+    if width > max_width:
+        frame = cv2.resize(frame, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return encoded.tobytes() if ok else None
+
+
+def _describe(frame):
+    """Histogramme et netteté (variance du laplacien) d'une vignette en niveaux de gris."""
+    gray = cv2.cvtColor(cv2.resize(frame, _THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    histogram = cv2.calcHist([gray], [0], None, [32], [0, 256])
+    cv2.normalize(histogram, histogram)
+    return histogram, float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def extract_keyframes(video_path, max_frames=None, mode=None, max_width=None, jpeg_quality=None,
+                      time_budget=None):
+    """
+    Extrait des images clés d'une vidéo (exécuté dans un processus du pool).
+
+    Args:
+        video_path (str): Chemin de la vidéo
+        max_frames (int, optional): Images clés max (défaut: VIDEO_MAX_FRAMES ou 8)
+        mode (str, optional): 'scene' (changements de scène) ou 'stride' (pas fixe)
+            (défaut: VIDEO_SAMPLING_MODE ou scene)
+        max_width (int, optional): Largeur max des images (défaut: VIDEO_FRAME_WIDTH ou 512)
+        jpeg_quality (int, optional): Qualité JPEG (défaut: VIDEO_JPEG_QUALITY ou 85)
+        time_budget (float, optional): Secondes max de décodage (défaut: VIDEO_TIME_BUDGET ou 20)
+
+    Returns:
+        dict: frames [{index, timestamp_ms, score, sharpness, jpeg}], frame_count, fps,
+              mode et truncated (budget de temps atteint)
+
+    Raises:
+        RuntimeError: Si OpenCV est absent ou la vidéo illisible
+        ValueError: Si le mode est inconnu
+    """
+    if cv2 is None:
+        raise RuntimeError("OpenCV (cv2) est requis pour extraire les images clés")
+
+    options = _video_options(max_frames, mode, max_width, jpeg_quality, time_budget)
+    if options['mode'] not in SAMPLING_MODES:
+        raise ValueError(f"Mode d'échantillonnage inconnu: {options['mode']}")
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise RuntimeError(f"Vidéo illisible: {video_path}")
+
+    deadline = time.monotonic() + options['time_budget']
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    max_frames = options['max_frames']
+
+    if options['mode'] == 'stride' and frame_count > 0:
+        targets = {int((i + 0.5) * frame_count / max_frames) for i in range(min(max_frames, frame_count))}
+        step = 1
+    else:
+        # Au plus ~300 images analysées par vidéo, quelle que soit sa durée
+        targets = None
+        step = max(1, frame_count // 300) if frame_count > 0 else max(1, round(fps / 5))
+
+    kept = []  # tas (score, index, image) borné à max_frames
+    previous = None
+    truncated = False
+    index = -1
+    try:
+        while True:
+            if time.monotonic() > deadline:
+                truncated = True
+                break
+            # grab() avance sans décoder ; seules les images examinées sont décodées
+            if not capture.grab():
+                break
+            index += 1
+            if (targets is not None and index not in targets) or (targets is None and index % step):
+                continue
+
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+
+            histogram, sharpness = _describe(frame)
+            if targets is not None:
+                score = 1.0
+            elif previous is None:
+                score = 1.0
+            else:
+                score = float(cv2.compareHist(previous, histogram, cv2.HISTCMP_BHATTACHARYYA))
+            previous = histogram
+
+            if len(kept) == max_frames and score <= kept[0][0]:
+                continue
+            jpeg = _encode_frame(frame, options['max_width'], options['jpeg_quality'])
+            if jpeg is None:
+                continue
+            entry = (score, index, {
+                "index": index,
+                "timestamp_ms": round(index * 1000 / fps),
+                "score": round(score, 4),
+                "sharpness": round(sharpness, 1),
+                "jpeg": jpeg
+            })
+            if len(kept) < max_frames:
+                heapq.heappush(kept, entry)
+            else:
+                heapq.heapreplace(kept, entry)
+    finally:
+        capture.release()
+
+    return {
+        "frames": [frame for _, _, frame in sorted(kept, key=lambda entry: entry[1])],
+        "frame_count": frame_count,
+        "fps": fps,
+        "mode": options['mode'],
+        "truncated": truncated
+    }
+
+
+_video_pool = None
+_video_pool_lock = threading.Lock()
+
+
+def get_video_pool():
+    """
+    Retourne le pool de processus de décodage vidéo partagé.
+
+    Returns:
+        ProcessPoolExecutor: Pool de VIDEO_WORKERS processus (défaut 2), démarrés
+            en 'spawn' pour ne pas hériter des threads du serveur
+    """
+    global _video_pool
+    with _video_pool_lock:
+        if _video_pool is None:
+            _video_pool = ProcessPoolExecutor(
+                max_workers=int(os.getenv('VIDEO_WORKERS', '2')),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _video_pool
+
+
+def sample_video(video_path, **options):
+    """
+    Extrait les images clés d'une vidéo dans le pool de processus.
+
+    Args:
+        video_path (str): Chemin de la vidéo
+        **options: max_frames, mode, max_width, jpeg_quality, time_budget
+
+    Returns:
+        dict: Résultat d'extract_keyframes, None si OpenCV est absent, la vidéo
+              illisible ou le budget de temps dépassé
+    """
+    if cv2 is None:
+        print("⚠️ OpenCV absent: vidéo non analysée")
+        return None
+
+    options = _video_options(**options)
+    future = get_video_pool().submit(extract_keyframes, video_path, **options)
+    try:
+        # Le processus s'arrête de lui-même au budget ; marge pour l'encodage et le transfert
+        return future.result(timeout=options['time_budget'] + 5)
+    except FutureTimeoutError:
+        future.cancel()
+        print(f"⚠️ Budget de temps dépassé pour la vidéo {video_path}")
+    except Exception as e:
+        print(f"⚠️ Extraction des images clés impossible: {e}")
+    return None
+
+
+def extract_video_frames(video_path, **options):
+    """
+    Extrait les images clés d'une vidéo et les enregistre dans l'espace de travail.
+
+    Args:
+        video_path (str): Chemin de la vidéo uploadée
+        **options: Options de sample_video
+
+    Returns:
+        list: Images clés [{path, index, timestamp_ms, score, sharpness}], vide si
+              la vidéo n'a pas pu être analysée
+    """
+    result = sample_video(video_path, **options)
+    if not result:
+        return []
+
+    space = get_scratch_space()
+    frames = []
+    for frame in result['frames']:
+        scratch_file = space.create('frame.jpg')
+        try:
+            scratch_file.write(frame.pop('jpeg'))
+        except Exception:
+            scratch_file.discard()
+            raise
+        path, _ = scratch_file.keep()
+        frames.append(dict(frame, path=path))
+
+    print(f"🎞️ {len(frames)} image(s) clé(s) extraite(s) sur {result['frame_count']} "
+          f"({result['mode']}{', budget atteint' if result['truncated'] else ''})")
+    return frames
+
+
+def best_portrait_frame(frames):
+    """Retourne l'image clé la plus nette (portrait de repli sans photo), None si aucune."""
+    return max(frames, key=lambda frame: frame['sharpness'], default=None)
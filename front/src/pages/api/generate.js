@@ -125,7 +125,28 @@ export default async function handler(req, res) {
       })
     }
 
-    const data = await response.json()
+    const accepted = await response.json()
+    console.log('📬 Job de génération accepté:', accepted.job_id)
+
+    // Le backend génère la carte en arrière-plan: on suit le job jusqu'à sa fin
+    const deadline = Date.now() + 180 * 1000
+    let job = null
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, 2000))
+      const jobResponse = await fetch(`${backendUrl}/jobs/${accepted.job_id}`)
+      job = await jobResponse.json()
+      if (job.status === 'completed' || job.status === 'failed') break
+    }
+
+    if (!job || job.status !== 'completed') {
+      const errorText = job && job.error ? job.error : 'Délai de génération dépassé'
+      console.error('❌ Erreur de génération:', errorText)
+      return res.status(job && job.status === 'failed' ? 500 : 504).json({
+        error: `Erreur du backend: ${errorText}`
+      })
+    }
+
+    const data = job.result
     console.log('✅ Réponse du backend:', data)
 
     // Retourner la réponse avec les URLs d'images